@@ -30,6 +30,8 @@ class NodeType(enum.IntEnum):
     UNION = enum.auto()
 
     FILL = enum.auto()
+    COMPOSITE = enum.auto()
+    COLORRAMP = enum.auto()
 
 
 def binary_op(ntype: NodeType, a, b) -> Node:
@@ -72,12 +74,12 @@ class Node:
         return cls(ntype=NodeType.SQRT, children=[expr])
 
     @classmethod
-    def intersect(cls, r1, r2):
-        return cls(ntype=NodeType.INTERSECT, children=[r1, r2])
+    def intersect(cls, *regions):
+        return cls(ntype=NodeType.INTERSECT, children=list(regions))
 
     @classmethod
-    def union(cls, r1, r2):
-        return cls(ntype=NodeType.UNION, children=[r1, r2])
+    def union(cls, *regions):
+        return cls(ntype=NodeType.UNION, children=list(regions))
 
     @classmethod
     def fill(cls, image, region, color):
@@ -85,6 +87,20 @@ class Node:
             ntype=NodeType.FILL, children=[image, region], attributes={"color": color}
         )
 
+    @classmethod
+    def composite(cls, destination, source, op="over", mode="normal"):
+        return cls(
+            ntype=NodeType.COMPOSITE,
+            children=[destination, source],
+            attributes={"op": op, "mode": mode},
+        )
+
+    @classmethod
+    def colorramp(cls, values, table):
+        return cls(
+            ntype=NodeType.COLORRAMP, children=[values], attributes={"table": table}
+        )
+
     def __len__(self):
         if self.children is not None:
             return 1 + sum([len(c) for c in self.children])
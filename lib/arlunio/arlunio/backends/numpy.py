@@ -1,51 +1,630 @@
 from __future__ import annotations
 
+import collections
+
 import numpy as np
 import PIL.Image as Image
 
 from arlunio import ast
 
 
-def builtin_x(backend: NumpyBackend, tree: ast.Node):
-    ratio = backend.width / backend.height
+def x_axis(width: int, height: int, *, x0=0, scale=1, stretch=False) -> np.ndarray:
+    """Return the :math:`x` coordinate of each column of pixels.
 
-    scale = tree.attributes["scale"]
-    stretch = tree.attributes["stretch"]
-    x0 = tree.attributes["x0"]
+    See :class:`arlunio.math.X` for the meaning of the arguments.
+    """
+    ratio = width / height
 
     if not stretch and ratio > 1:
         scale = scale * ratio
 
-    x = np.linspace(-scale, scale, backend.width)
-    x = np.array([x for _ in range(backend.height)])
+    return np.linspace(-scale, scale, width) - x0
 
-    return x - x0
 
+def y_axis(width: int, height: int, *, y0=0, scale=1, stretch=False) -> np.ndarray:
+    """Return the :math:`y` coordinate of each row of pixels.
 
-def builtin_y(backend: NumpyBackend, tree: ast.Node):
-    ratio = backend.height / backend.width
+    See :class:`arlunio.math.Y` for the meaning of the arguments.
+    """
+    ratio = height / width
+
+    if not stretch and ratio > 1:
+        scale = scale * ratio
 
+    return np.linspace(scale, -scale, height) - y0
+
+
+def builtin_x(backend: NumpyBackend, tree: ast.Node):
+    x0 = tree.attributes["x0"]
     scale = tree.attributes["scale"]
     stretch = tree.attributes["stretch"]
+
+    x = x_axis(backend.width, backend.height, x0=x0, scale=scale, stretch=stretch)
+
+    if backend.selection is not None:
+        return x[backend.selection % backend.width]
+
+    # Only depends on the column, so let broadcasting fill in the rest when needed.
+    return x.reshape(1, -1)
+
+
+def builtin_y(backend: NumpyBackend, tree: ast.Node):
     y0 = tree.attributes["y0"]
+    scale = tree.attributes["scale"]
+    stretch = tree.attributes["stretch"]
 
-    if not stretch and ratio > 1:
-        scale = scale * ratio
+    y = y_axis(backend.width, backend.height, y0=y0, scale=scale, stretch=stretch)
 
-    y = np.linspace(scale, -scale, backend.height)
-    y = np.array([y for _ in range(backend.width)]).transpose()
+    if backend.selection is not None:
+        return y[backend.selection // backend.width]
 
-    return y - y0
+    # Only depends on the row, so let broadcasting fill in the rest when needed.
+    return y.reshape(-1, 1)
 
 
-def builtin_image(backend: NumpyBackend, tree: ast.Node):
+class GridCache:
+    """A least recently used cache of coordinate grids, limited by the total number of
+    bytes it holds.
+
+    Grids are stored as read-only arrays so they can be shared between evaluations.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._grids = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._grids)
+
+    @property
+    def nbytes(self) -> int:
+        """The total size of the grids currently in the cache."""
+        return sum(grid.nbytes for grid in self._grids.values())
+
+    def clear(self):
+        self._grids.clear()
+
+    def get(self, key, compute) -> np.ndarray:
+        """Return the grid with the given key, calling :code:`compute` to create it if
+        necessary."""
+
+        grid = self._grids.get(key, None)
+
+        if grid is not None:
+            self._grids.move_to_end(key)
+            return grid
+
+        grid = compute()
+        grid.flags.writeable = False
+
+        if grid.nbytes > self.max_bytes:
+            return grid
+
+        self._grids[key] = grid
+        nbytes = self.nbytes
+
+        while nbytes > self.max_bytes:
+            _, oldest = self._grids.popitem(last=False)
+            nbytes -= oldest.nbytes
+
+        return grid
+
+
+polar_grids = GridCache(max_bytes=64 * 2 ** 20)
+"""The cache used to store the polar coordinate grids."""
+
+
+def _is_symmetric(axis: np.ndarray) -> bool:
+    """Check to see if the (monotonic) axis is symmetric about zero."""
+
+    tolerance = 1e-12 * np.abs(axis).max()
+    return np.allclose(axis, -axis[::-1], rtol=0, atol=tolerance)
+
+
+def _reflect_quadrant(xs, ys, f, flip_x, flip_y):
+    """Evaluate :code:`f` over the grid defined by a pair of axes that are symmetric
+    about zero.
+
+    The function is only evaluated in the quadrant :math:`x, y \\geq 0`, the other
+    quadrants are filled in by reflecting it with :code:`flip_x` and :code:`flip_y`.
+    """
+
+    width, height = len(xs), len(ys)
+    left, top = width // 2, (height + 1) // 2
+
+    result = np.empty((height, width))
+    quadrant = result[:top, left:]
+
+    f(xs[left:].reshape(1, -1), ys[:top].reshape(-1, 1), out=quadrant)
+    flip_x(quadrant[:, ::-1][:, :left], out=result[:top, :left])
+    flip_y(result[:top][::-1][2 * top - height :], out=result[top:])
+
+    return result
+
+
+def _radius(x, y, out):
+    np.multiply(x, x, out=out)
+    out += y * y
+
+    return np.sqrt(out, out=out)
+
+
+def _theta(x, y, out):
+    return np.arctan2(y, x, out=out)
+
+
+def _flip_theta(t, out):
+    np.subtract(np.pi, t, out=out)
+
+    # Keep the sign of zero, as arctan2 gives -pi where y is -0
+    return np.copysign(out, t, out=out)
+
+
+_POLAR = {
+    "r": (_radius, np.positive, np.positive),
+    "t": (_theta, _flip_theta, np.negative),
+}
+
+
+def _polar_grid(backend: NumpyBackend, tree: ast.Node) -> np.ndarray:
+    """Return the (cached) polar coordinate grid for the given builtin."""
+
+    name = tree.attributes["name"]
     width, height = backend.width, backend.height
-    color = tree.attributes["color"]
+    coords = {k: tree.attributes[k] for k in ["scale", "stretch"]}
+
+    def compute():
+        xs = x_axis(width, height, x0=tree.attributes["x0"], **coords)
+        ys = y_axis(width, height, y0=tree.attributes["y0"], **coords)
+        f, flip_x, flip_y = _POLAR[name]
+
+        if _is_symmetric(xs) and _is_symmetric(ys):
+            return _reflect_quadrant(xs, ys, f, flip_x, flip_y)
+
+        return f(xs.reshape(1, -1), ys.reshape(-1, 1), out=np.empty((height, width)))
+
+    key = (name, width, height, *(tree.attributes[k] for k in ["x0", "y0"]))
+    grid = polar_grids.get((*key, *coords.values()), compute)
+
+    if backend.selection is not None:
+        return grid.flat[backend.selection]
+
+    return grid
+
+
+def builtin_r(backend: NumpyBackend, tree: ast.Node):
+    return _polar_grid(backend, tree)
+
+
+def builtin_t(backend: NumpyBackend, tree: ast.Node):
+    t = _polar_grid(backend, tree)
+    t0 = tree.attributes["t0"]
+
+    if t0 == 0:
+        return t
+
+    return t - t0
+
+
+def builtin_array(backend: NumpyBackend, tree: ast.Node):
+    value = tree.attributes["value"]
+
+    if backend.selection is not None:
+        value = np.broadcast_to(value, (backend.height, backend.width))
+        return value.flat[backend.selection]
+
+    # Ensure the user's array is never modified in place.
+    value = np.asarray(value).view()
+    value.flags.writeable = False
+
+    return value
+
+
+def _pixel(color, mode="RGBA") -> np.ndarray:
+    """Return the given color as the value of a single pixel in the given mode."""
+
+    # Let pillow handle parsing the color, so we accept exactly what it does.
+    return np.asarray(Image.new(mode, (1, 1), color=color))[0, 0]
+
+
+def builtin_image(backend: NumpyBackend, tree: ast.Node):
+    color = _pixel(tree.attributes["color"])
+
+    canvas = np.empty(backend.shape + (4,), dtype=np.uint8)
+    canvas[...] = color
+
+    return canvas
+
+
+def _as_canvas(image) -> np.ndarray:
+    """Copy an existing image into an array that can be drawn on."""
+
+    # Our own images already hold their pixels in an array.
+    if not isinstance(image, (np.ndarray, Image.Image)):
+        image = image.array if image.mode in {"RGB", "RGBA"} else image.img
+
+    if isinstance(image, np.ndarray):
+        return image.copy()
+
+    if image.mode not in {"RGB", "RGBA"}:
+        image = image.convert("RGBA")
+
+    return np.array(image)
+
+
+def _bounding_box(region: np.ndarray):
+    """Return the slices selecting the smallest box containing every non zero value
+    in the given region, or :code:`None` if the region is empty."""
+
+    # When evaluating a selection, the region is a flat array of pixels.
+    if region.ndim == 1:
+        index = np.flatnonzero(region)
+
+        if len(index) == 0:
+            return None
+
+        return (slice(index[0], index[-1] + 1),)
+
+    rows = np.flatnonzero(region.any(axis=1))
+
+    if len(rows) == 0:
+        return None
+
+    cols = np.flatnonzero(region.any(axis=0))
+    return slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)
+
+
+def _paint(canvas: np.ndarray, color: np.ndarray, region: np.ndarray):
+    """Set the color of every pixel in the region, in place."""
+
+    # With 4 channels, each pixel can be written as a single 32bit value.
+    if canvas.shape[-1] == 4 and canvas.flags.c_contiguous:
+        pixels = canvas.view(np.uint32)[..., 0]
+        np.copyto(pixels, color.view(np.uint32)[0], where=region)
+        return
+
+    for channel, value in enumerate(color):
+        np.copyto(canvas[..., channel], value, where=region)
+
+
+def _blend(canvas: np.ndarray, color: np.ndarray, coverage: np.ndarray):
+    """Blend the color into the canvas in place, according to the given coverage.
+
+    This uses the same fixed point arithmetic as pillow so that the result is
+    identical to pasting the color using the coverage as a mask.
+    """
+
+    box = _bounding_box(coverage)
+
+    if box is None:
+        return
+
+    canvas, coverage = canvas[box], coverage[box]
+
+    # Fractional coverage, e.g. from an antialiased mask, is converted to 8bit values.
+    if np.issubdtype(coverage.dtype, np.floating):
+        coverage = np.round(np.clip(coverage, 0, 1) * 255)
+
+    coverage = coverage[..., np.newaxis].astype(np.uint16)
+
+    result = canvas * (255 - coverage)
+    result += color.astype(np.uint16) * coverage
+    result += 128
+    result += result >> 8
+    result >>= 8
+
+    canvas[...] = result
+
+
+BLEND_MODES = {
+    "normal": lambda backdrop, source: source,
+    "multiply": lambda backdrop, source: backdrop * source,
+    "screen": lambda backdrop, source: backdrop + source - backdrop * source,
+    "darken": np.minimum,
+    "lighten": np.maximum,
+}
+"""The supported ways of mixing the color of a layer with the colors beneath it."""
+
+
+PORTER_DUFF = {
+    "clear": (lambda as_, ab: 0, lambda as_, ab: 0),
+    "source": (lambda as_, ab: 1, lambda as_, ab: 0),
+    "destination": (lambda as_, ab: 0, lambda as_, ab: 1),
+    "over": (lambda as_, ab: 1, lambda as_, ab: 1 - as_),
+    "destination_over": (lambda as_, ab: 1 - ab, lambda as_, ab: 1),
+    "in": (lambda as_, ab: ab, lambda as_, ab: 0),
+    "destination_in": (lambda as_, ab: 0, lambda as_, ab: as_),
+    "out": (lambda as_, ab: 1 - ab, lambda as_, ab: 0),
+    "destination_out": (lambda as_, ab: 0, lambda as_, ab: 1 - as_),
+    "atop": (lambda as_, ab: ab, lambda as_, ab: 1 - as_),
+    "destination_atop": (lambda as_, ab: 1 - ab, lambda as_, ab: as_),
+    "xor": (lambda as_, ab: 1 - ab, lambda as_, ab: 1 - as_),
+    "plus": (lambda as_, ab: 1, lambda as_, ab: 1),
+}
+"""The Porter-Duff operators, as the fractions of the source and destination that
+contribute to the result given the alpha of each."""
+
+
+def premultiply(pixels: np.ndarray) -> np.ndarray:
+    """Convert an array of 8bit RGBA pixels into premultiplied floats.
+
+    >>> import numpy as np
+    >>> from arlunio.backends.numpy import premultiply
+    >>> premultiply(np.array([[255, 0, 255, 51]], dtype=np.uint8))
+    array([[0.2, 0. , 0.2, 0.2]], dtype=float32)
+    """
+
+    result = np.divide(pixels, 255, dtype=np.float32)
+    result[..., :3] *= result[..., 3:]
+
+    return result
+
+
+def unpremultiply(pixels: np.ndarray) -> np.ndarray:
+    """Convert an array of premultiplied float RGBA pixels into 8bit values.
+
+    >>> import numpy as np
+    >>> from arlunio.backends.numpy import unpremultiply
+    >>> unpremultiply(np.array([[0.2, 0, 0.2, 0.2]], dtype=np.float32))
+    array([[255,   0, 255,  51]], dtype=uint8)
+    """
+
+    alpha = pixels[..., 3:]
+
+    with np.errstate(divide="ignore"):
+        scale = np.where(alpha > 0, 255 / alpha, 0).astype(np.float32)
+
+    result = pixels * scale
+    result[..., 3:] = alpha * 255
+
+    # All values are positive, so rounding is the same as adding a half and truncating.
+    np.clip(result, 0, 255, out=result)
+    result += 0.5
+
+    return result.astype(np.uint8)
+
+
+def _mix(destination: np.ndarray, source: np.ndarray, mode: str) -> np.ndarray:
+    """Mix the colors of the source with the destination according to the given blend
+    mode, returning the premultiplied source color to composite."""
+
+    as_, ab = source[..., 3:], destination[..., 3:]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cs = np.where(as_ > 0, source[..., :3] / as_, 0)
+        cb = np.where(ab > 0, destination[..., :3] / ab, 0)
+
+    mixed = np.empty_like(source)
+    mixed[..., :3] = (1 - ab) * source[..., :3] + as_ * ab * BLEND_MODES[mode](cb, cs)
+    mixed[..., 3:] = as_
+
+    return mixed
 
-    return Image.new("RGBA", (width, height), color=color)
 
+def composite(
+    destination: np.ndarray, source: np.ndarray, op: str = "over", mode="normal"
+) -> np.ndarray:
+    """Composite the source onto the destination in place.
 
-BUILTINS = {"x": builtin_x, "y": builtin_y, "image": builtin_image}
+    Both arrays hold premultiplied RGBA floats and must have the same shape.
+
+    Parameters
+    ----------
+    destination:
+        The pixels to composite onto, these will be overwritten with the result.
+    source:
+        The pixels to composite.
+    op:
+        The name of the Porter-Duff operator to use, one of the :data:`PORTER_DUFF`
+        operators.
+    mode:
+        The name of the blend mode used to mix the colors of the source with the
+        destination, one of the :data:`BLEND_MODES`.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from arlunio.backends.numpy import composite
+    >>> a = np.array([[0, 0, 1, 1]], dtype=np.float32)
+    >>> b = np.array([[0.5, 0, 0, 0.5]], dtype=np.float32)
+    >>> composite(a, b)
+    array([[0.5, 0. , 0.5, 1. ]], dtype=float32)
+    >>> a
+    array([[0.5, 0. , 0.5, 1. ]], dtype=float32)
+    """
+
+    if op not in PORTER_DUFF:
+        raise ValueError(f"Unknown compositing operator '{op}'")
+
+    if mode not in BLEND_MODES:
+        raise ValueError(f"Unknown blend mode '{mode}'")
+
+    if mode != "normal":
+        source = _mix(destination, source, mode)
+
+    fa, fb = PORTER_DUFF[op]
+    as_, ab = source[..., 3:], destination[..., 3:]
+
+    # Work out the source's contribution first, as it may depend on the destination.
+    fa = fa(as_, ab)
+    fb = fb(as_, ab)
+
+    contribution = source if isinstance(fa, int) else source * fa
+
+    if isinstance(fb, int):
+        if fb == 0:
+            destination[...] = 0
+    else:
+        destination *= fb
+
+    if not (isinstance(fa, int) and fa == 0):
+        destination += contribution
+
+    if op == "plus":
+        np.minimum(destination, 1, out=destination)
+
+    return destination
+
+
+def composite_layers(backend: NumpyBackend, layers, background) -> np.ndarray:
+    """Flatten a stack of layers into a single RGBA image.
+
+    Each layer is a :code:`(region, color, mode)` tuple where :code:`region` is either
+    a mask or an array of coverage values, :code:`color` is an RGBA tuple of floats
+    and :code:`mode` is one of the :data:`BLEND_MODES`.
+
+    Rather than drawing each layer over the entire image in turn, we first find the
+    topmost opaque layer at each pixel. Since everything beneath it is hidden, the
+    image starts out as the color of that layer and only the layers above it are
+    blended into the pixel.
+    """
+
+    palette = np.array([background, *(c for _, c, _ in layers)], dtype=np.float32)
+    top = np.zeros(backend.shape, dtype=np.min_scalar_type(len(layers)))
+
+    blended = []
+
+    for index, (region, color, mode) in enumerate(layers, start=1):
+
+        if mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode '{mode}'")
+
+        if isinstance(region, ast.Node):
+            region = backend.eval(region)
+
+        region = np.broadcast_to(region, backend.shape)
+
+        if region.dtype == bool:
+            opaque = region
+        else:
+            # As with fills, integer coverage values are out of 255.
+            if np.issubdtype(region.dtype, np.integer):
+                region = region / 255
+
+            region = np.clip(region, 0, 1, dtype=np.float32)
+            opaque = region >= 1
+
+        if mode == "normal" and color[3] >= 1:
+            np.copyto(top, index, where=opaque)
+
+            # The layer completely hides everything beneath it.
+            if region.dtype == bool:
+                continue
+
+        blended.append((index, region, color, mode))
+
+    canvas = np.take(palette, top, axis=0)
+
+    for index, region, color, mode in blended:
+        box = _bounding_box(region)
+
+        if box is None:
+            continue
+
+        # Blend the layer into the pixels where it's above the topmost opaque layer.
+        rows, cols = np.nonzero((region[box] > 0) & (top[box] < index))
+        rows += box[0].start
+        cols += box[1].start
+
+        alpha = np.asarray(region[rows, cols], dtype=np.float32) * color[3]
+        alpha = alpha[:, np.newaxis]
+
+        pixels = canvas[rows, cols]
+        cb, ab = pixels[:, :3], pixels[:, 3:]
+        cs = palette[index, :3]
+
+        # Mix the colors where the backdrop is opaque, before compositing the result
+        # over the backdrop.
+        cs = (1 - ab) * cs + ab * BLEND_MODES[mode](cb, cs)
+        ao = alpha + ab * (1 - alpha)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            co = (alpha * cs + (1 - alpha) * ab * cb) / ao
+
+        pixels[:, :3] = np.where(ao > 0, co, 0)
+        pixels[:, 3:] = ao
+
+        canvas[rows, cols] = pixels
+
+    return canvas
+
+
+def _apply(ufunc, a, b):
+    """Apply the given binary ufunc, writing the result into :code:`a` if possible.
+
+    Coordinates are kept as 1D rows or columns for as long as possible, so we can
+    only reuse :code:`a` when it already has the shape of the result.
+    """
+
+    reusable = isinstance(a, np.ndarray) and a.flags.writeable
+
+    if reusable and a.shape == np.broadcast_shapes(a.shape, np.shape(b)):
+        if a.dtype == np.result_type(a, b):
+            return ufunc(a, b, out=a)
+
+    return ufunc(a, b)
+
+
+BUILTINS = {
+    "array": builtin_array,
+    "x": builtin_x,
+    "y": builtin_y,
+    "r": builtin_r,
+    "t": builtin_t,
+    "image": builtin_image,
+}
+
+
+def _rgba(pixels: np.ndarray) -> np.ndarray:
+    """Ensure the given RGB or RGBA pixels have an alpha channel."""
+
+    if pixels.shape[-1] == 4:
+        return pixels
+
+    alpha = np.full(pixels.shape[:-1] + (1,), 255, dtype=np.uint8)
+    return np.concatenate([pixels, alpha], axis=-1)
+
+
+def _contains(tree, ntype: ast.NodeType) -> bool:
+    """Determine if the given tree contains a node of the given type."""
+
+    if not isinstance(tree, ast.Node):
+        return False
+
+    if tree.ntype == ntype:
+        return True
+
+    return any(_contains(child, ntype) for child in tree.children or [])
+
+
+def _uniform(pixels: np.ndarray) -> np.ndarray:
+    """Return a mask selecting the RGBA pixels that are the same color as all of their
+    neighbours."""
+
+    packed = np.ascontiguousarray(pixels).view(np.uint32)[..., 0]
+    padded = np.pad(packed, 1, mode="edge")
+
+    height, width = packed.shape
+    uniform = np.ones(packed.shape, dtype=bool)
+
+    for dy in range(3):
+        for dx in range(3):
+            uniform &= padded[dy : dy + height, dx : dx + width] == packed
+
+    return uniform
+
+
+def _is_image(tree: ast.Node) -> bool:
+    """Determine if the given tree evaluates to an image."""
+
+    if tree.ntype in {
+        ast.NodeType.FILL,
+        ast.NodeType.COMPOSITE,
+        ast.NodeType.COLORRAMP,
+    }:
+        return True
+
+    return tree.ntype == ast.NodeType.BUILTIN and tree.attributes["name"] == "image"
 
 
 class NumpyBackend:
@@ -53,6 +632,18 @@ class NumpyBackend:
         self.width = width
         self.height = height
 
+        self.selection = None
+        """If set, the flat indices of the only pixels that need to be evaluated."""
+
+    @property
+    def shape(self):
+        """The shape of the array produced when evaluating a pixel dependent node."""
+
+        if self.selection is not None:
+            return self.selection.shape
+
+        return (self.height, self.width)
+
     def preview(self, tree: ast.Node):
         result = self.eval(tree)
 
@@ -63,6 +654,69 @@ class NumpyBackend:
         return result
 
     def eval(self, tree: ast.Node):
+        """Evaluate the given tree, returning a result for every pixel in the image (or
+        selection)."""
+
+        result = self._eval(tree)
+
+        # Images are drawn on an array and only converted at the very end.
+        if _is_image(tree):
+            return Image.fromarray(result)
+
+        if isinstance(result, np.ndarray) and result.shape != self.shape:
+            result = np.broadcast_to(result, self.shape).copy()
+
+        return result
+
+    def draw(self, tree: ast.Node) -> np.ndarray:
+        """Evaluate a tree that produces an image, returning its pixels as a
+        contiguous array rather than a pillow image."""
+        return np.ascontiguousarray(self._eval(tree))
+
+    def refine(self, tree: ast.Node, coarse: np.ndarray) -> np.ndarray:
+        """Draw an image tree, reusing a drawing of it at a lower resolution.
+
+        Wherever a pixel of the coarse drawing is the same color as all of its
+        neighbours, the corresponding pixels are copied from it. Only the remaining
+        pixels, typically along the edges of shapes, are evaluated.
+
+        Details smaller than a pixel of the coarse drawing can be missed.
+
+        Parameters
+        ----------
+        tree:
+            The tree to draw, at the size of this backend.
+        coarse:
+            The RGBA pixels of the tree drawn at a lower resolution.
+        """
+
+        # A colorramp depends on every value at once, so can't be drawn in pieces.
+        if coarse.shape[-1] != 4 or _contains(tree, ast.NodeType.COLORRAMP):
+            return self.draw(tree)
+
+        height, width = coarse.shape[:2]
+        rows = (np.arange(self.height) * height // self.height).reshape(-1, 1)
+        cols = np.arange(self.width) * width // self.width
+
+        packed = np.ascontiguousarray(coarse).view(np.uint32)[..., 0]
+        canvas = packed[rows, cols]
+
+        index = np.flatnonzero(~_uniform(coarse)[rows, cols])
+
+        if index.size > 0:
+            pixels = np.ascontiguousarray(self.eval_selected(tree, index))
+            canvas.flat[index] = pixels.view(np.uint32)[:, 0]
+
+        return canvas.view(np.uint8).reshape(self.height, self.width, 4)
+
+    def _eval(self, tree: ast.Node):
+        """Evaluate the given tree.
+
+        Pixel dependent values are not necessarily expanded to the full size of the
+        image. Functions of only :math:`x` or only :math:`y` are computed as a single
+        row or column respectively and are only combined into a full image by
+        broadcasting when an operation depends on both.
+        """
         ntype = tree.ntype.name.lower()
         impl = getattr(self, f"eval_{ntype}", None)
 
@@ -82,64 +736,119 @@ class NumpyBackend:
 
         return impl(self, tree)
 
+    def _eval_canvas(self, image) -> np.ndarray:
+        """Return an array that can be drawn on, holding the pixels of the given image
+        or tree."""
+
+        # Images are drawn in place, so a stack of operations shares a single canvas.
+        if isinstance(image, ast.Node):
+            return self._eval(image)
+
+        return _as_canvas(image)
+
+    def eval_colorramp(self, tree: ast.Node):
+        table = tree.attributes["table"]
+        steps = len(table)
+
+        values = self._eval(tree.children[0])
+        values = np.broadcast_to(values, self.shape)
+
+        # Scale all the values so that they fall into the range [0, steps - 1] and use
+        # the result to index into the table.
+        minx, maxx = np.min(values), np.max(values)
+        index = np.subtract(values, minx, dtype=float)
+
+        if maxx > minx:
+            index *= (steps - 1) / (maxx - minx)
+
+        index = index.astype(np.min_scalar_type(steps - 1))
+        return np.take(table, index, axis=0)
+
+    def eval_composite(self, tree: ast.Node):
+        destination, source = tree.children
+
+        canvas = _rgba(self._eval_canvas(destination))
+        source = _rgba(self._eval_canvas(source))
+
+        # Only the pixels covered by both images are changed.
+        if self.selection is None:
+            height = min(canvas.shape[0], source.shape[0])
+            width = min(canvas.shape[1], source.shape[1])
+
+            target = canvas[:height, :width]
+            source = source[:height, :width]
+
+        else:
+            target = canvas
+
+        pixels = premultiply(target)
+        composite(
+            pixels,
+            premultiply(source),
+            op=tree.attributes["op"],
+            mode=tree.attributes["mode"],
+        )
+
+        target[...] = unpremultiply(pixels)
+        return canvas
+
     def eval_fill(self, tree: ast.Node):
         image, region = tree.children
-        color = tree.attributes["color"]
+        canvas = self._eval_canvas(image)
+
+        channels = canvas.shape[-1]
+        color = _pixel(tree.attributes["color"], "RGBA" if channels == 4 else "RGB")
+
+        region = self._eval(region)
 
-        image = self.eval(image)
-        region = self.eval(region)
+        region = np.broadcast_to(region, canvas.shape[:-1])
 
-        image.paste(color, mask=Image.fromarray(region))
-        return image
+        if region.dtype == bool:
+            _paint(canvas, color, region)
+        else:
+            _blend(canvas, color, region)
+
+        return canvas
 
     def eval_greater(self, tree: ast.Node):
         a, b = tree.children
 
-        a = self.eval(a)
-        b = self.eval(b)
+        a = self._eval(a)
+        b = self._eval(b)
 
         return a > b
 
     def eval_intersect(self, tree: ast.Node):
-        a, *bs = tree.children
-        a = self.eval(a)
-
-        for b in bs:
-            a = np.logical_and(a, self.eval(b))
-
-        return a
+        return self._eval_short_circuit(tree, undecided=True)
 
     def eval_less(self, tree: ast.Node):
         a, b = tree.children
 
-        a = self.eval(a)
-        b = self.eval(b)
+        a = self._eval(a)
+        b = self._eval(b)
 
         return a < b
 
-    def eval_minus(self, tree: ast.Node):
-        a, *bs = tree.children
-        a = self.eval(a)
+    def eval_divide(self, tree: ast.Node):
+        return self._eval_arithmetic(tree, np.true_divide)
 
-        for b in bs:
-            a -= self.eval(b)
+    def eval_minus(self, tree: ast.Node):
+        return self._eval_arithmetic(tree, np.subtract)
 
-        return a
+    def eval_multiply(self, tree: ast.Node):
+        return self._eval_arithmetic(tree, np.multiply)
 
     def eval_plus(self, tree: ast.Node):
-        a, *bs = tree.children
-        a = self.eval(a)
-
-        for b in bs:
-            a += self.eval(b)
+        return self._eval_arithmetic(tree, np.add)
 
-        return a
+    def eval_union(self, tree: ast.Node):
+        return self._eval_short_circuit(tree, undecided=False)
 
     def eval_pow(self, tree: ast.Node):
         a, b = tree.children
 
-        a = self.eval(a)
-        b = self.eval(b)
+        a = self._eval(a)
+        b = self._eval(b)
 
         return a ** b
 
@@ -148,4 +857,45 @@ class NumpyBackend:
 
     def eval_sqrt(self, tree: ast.Node):
         a = tree.children[0]
-        return np.sqrt(self.eval(a))
+        return np.sqrt(self._eval(a))
+
+    def eval_selected(self, tree: ast.Node, index: np.ndarray):
+        """Evaluate the given tree only at the pixels with the given (flat) indices.
+
+        If a selection is already active, the indices are taken relative to it.
+        """
+        previous = self.selection
+        self.selection = index if previous is None else previous[index]
+
+        try:
+            return self._eval(tree)
+        finally:
+            self.selection = previous
+
+    def _eval_arithmetic(self, tree: ast.Node, ufunc):
+        a, *bs = tree.children
+        a = self._eval(a)
+
+        for b in bs:
+            a = _apply(ufunc, a, self._eval(b))
+
+        return a
+
+    def _eval_short_circuit(self, tree: ast.Node, undecided: bool):
+        """Combine the children of a node one at a time, only evaluating each child at
+        the pixels whose value is still equal to :code:`undecided`."""
+
+        a, *bs = tree.children
+
+        # Always a new array, the first child's result could be shared with the caller.
+        result = np.broadcast_to(self._eval(a), self.shape).astype(bool)
+
+        for b in bs:
+            index = np.flatnonzero(result == undecided)
+
+            if index.size == 0:
+                break
+
+            result.flat[index] = self.eval_selected(b, index)
+
+        return result
@@ -1,146 +1,2342 @@
 from __future__ import annotations
 
 import base64
+import bisect
+import concurrent.futures
 import io
 import logging
+import math
 import pathlib
+import struct
+import zlib
+from typing import List
 from typing import Optional
+from typing import Tuple
 
 # TODO: Remove these, as they should be contained in the numpy backend.
 import numpy as np
 import PIL.Image as PImage
+import PIL.features as features
 
 import arlunio.ast as ast
 import arlunio.color as color
-import arlunio.mask as mask
-import arlunio.math as math
+from arlunio.backends.numpy import BLEND_MODES
+from arlunio.backends.numpy import NumpyBackend
+from arlunio.backends.numpy import composite
+from arlunio.backends.numpy import composite_layers
+from arlunio.backends.numpy import premultiply
+from arlunio.backends.numpy import unpremultiply
 
 logger = logging.getLogger(__name__)
 
 
+_BAND_SIZE = 2 ** 22
+"""The number of bytes to work on at once, when editing or comparing images."""
+
+_CONVERSIONS = {
+    "1": "L",
+    "CMYK": "RGB",
+    "HSV": "RGB",
+    "I;16": "I",
+    "I;16B": "I",
+    "I;16L": "I",
+    "I;16N": "I",
+    "LAB": "RGB",
+    "YCbCr": "RGB",
+}
+"""The modes pillow images are converted to when they can't be held as an array, any
+other mode is converted to RGBA."""
+
+
+def _array_mode(array: np.ndarray) -> Optional[str]:
+    """Return the mode of the image held by the given array, or :code:`None` if it
+    doesn't represent an image."""
+
+    if array.dtype == np.uint8 and array.ndim == 2:
+        return "L"
+
+    if array.dtype == np.uint8 and array.ndim == 3:
+        return {2: "LA", 3: "RGB", 4: "RGBA"}.get(array.shape[2], None)
+
+    if array.ndim == 2:
+        return {np.dtype(np.int32): "I", np.dtype(np.float32): "F"}.get(
+            array.dtype, None
+        )
+
+    return None
+
+
+def _toarray(img: PImage.Image) -> np.ndarray:
+    """Copy the pixels of a pillow image into an array."""
+
+    if img.mode not in {"L", "LA", "RGB", "RGBA", "I", "F"}:
+        img = img.convert(_CONVERSIONS.get(img.mode, "RGBA"))
+
+    return np.array(img)
+
+
+def _equal(a: np.ndarray, b: np.ndarray) -> bool:
+    """Compare the contents of two contiguous arrays with the same shape and dtype, a
+    band at a time so we can stop at the first difference."""
+
+    a = a.reshape(-1).view(np.uint8)
+    b = b.reshape(-1).view(np.uint8)
+
+    # Comparing 8 bytes at a time is much quicker.
+    if a.size % 8 == 0:
+        a, b = a.view(np.uint64), b.view(np.uint64)
+
+    step = _BAND_SIZE // a.itemsize
+
+    return all(
+        np.array_equal(a[i : i + step], b[i : i + step]) for i in range(0, a.size, step)
+    )
+
+
 class Image:
-    """Our representation of an image, implemented as a wrapper around a standard
-    Pillow image."""
+    """Our representation of an image.
+
+    The pixels are held in a numpy array which is shared with numpy, so
+    :code:`np.asarray(img)` doesn't copy anything. Pillow is used for everything else,
+    through a view onto the array that's only created when it's needed.
+
+    The array can be a :class:`numpy:numpy.memmap` created with :meth:`Image.memmap`.
+    Changes made with :meth:`alpha_composite` and :meth:`paste` are written directly
+    into the array, a band of rows at a time, so images far larger than the available
+    memory can be rendered.
+
+    Parameters
+    ----------
+    img:
+        The pixels of the image. This can be a C contiguous array of 8bit values with
+        shape :code:`(height, width)`, :code:`(height, width, 2)`,
+        :code:`(height, width, 3)` or :code:`(height, width, 4)` for L, LA, RGB or
+        RGBA images, or a 2D array of 32bit integers or floats for I or F images. The
+        array is used as is, not copied.
+
+        It can also be a pillow image, which is copied into a new array. Images in
+        modes that can't be held as an array, such as palette images, are converted to
+        RGBA.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> pixels = np.zeros((2, 3, 4), dtype=np.uint8)
+    >>> img = image.Image(pixels)
+    >>> img.mode, img.size
+    ('RGBA', (3, 2))
+    >>> img.paste("red", (1, 0, 3, 1))
+    >>> pixels[0]
+    array([[  0,   0,   0,   0],
+           [255,   0,   0, 255],
+           [255,   0,   0, 255]], dtype=uint8)
+    """
+
+    def __init__(self, img):
+
+        if isinstance(img, Image):
+            img = img.array
+
+        if isinstance(img, PImage.Image):
+            img = _toarray(img)
+
+        mode = _array_mode(img)
+
+        if mode is None:
+            raise ValueError(
+                f"Unable to use an array of {img.dtype} with shape {img.shape} "
+                "as an image"
+            )
+
+        if not img.flags.c_contiguous:
+            raise ValueError("The array must be C contiguous")
+
+        self.array = img
+        """The array holding the image's pixels."""
+
+        self.mode = mode
+        """The pillow mode of the image."""
+
+        self._img = None
+
+    def __eq__(self, other):
+
+        if not isinstance(other, Image):
+            return False
+
+        a, b = self.array, other.array
+
+        if self.mode != other.mode or a.shape != b.shape:
+            return False
+
+        if a.__array_interface__["data"] == b.__array_interface__["data"]:
+            return True
+
+        return _equal(a, b)
+
+    def __add__(self, other):
+
+        if isinstance(other, (Image, LazyImage)):
+            other = other.img
+
+        if not isinstance(other, PImage.Image):
+            raise TypeError("Addition is only supported between images.")
+
+        img = self.copy()
+        img.alpha_composite(other)
+
+        return img
+
+    def __array__(self, dtype=None, copy=None):
+        # Ensure that our version of an image also plays nice with numpy. Handing over
+        # the array itself means any views keep it alive, even if it's later replaced.
+        array = self.array if dtype is None else self.array.astype(dtype)
+        return array.copy() if copy else array
+
+    def _repr_png_(self):
+        # Give nice previews in jupyter notebooks
+        return self.img._repr_png_()
+
+    @classmethod
+    def memmap(
+        cls, filename, width: int, height: int, background: Optional[str] = None
+    ) -> Image:
+        """Create a new image backed by a memory mapped file.
+
+        The file holds the raw RGBA values of each pixel, row by row, and will be
+        overwritten if it already exists. To reopen it later pass a
+        :class:`numpy:numpy.memmap` with the same shape to :class:`Image`.
+
+        Parameters
+        ----------
+        filename:
+            The file to store the pixels in.
+        width:
+            The width of the image in pixels.
+        height:
+            The height of the image in pixels.
+        background:
+            The color to fill the image with, if omitted this will default to
+            transparent.
+
+        Example
+        -------
+        >>> import os
+        >>> import tempfile
+        >>> import numpy as np
+        >>> import arlunio.image as image
+        >>> filename = os.path.join(tempfile.mkdtemp(), "render.rgba")
+        >>> img = image.Image.memmap(filename, 4, 2, background="white")
+        >>> img.alpha_composite(image.fromarray(np.full((1, 1, 4), 255, np.uint8)))
+        >>> os.path.getsize(filename)
+        32
+        >>> np.asarray(img).shape
+        (2, 4, 4)
+        """
+
+        pixels = np.memmap(
+            filename, dtype=np.uint8, mode="w+", shape=(height, width, 4)
+        )
+
+        # A new file is already filled with zeros, i.e. transparent pixels.
+        if background is not None:
+            pixel = color.getcolor(background, "RGBA")
+
+            if any(pixel):
+                pixels[...] = pixel
+
+        return cls(pixels)
+
+    @property
+    def img(self) -> PImage.Image:
+        """A pillow image with the same pixels as this image.
+
+        For L and RGBA images this is a read only view onto the array, for other modes
+        it's a copy. Either way changes made to it are not reflected in the image.
+        """
+
+        if self._img is not None:
+            return self._img
+
+        img = PImage.fromarray(self.array)
+
+        # Only hold onto views, copies would go stale when the array changes.
+        if img.readonly:
+            self._img = img
+
+        return img
+
+    @property
+    def size(self):
+        height, width = self.array.shape[:2]
+        return width, height
+
+    def _bands(self, box):
+        """Iterate over the given region of the image, a band of rows at a time.
+
+        Each band is given as a pillow image along with the row it starts on, any
+        changes made to it are written back into the array.
+        """
+
+        width, height = self.size
+        left, upper, right, lower = box
+
+        left, right = max(left, 0), min(right, width)
+        upper, lower = max(upper, 0), min(lower, height)
+
+        if left >= right or upper >= lower:
+            return
+
+        rows = max(1, _BAND_SIZE // (self.array.strides[1] * (right - left)))
+
+        for top in range(upper, lower, rows):
+            pixels = self.array[top : min(top + rows, lower), left:right]
+            band = PImage.fromarray(np.ascontiguousarray(pixels))
+
+            yield top, band
+
+            pixels[...] = np.asarray(band)
+
+    def alpha_composite(self, im, dest=(0, 0), source=(0, 0)):
+        """Composites an image onto this image.
+
+        See :meth:`pillow:PIL.Image.Image.alpha_composite`
+        """
+
+        if isinstance(im, (Image, LazyImage)):
+            im = im.img
+
+        if min(dest) < 0:
+            raise ValueError("Destination must be non-negative")
+
+        if len(source) == 2:
+            source = tuple(source) + im.size
+
+        x, y = dest
+        sx0, sy0, sx1, sy1 = source
+
+        for top, band in self._bands((x, y, x + sx1 - sx0, y + sy1 - sy0)):
+            bottom = top + band.height
+            box = (sx0, sy0 + top - y, sx1, sy0 + bottom - y)
+
+            band.alpha_composite(im, source=box)
+
+    def copy(self):
+        """Return a copy of the image.
+
+        The copy is always held in memory, even if this image is memory mapped.
+        """
+        return Image(np.array(self.array))
+
+    def paste(self, im, box=None, mask=None):
+        """Paste another image into this image.
+
+        See :meth:`pillow:PIL.Image.Image.paste`
+        """
+
+        if isinstance(im, (Image, LazyImage)):
+            im = im.img
+
+        if isinstance(mask, (Image, LazyImage)):
+            mask = mask.img
+
+        if box is None:
+            box = (0, 0)
+
+        if len(box) == 2:
+            if isinstance(im, PImage.Image):
+                size = im.size
+            elif isinstance(mask, PImage.Image):
+                size = mask.size
+            else:
+                raise ValueError("cannot determine region size; use 4-item box")
+
+            box = tuple(box) + (box[0] + size[0], box[1] + size[1])
+
+        x0, y0, x1, y1 = box
+        left = max(x0, 0)
+
+        for top, band in self._bands(box):
+            band.paste(im, (x0 - left, y0 - top, x1 - left, y1 - top), mask)
+
+    def save(self, *args, **kwargs):
+        """Save the image with the given filename.
+
+        See :meth:`pillow:PIL.Image.Image.save`
+        """
+        self.img.save(*args, **kwargs)
+
+    def thumbnail(self, *args, **kwargs):
+        """Convert this image into a thumbail.
+
+        See :meth:`pillow:PIL.Image.Image.thumbnail`
+
+        The image is given a new array in memory to hold the thumbnail, so a memory
+        mapped file is left untouched.
+        """
+
+        img = self.img.copy()
+        img.thumbnail(*args, **kwargs)
+
+        self.array = _toarray(img)
+        self._img = None
+
+
+class Canvas:
+    """An image held as premultiplied floating point RGBA values, for compositing
+    images together.
+
+    Unlike adding :class:`Image` objects together, compositing onto a canvas happens
+    in place and at full precision. The result is only rounded to 8bit values once,
+    when it's converted back into an image with :meth:`toimage`.
+
+    Parameters
+    ----------
+    pixels:
+        The premultiplied RGBA values of each pixel, as an array with shape
+        :code:`(height, width, 4)`.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> canvas = image.Canvas.new(2, 1, background="#00f")
+    >>> half = image.Canvas.new(1, 1, background="#ff000080")
+    >>> canvas.composite(half).composite(half)
+    Canvas(width=2, height=1)
+    >>> np.asarray(canvas.toimage())
+    array([[[192,   0,  63, 255],
+            [  0,   0, 255, 255]]], dtype=uint8)
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        self.pixels = pixels
+
+    def __repr__(self):
+        return f"Canvas(width={self.width}, height={self.height})"
+
+    def __add__(self, other):
+
+        if not isinstance(other, Canvas):
+            raise TypeError("Addition is only supported between canvases.")
+
+        return self.copy().composite(other)
+
+    def __iadd__(self, other):
+
+        if not isinstance(other, Canvas):
+            raise TypeError("Addition is only supported between canvases.")
+
+        return self.composite(other)
+
+    @classmethod
+    def new(cls, width: int, height: int, background: Optional[str] = None) -> Canvas:
+        """Create a new canvas filled with the given color.
+
+        Parameters
+        ----------
+        width:
+            The width of the canvas in pixels.
+        height:
+            The height of the canvas in pixels.
+        background:
+            The color to fill the canvas with, if omitted this will default to
+            transparent.
+        """
+
+        background = "#0000" if background is None else background
+        pixel = np.array(color.getcolor(background, "RGBA"), dtype=np.uint8)
+
+        pixels = np.empty((height, width, 4), dtype=np.float32)
+        pixels[...] = premultiply(pixel)
+
+        return cls(pixels)
+
+    @classmethod
+    def fromimage(cls, image) -> Canvas:
+        """Create a canvas from an image.
+
+        Parameters
+        ----------
+        image:
+            The image to copy, this can be an :class:`Image`, a pillow image or an
+            array of 8bit RGBA values.
+        """
+
+        if isinstance(image, LazyImage):
+            image = image.render()
+
+        if isinstance(image, Image):
+            image = image.array if image.mode == "RGBA" else image.img
+
+        if isinstance(image, PImage.Image) and image.mode != "RGBA":
+            image = image.convert("RGBA")
+
+        return cls(premultiply(np.asarray(image)))
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def bbox(self):
+        """Return the bounding box of the pixels that are not fully transparent.
+
+        The box is returned as a :code:`(left, upper, right, lower)` tuple, or
+        :code:`None` if the canvas is completely transparent.
+
+        >>> import arlunio.image as image
+        >>> canvas = image.Canvas.new(4, 4)
+        >>> canvas.pixels[1:3, 2] = 1
+        >>> canvas.bbox()
+        (2, 1, 3, 3)
+        """
+
+        opaque = self.pixels[..., 3] > 0
+        rows = np.flatnonzero(opaque.any(axis=1))
+
+        if len(rows) == 0:
+            return None
+
+        cols = np.flatnonzero(opaque.any(axis=0))
+        return int(cols[0]), int(rows[0]), int(cols[-1] + 1), int(rows[-1] + 1)
+
+    def composite(
+        self,
+        source: Canvas,
+        op: str = "over",
+        mode: str = "normal",
+        dest=(0, 0),
+        box=None,
+    ) -> Canvas:
+        """Composite another canvas onto this one, in place.
+
+        Only the pixels covered by the source are changed, so a source that's smaller
+        than this canvas will leave the rest of it untouched.
+
+        Parameters
+        ----------
+        source:
+            The canvas to composite onto this one.
+        op:
+            The Porter-Duff operator to use, one of :code:`clear`, :code:`source`,
+            :code:`destination`, :code:`over`, :code:`destination_over`, :code:`in`,
+            :code:`destination_in`, :code:`out`, :code:`destination_out`,
+            :code:`atop`, :code:`destination_atop`, :code:`xor` or :code:`plus`.
+        mode:
+            How the colors of the source are mixed with the colors of this canvas, one
+            of :code:`normal`, :code:`multiply`, :code:`screen`, :code:`darken` or
+            :code:`lighten`.
+        dest:
+            The :code:`(x, y)` position on this canvas of the source's top left corner.
+        box:
+            If given, only composite the pixels inside this
+            :code:`(left, upper, right, lower)` box, in the coordinates of this
+            canvas. For example passing the source's :meth:`bbox` skips all the
+            pixels where it's fully transparent.
+        """
+
+        x, y = dest
+        left, upper, right, lower = 0, 0, self.width, self.height
+
+        if box is not None:
+            left, upper = max(left, box[0]), max(upper, box[1])
+            right, lower = min(right, box[2]), min(lower, box[3])
+
+        left, upper = max(left, x), max(upper, y)
+        right, lower = min(right, x + source.width), min(lower, y + source.height)
+
+        if right <= left or lower <= upper:
+            return self
+
+        composite(
+            self.pixels[upper:lower, left:right],
+            source.pixels[upper - y : lower - y, left - x : right - x],
+            op=op,
+            mode=mode,
+        )
+
+        return self
+
+    def copy(self) -> Canvas:
+        """Return a copy of the canvas."""
+        return Canvas(self.pixels.copy())
+
+    def toimage(self) -> Image:
+        """Convert the canvas into an image."""
+        return fromarray(unpremultiply(self.pixels))
+
+
+class Layers:
+    """A stack of colored regions that are flattened into an image all at once.
+
+    .. arlunio-image:: Layers Demo
+       :include-code:
+
+       ::
+
+          import arlunio.image as image
+          import arlunio.shape as shape
+
+          layers = image.Layers(background="white")
+
+          for i, color in enumerate(["#f00", "#0f0", "#00f"]):
+              circle = shape.Circle(xc=(i - 1) * 0.5, r2=0.6)
+              layers.add(circle, color=color, mode="multiply")
+
+          img = layers.flatten(width=512, height=256)
+
+    Drawing a scene by repeatedly calling :func:`fill` composites every layer over
+    the entire image. Instead each pixel is only blended with the layers above the
+    topmost layer that covers it with an opaque color, everything beneath is skipped.
+
+    Parameters
+    ----------
+    background:
+        The color of the image beneath all of the layers, if omitted this will default
+        to transparent.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> layers = image.Layers(background="white")
+    >>> left = np.array([[True, False]])
+    >>> layers.add(left, color="#f00").add(left, color="#00f", mode="screen")
+    Layers(background='white', layers=2)
+    >>> np.asarray(layers.flatten())
+    array([[[255,   0, 255, 255],
+            [255, 255, 255, 255]]], dtype=uint8)
+    """
+
+    def __init__(self, background: Optional[str] = None):
+        self.background = "#0000" if background is None else background
+        self.layers = []
+
+    def __len__(self):
+        return len(self.layers)
+
+    def __repr__(self):
+        return f"Layers(background={self.background!r}, layers={len(self)})"
+
+    def add(self, region, color: Optional[str] = None, mode: str = "normal") -> Layers:
+        """Add a layer to the top of the stack.
+
+        Parameters
+        ----------
+        region:
+            The mask that selects the region to color. As with :func:`fill`, this can
+            also be an array of values between :math:`0` and :math:`1`
+        color:
+            The color of the layer, this can be in any format supported by the
+            :mod:`pillow:PIL.ImageColor` module. If omitted this will default to black.
+        mode:
+            How the color is mixed with the colors beneath it, one of
+            :code:`normal`, :code:`multiply`, :code:`screen`, :code:`darken` or
+            :code:`lighten`.
+        """
+
+        if mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode '{mode}'")
+
+        if not isinstance(region, (np.ndarray, ast.Node)):
+            region = region()
+
+        color = "#000" if color is None else color
+        self.layers.append((region, color, mode))
+
+        return self
+
+    def flatten(
+        self, width: Optional[int] = None, height: Optional[int] = None
+    ) -> Image:
+        """Flatten the layers into a single image.
+
+        Parameters
+        ----------
+        width:
+            The width of the image, only required if it cannot be taken from one of
+            the layers. Layers made from shapes can be drawn at any size, so only
+            layers that depend on an array have a size.
+        height:
+            The height of the image, only required if it cannot be taken from one of
+            the layers.
+        """
+
+        if width is None or height is None:
+            sizes = [_fixed_size(r) for r, _, _ in self.layers]
+            sizes = [size for size in sizes if size is not None]
+
+            if len(sizes) == 0:
+                raise ValueError("You must provide the width and height of the image.")
+
+            width, height = sizes[0]
+
+        layers = [(r, color.getcolorf(c, "RGBA"), m) for r, c, m in self.layers]
+        background = color.getcolorf(self.background, "RGBA")
+
+        backend = NumpyBackend(width=width, height=height)
+        pixels = composite_layers(backend, layers, background)
+
+        pixels *= 255
+        np.rint(pixels, out=pixels)
+
+        return fromarray(pixels.astype(np.uint8))
+
+
+def _default_size():
+    """The size images are drawn at when nothing else decides it."""
+
+    backend = NumpyBackend()
+    return backend.width, backend.height
+
+
+def _fit(size, bounds):
+    """Return the largest size with the same aspect ratio as the given size that fits
+    within the bounds, without making it any larger.
+
+    This is rounded in the same way as :meth:`pillow:PIL.Image.Image.thumbnail`.
+    """
+
+    width, height = size
+    x, y = bounds
+
+    if x >= width and y >= height:
+        return size
+
+    aspect = width / height
+
+    def closest(a, b, key):
+        return max(min(math.floor(a / b), math.ceil(a / b), key=key), 1)
+
+    if x / y >= aspect:
+        return closest(y, 1 / aspect, key=lambda n: abs(aspect - n / y)), y
+
+    return x, closest(x, aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+
+
+def _fixed_size(tree):
+    """Return the size of the first array or image in the given tree, or
+    :code:`None` if it can be drawn at any size."""
+
+    if isinstance(tree, (Image, PImage.Image)):
+        return tree.size
+
+    if isinstance(tree, np.ndarray) and tree.ndim == 2:
+        height, width = tree.shape
+        return width, height
+
+    if not isinstance(tree, ast.Node):
+        return None
+
+    if tree.ntype == ast.NodeType.BUILTIN and tree.attributes["name"] == "array":
+        value = np.asarray(tree.attributes["value"])
+
+        if value.ndim == 2:
+            height, width = value.shape
+            return width, height
+
+    for child in tree.children or []:
+        size = _fixed_size(child)
+
+        if size is not None:
+            return size
+
+    return None
+
+
+class LazyImage(ast.Node):
+    """An image that records the operations used to create it, only drawing them once
+    its pixels are needed.
+
+    This is what :func:`new`, :func:`fill` and :func:`colorramp` return. Operations
+    can be chained together and the image is drawn the first time its pixels are
+    used, e.g. by :code:`np.asarray(img)`, :meth:`save` or when displayed in a
+    notebook. Since the image is also an :class:`arlunio.ast.Node`, the whole graph is
+    evaluated by the backend in one go, with every fill drawn onto a single canvas.
+
+    The size of the image is taken from the first array or image it depends on.
+    Images made only from shapes can be drawn at any size, calling :meth:`thumbnail`
+    on them means they're drawn at the smaller size, rather than being drawn in full
+    and then shrunk.
+
+    Parameters
+    ----------
+    tree:
+        The node that draws the image.
+    size:
+        The :code:`(width, height)` to draw the image at, if omitted the size of the
+        arrays it depends on are used or, failing that, the backend's default.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> import arlunio.shape as shape
+    >>> img = image.fill(shape.Circle(), foreground="red", background="white")
+    >>> img.size is None
+    True
+    >>> img.thumbnail((48, 48))
+    >>> img.size
+    (48, 27)
+    >>> img = img.fill(shape.Circle(xc=0.5, r2=0.2), foreground="blue")
+    >>> np.asarray(img).shape
+    (27, 48, 4)
+    """
+
+    def __init__(self, tree: ast.Node, size=None):
+        super().__init__(tree.ntype, tree.attributes, tree.children)
+
+        self._size = size
+        self._image = None
+
+    def __add__(self, other):
+
+        if not isinstance(other, (Image, LazyImage, PImage.Image)):
+            raise TypeError("Addition is only supported between images.")
+
+        return self.composite(other)
+
+    def __radd__(self, other):
+
+        if not isinstance(other, (Image, PImage.Image)):
+            raise TypeError("Addition is only supported between images.")
+
+        return LazyImage(ast.Node.composite(other, self), size=self._size)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.render().__array__(dtype, copy)
+
+    def _repr_png_(self):
+        return self.render()._repr_png_()
+
+    @property
+    def size(self):
+        """The :code:`(width, height)` the image will be drawn at, or :code:`None` if
+        it can be drawn at any size and one hasn't been chosen."""
+
+        if self._size is not None:
+            return self._size
+
+        return _fixed_size(self)
+
+    @property
+    def array(self) -> np.ndarray:
+        return self.render().array
+
+    @property
+    def img(self) -> PImage.Image:
+        return self.render().img
+
+    @property
+    def mode(self) -> str:
+        return self.render().mode
+
+    def composite(self, source, op: str = "over", mode: str = "normal") -> LazyImage:
+        """Composite another image onto this one.
+
+        See :meth:`Canvas.composite` for the supported operators and blend modes.
+        """
+
+        tree = ast.Node.composite(self, source, op=op, mode=mode)
+        return LazyImage(tree, size=self._size)
+
+    def fill(self, region, foreground: Optional[str] = None) -> LazyImage:
+        """Color in a region of this image.
+
+        See :func:`fill`
+        """
+        return fill(region, foreground=foreground, image=self)
+
+    def progressive(self, size=None, start: int = 16, step: int = 4):
+        """Draw the image a step at a time, starting at a low resolution.
+
+        Each step yields an image :code:`step` times larger than the last, until the
+        image is drawn at its full size. Each preview reuses the previous one, only
+        evaluating the pixels near a change in color, see
+        :meth:`arlunio.backends.numpy.NumpyBackend.refine`. This gives a preview of a
+        scene almost immediately, while the final image keeps rendering. Since
+        previews can miss details smaller than their pixels, the final image is always
+        drawn in full, the same as :meth:`render`. In a notebook
+        the preview can be updated as each step is drawn::
+
+           steps = img.progressive()
+           handle = display(next(steps), display_id=True)
+
+           for step in steps:
+               handle.update(step)
+
+        Images that depend on an array can only be drawn at one size, so the full
+        image is the only step.
+
+        Parameters
+        ----------
+        size:
+            The :code:`(width, height)` to draw the image at, overriding its
+            :attr:`size`.
+        start:
+            How much smaller the first step is than the full image.
+        step:
+            How much larger each step is than the last.
+
+        Example
+        -------
+        >>> import arlunio.image as image
+        >>> import arlunio.shape as shape
+        >>> img = image.fill(shape.Circle(), foreground="red")
+        >>> [step.size for step in img.progressive(size=(320, 180))]
+        [(20, 12), (80, 45), (320, 180)]
+        """
+
+        if step < 2:
+            raise ValueError("Each step must be at least twice the size of the last.")
+
+        size = tuple(size) if size is not None else self.size or _default_size()
+
+        if _fixed_size(self) is not None:
+            yield self.render(size)
+            return
+
+        scales = [max(1, start)]
+
+        while scales[-1] > 1:
+            scales.append(max(1, scales[-1] // step))
+
+        pixels = None
+
+        for scale in scales[:-1]:
+            width, height = (max(1, -(-length // scale)) for length in size)
+            backend = NumpyBackend(width, height)
+
+            if pixels is None:
+                pixels = backend.draw(self)
+            else:
+                pixels = backend.refine(self, pixels)
+
+            yield Image(pixels)
+
+        yield self.render(size)
+
+    def render(self, size=None) -> Image:
+        """Draw the image.
+
+        The result is remembered, so the image is only drawn once.
+
+        Parameters
+        ----------
+        size:
+            The :code:`(width, height)` to draw the image at, overriding its
+            :attr:`size`.
+        """
+
+        if size is not None and tuple(size) != self.size:
+            return self._render(tuple(size))
+
+        if self._image is None:
+            self._image = self._render(self.size)
+
+        return self._image
+
+    def _render(self, size) -> Image:
+
+        size = _default_size() if size is None else size
+        fixed = _fixed_size(self)
+
+        # Arrays can't be redrawn at a different size, so resize the result instead.
+        if fixed is not None and fixed != size:
+            img = self._render(fixed).img
+            return Image(img.resize(size, PImage.BICUBIC, reducing_gap=2.0))
+
+        return Image(NumpyBackend(*size).draw(self))
+
+    def save(self, *args, **kwargs):
+        """Draw the image and save it with the given filename.
+
+        See :meth:`pillow:PIL.Image.Image.save`
+        """
+        self.render().save(*args, **kwargs)
+
+    def thumbnail(self, size):
+        """Shrink the image to fit within the given size, preserving its aspect ratio.
+
+        Unlike :meth:`Image.thumbnail`, this only changes the size the image is drawn
+        at.
+
+        Parameters
+        ----------
+        size:
+            The maximum :code:`(width, height)` of the image.
+        """
+
+        current = self.size or _default_size()
+        fitted = _fit(current, size)
+
+        if fitted == current:
+            return
+
+        self._size = fitted
+        self._image = None
+
+
+def new(color) -> LazyImage:
+    """Creates a new image with the given background color."""
+    return LazyImage(ast.Node.builtin(name="image", color=color))
+
+
+def fromarray(obj, mode: Optional[str] = None) -> Image:
+    """Create an image from an array.
+
+    Arrays that can be held by an :class:`Image` are used as is, so changes made to
+    the array are seen by the image. Any others are converted by pillow.
+
+    See :func:`pillow:PIL.Image.fromarray`
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> pixels = np.zeros((2, 4), dtype=np.uint8)
+    >>> img = image.fromarray(pixels)
+    >>> img.mode, np.shares_memory(np.asarray(img), pixels)
+    ('L', True)
+    """
+
+    array = np.asarray(obj)
+    array_mode = _array_mode(array)
+
+    if array_mode is not None and mode in {None, array_mode}:
+        return Image(np.ascontiguousarray(array))
+
+    return Image(PImage.fromarray(array, mode))
+
+
+_NPY_MAGIC = b"\x93NUMPY"
+
+
+def load(
+    fp,
+    *args,
+    size: Optional[Tuple[int, int]] = None,
+    raw_mode: str = "RGBA",
+    **kwargs,
+) -> Image:
+    """Load an image from the given file.
+
+    Images saved in the :code:`npy` format are mapped into memory, copying the pixels
+    only if they are changed. QOI files are decoded with numpy, which is many times
+    faster than pillow.
+
+    Files without a header, such as those saved in the :code:`raw` or :code:`rgba`
+    formats, need to be given the size and mode of the image, as do file objects
+    containing just the pixels. Every other format is opened with
+    :func:`pillow:PIL.Image.open`, which any other arguments are passed onto.
+
+    Parameters
+    ----------
+    fp:
+        The filepath, or file object to load the image from.
+    size:
+        The :code:`(width, height)` of the image, needed for files without a header.
+    raw_mode:
+        The mode of the pixels in files without a header.
+
+    Example
+    -------
+    >>> import pathlib
+    >>> import tempfile
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> path = pathlib.Path(tempfile.mkdtemp(), "pixels.raw")
+    >>> image.save(image.fromarray(np.zeros((2, 4), dtype=np.uint8)), path)
+    >>> img = image.load(path, size=(4, 2), raw_mode="L")
+    >>> img.mode, img.size
+    ('L', (4, 2))
+    """
+
+    path = pathlib.Path(fp) if isinstance(fp, (str, pathlib.Path)) else None
+    format = _EXTENSIONS.get(path.suffix.lower(), None) if path else None
+
+    if format == "rgba":
+        raw_mode = "RGBA"
+
+    if format in {"raw", "rgba"} or (format is None and size is not None):
+
+        if size is None:
+            raise ValueError(f"The size of the image in '{path.name}' is required")
+
+        if raw_mode not in _CHANNELS:
+            raise ValueError(f"Unsupported mode '{raw_mode}'")
+
+        width, height = size
+        channels = _CHANNELS[raw_mode]
+        shape = (height, width) + ((channels,) if channels > 1 else ())
+
+        if path is None:
+            pixels = np.frombuffer(bytearray(fp.read()), dtype=np.uint8)
+            return Image(pixels.reshape(shape))
+
+        return Image(np.memmap(path, dtype=np.uint8, mode="c", shape=shape))
+
+    if path is None:
+        start = fp.tell()
+        magic = fp.read(len(_NPY_MAGIC))
+        fp.seek(start)
+
+        if magic == _NPY_MAGIC:
+            return Image(np.load(fp))
+
+        if magic.startswith(b"qoif"):
+            return Image(_qoi_decode(fp.read()))
+
+    elif format == "npy":
+        return Image(np.load(path, mmap_mode="c"))
+
+    elif format == "qoi":
+        return Image(_qoi_decode(path.read_bytes()))
+
+    return Image(PImage.open(fp, *args, **kwargs))
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+
+_PNG_FILTERS = {"none": 0, "sub": 1, "up": 2, "paeth": 4}
+
+_PNG_STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+    "huffman": zlib.Z_HUFFMAN_ONLY,
+    "rle": zlib.Z_RLE,
+    "fixed": zlib.Z_FIXED,
+}
+
+_CHANNELS = {"L": 1, "LA": 2, "RGB": 3, "RGBA": 4}
+
+_PNG_BAND_SIZE = 2 ** 20
+"""The approximate number of bytes of pixel data compressed in each band."""
+
+_ZLIB_WINDOW = 2 ** 15
+_ADLER_BASE = 65521
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    """Wrap the data in a PNG chunk of the given type."""
+
+    crc = zlib.crc32(data, zlib.crc32(tag))
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+
+def _png_filter(rows: np.ndarray, above, bpp: int, method: str) -> np.ndarray:
+    """Filter the given rows of the image, returning the scanlines as they are stored
+    in the PNG file.
+
+    Each row only depends on the row above it, so any range of rows can be filtered
+    independently given :code:`above`, the row before the first one. This is
+    :code:`None` when the rows start at the top of the image.
+    """
+
+    if above is None:
+        above = np.zeros(rows.shape[1], dtype=np.uint8)
+
+    scanlines = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    scanlines[:, 0] = _PNG_FILTERS[method]
+    result = scanlines[:, 1:]
+
+    if len(rows) == 0:
+        return scanlines
+
+    # Filtering is done modulo 256, which is exactly how uint8 arithmetic behaves.
+    if method == "none":
+        result[...] = rows
+
+    elif method == "sub":
+        result[:, :bpp] = rows[:, :bpp]
+        np.subtract(rows[:, bpp:], rows[:, :-bpp], out=result[:, bpp:])
+
+    elif method == "up":
+        np.subtract(rows[:1], above, out=result[:1])
+        np.subtract(rows[1:], rows[:-1], out=result[1:])
+
+    else:
+        current = rows.astype(np.int16)
+
+        previous = np.empty_like(current)
+        previous[0] = above
+        previous[1:] = current[:-1]
+
+        left = np.zeros_like(current)
+        left[:, bpp:] = current[:, :-bpp]
+
+        upleft = np.zeros_like(current)
+        upleft[:, bpp:] = previous[:, :-bpp]
+
+        # Predict each byte with whichever neighbour is closest to left + above - upleft
+        pa = np.abs(previous - upleft)
+        pb = np.abs(left - upleft)
+        pc = np.abs(left + previous - 2 * upleft)
+
+        predictor = np.where(pb <= pc, previous, upleft)
+        predictor = np.where((pa <= pb) & (pa <= pc), left, predictor)
+
+        result[...] = (current - predictor) & 0xFF
+
+    return scanlines
+
+
+def _zlib_header(level: int) -> bytes:
+    """Return the header of a zlib stream compressed at the given level, see RFC 1950"""
+
+    if level < 0:
+        level = 6
+
+    # The header also records roughly how hard the compressor tried.
+    flags = bisect.bisect([2, 6, 7], level) << 6
+    flags += 31 - ((0x78 << 8) + flags) % 31
+
+    return bytes([0x78, flags])
+
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """Combine the adler32 checksums of two consecutive pieces of data, as zlib's
+    adler32_combine."""
+
+    rem = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % _ADLER_BASE
+
+    sum1 = (sum1 + (adler2 & 0xFFFF) + _ADLER_BASE - 1) % _ADLER_BASE
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + _ADLER_BASE - rem) % _ADLER_BASE
+
+    return sum1 | (sum2 << 16)
+
+
+class _PNGEncoder:
+    """Encodes an image as a PNG file, a band of rows at a time.
+
+    Each band is split further into pieces of around :data:`_PNG_BAND_SIZE` bytes
+    which are filtered and compressed independently, and so in parallel. Each piece
+    is compressed as part of a single deflate stream by flushing to a byte boundary at
+    the end of it and priming the compressor with the data that came before.
+    """
+
+    modes = set(_PNG_COLOR_TYPES)
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        mode: str,
+        *,
+        compression: int = 6,
+        strategy: str = "default",
+        filter: str = "up",
+        workers: Optional[int] = None,
+    ):
+
+        if mode not in _PNG_COLOR_TYPES:
+            raise ValueError(f"PNG files do not support the '{mode}' mode")
+
+        if filter not in _PNG_FILTERS:
+            raise ValueError(f"Unknown PNG filter '{filter}'")
+
+        if strategy not in _PNG_STRATEGIES:
+            raise ValueError(f"Unknown compression strategy '{strategy}'")
+
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.bpp = _CHANNELS[mode]
+
+        self.compression = compression
+        self.strategy = strategy
+        self.filter = filter
+        self.workers = workers
+
+        self.rows = 0
+        """The number of rows encoded so far."""
+
+        self._above = None
+        self._tail = None
+        self._adler = 1
+        self._prefix = _zlib_header(compression)
+
+    def header(self) -> bytes:
+        color_type = _PNG_COLOR_TYPES[self.mode]
+        size = (self.width, self.height)
+        header = struct.pack(">IIBBBBB", *size, 8, color_type, 0, 0, 0)
+
+        return _PNG_SIGNATURE + _png_chunk(b"IHDR", header)
+
+    def _compressor(self, zdict):
+        kwargs = {} if zdict is None else {"zdict": zdict}
+        strategy = _PNG_STRATEGIES[self.strategy]
+
+        return zlib.compressobj(
+            self.compression, zlib.DEFLATED, -15, 9, strategy, **kwargs
+        )
+
+    def encode(self, rows: np.ndarray):
+        """Encode the next band of rows, returning the chunks to write.
+
+        The rows should be given as an array with shape :code:`(n, width * bpp)`
+        """
+
+        stride = rows.shape[1] + 1
+        n = max(1, _PNG_BAND_SIZE // stride)
+        window = -(-_ZLIB_WINDOW // stride)
+
+        pieces = [(i, min(i + n, len(rows))) for i in range(0, len(rows), n)]
+        done = self.rows + len(rows) == self.height
+        above, tail = self._above, self._tail
+
+        def deflate(piece):
+            start, stop = piece
+            previous = rows[start - 1] if start > 0 else above
+            data = _png_filter(rows[start:stop], previous, self.bpp, self.filter)
+
+            # The dictionary must be exactly the data that comes before this piece.
+            if start == 0:
+                zdict = tail
+            else:
+                first = max(0, start - window)
+                before = rows[first - 1] if first else above
+
+                zdict = _png_filter(rows[first:start], before, self.bpp, self.filter)
+                zdict = zdict.reshape(-1)[-_ZLIB_WINDOW:]
+
+            compressor = self._compressor(zdict)
+            flush = zlib.Z_FINISH if done and stop == len(rows) else zlib.Z_SYNC_FLUSH
+
+            compressed = compressor.compress(data) + compressor.flush(flush)
+            return compressed, zlib.adler32(data), data
+
+        chunks = []
+
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+            for compressed, checksum, data in pool.map(deflate, pieces):
+                self._adler = _adler32_combine(self._adler, checksum, data.nbytes)
+                self._tail = data.reshape(-1)[-_ZLIB_WINDOW:].copy()
+
+                chunks.append(_png_chunk(b"IDAT", self._prefix + compressed))
+                self._prefix = b""
+
+        if len(rows) > 0:
+            self._above = rows[-1].copy()
+
+        self.rows += len(rows)
+        return chunks
+
+    def finish(self):
+        """Return the chunks that end the file."""
+
+        chunks = []
+
+        # An empty image still needs a complete deflate stream
+        if self.height == 0:
+            stream = self._prefix + self._compressor(None).flush()
+            chunks.append(_png_chunk(b"IDAT", stream))
+
+        # The data in each IDAT chunk is concatenated, so the checksum that ends the
+        # zlib stream can have a chunk of its own.
+        chunks.append(_png_chunk(b"IDAT", struct.pack(">I", self._adler)))
+        chunks.append(_png_chunk(b"IEND", b""))
+
+        return chunks
+
+
+class _RawEncoder:
+    """Writes the pixel values exactly as they are, with no header."""
+
+    name = "Raw"
+    modes = set(_CHANNELS)
+
+    def __init__(self, width: int, height: int, mode: str):
+
+        if mode not in self.modes:
+            raise ValueError(f"{self.name} files do not support the '{mode}' mode")
+
+        self.width = width
+        self.height = height
+        self.mode = mode
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: np.ndarray):
+        return [rows]
+
+    def finish(self):
+        return []
+
+
+class _PPMEncoder(_RawEncoder):
+    """Writes binary PGM or PPM files, depending on the mode."""
+
+    name = "PPM"
+    modes = {"L", "RGB"}
+
+    def header(self) -> bytes:
+        magic = "P5" if self.mode == "L" else "P6"
+        return f"{magic}\n{self.width} {self.height}\n255\n".encode("ascii")
+
+
+_TIFF_MAX_SIZE = 2 ** 31
+"""Images with more bytes of pixel data than this are written as BigTIFF files."""
+
+_TIFF_STRIP_SIZE = 2 ** 16
+"""The approximate number of bytes in each strip of a TIFF file."""
+
+_TIFF_SHORT, _TIFF_LONG, _TIFF_LONG8 = 3, 4, 16
+
+_TIFF_FORMATS = {_TIFF_SHORT: "<u2", _TIFF_LONG: "<u4", _TIFF_LONG8: "<u8"}
+
+
+def _tiff_ifd(entries, offset: int, big: bool) -> bytes:
+    """Return the image file directory holding the given :code:`(tag, type, values)`
+    entries, to be written at the given offset.
+
+    Any values that do not fit in their entry are written immediately after the
+    directory.
+    """
+
+    count, field = ("<Q", 8) if big else ("<H", 4)
+    entry, pointer = ("<HHQ", "<Q") if big else ("<HHI", "<I")
+
+    # Each entry ends with its value, and the directory with the offset of the next.
+    size = struct.calcsize(count) + len(entries) * (struct.calcsize(entry) + field)
+    size += field
+    body, extra = [], b""
+
+    for tag, type_, values in sorted(entries):
+        data = np.asarray(values, dtype=_TIFF_FORMATS[type_]).tobytes()
+
+        if len(data) <= field:
+            value = data.ljust(field, b"\0")
+        else:
+            value = struct.pack(pointer, offset + size + len(extra))
+            extra += data + b"\0" * (len(data) % 2)
+
+        body.append(struct.pack(entry, tag, type_, len(values)) + value)
+
+    return struct.pack(count, len(entries)) + b"".join(body) + bytes(field) + extra
+
+
+class _TIFFEncoder(_RawEncoder):
+    """Writes uncompressed TIFF files.
+
+    Since the data is not compressed, the position of every strip is known in advance
+    and the image file directory can be written once all the pixels have been.
+    """
+
+    name = "TIFF"
+
+    def __init__(self, width: int, height: int, mode: str):
+        super().__init__(width, height, mode)
+
+        stride = width * _CHANNELS[mode]
+        size = stride * height
+
+        self.big = size > _TIFF_MAX_SIZE
+        self.start = 16 if self.big else 8
+        self.end = self.start + size + size % 2
+
+        self.rows_per_strip = max(1, _TIFF_STRIP_SIZE // stride)
+        strips = -(-height // self.rows_per_strip)
+
+        self.offsets = self.start + np.arange(strips) * self.rows_per_strip * stride
+        self.counts = np.full(strips, self.rows_per_strip * stride)
+        self.counts[-1] = size - self.rows_per_strip * stride * (strips - 1)
+
+    def header(self) -> bytes:
+
+        if self.big:
+            return b"II+\0" + struct.pack("<HHQ", 8, 0, self.end)
+
+        return b"II*\0" + struct.pack("<I", self.end)
+
+    def finish(self):
+        channels = _CHANNELS[self.mode]
+        offset = _TIFF_LONG8 if self.big else _TIFF_LONG
+
+        entries = [
+            (256, _TIFF_LONG, [self.width]),
+            (257, _TIFF_LONG, [self.height]),
+            (258, _TIFF_SHORT, [8] * channels),
+            (259, _TIFF_SHORT, [1]),
+            (262, _TIFF_SHORT, [1 if channels < 3 else 2]),
+            (273, offset, self.offsets),
+            (277, _TIFF_SHORT, [channels]),
+            (278, _TIFF_LONG, [self.rows_per_strip]),
+            (279, offset, self.counts),
+            (284, _TIFF_SHORT, [1]),
+        ]
+
+        # Mark the final channel as unassociated alpha
+        if self.mode in {"LA", "RGBA"}:
+            entries.append((338, _TIFF_SHORT, [2]))
+
+        padding = b"\0" * (self.end - self.start - int(self.counts.sum()))
+        return [padding + _tiff_ifd(entries, self.end, self.big)]
+
+
+class _RGBAEncoder(_RawEncoder):
+    """Writes raw RGBA pixels, with no header."""
+
+    name = "RGBA"
+    modes = {"RGBA"}
+
+
+class _NPYEncoder(_RawEncoder):
+    """Writes the pixels as a numpy array, see :func:`numpy:numpy.save`.
+
+    The header only needs the shape of the array, so the pixels can be written as
+    they are.
+    """
+
+    name = "NPY"
+
+    def header(self) -> bytes:
+        channels = _CHANNELS[self.mode]
+        shape = (self.height, self.width) + ((channels,) if channels > 1 else ())
+
+        header = {"descr": "|u1", "fortran_order": False, "shape": shape}
+
+        with io.BytesIO() as stream:
+            np.lib.format.write_array_header_1_0(stream, header)
+            return stream.getvalue()
+
+
+_QOI_BAND_SIZE = 2 ** 18
+"""The approximate number of pixels in each piece of a band that's encoded at once."""
+
+_QOI_MAX_RUN = 62
+
+_QOI_OP_INDEX, _QOI_OP_DIFF, _QOI_OP_LUMA, _QOI_OP_RUN = 0x00, 0x40, 0x80, 0xC0
+_QOI_OP_RGB, _QOI_OP_RGBA = 0xFE, 0xFF
+
+_QOI_END = b"\0" * 7 + b"\x01"
+
+
+def _qoi_hash(pixels: np.ndarray) -> np.ndarray:
+    """Return the position of each RGBA pixel in the table of recently seen pixels."""
+
+    # The table has 64 entries, so the sum can be allowed to overflow.
+    r, g, b, a = pixels.T
+    return (r * 3 + g * 5 + b * 7 + a * 11) & 63
+
+
+class _QOIEncoder(_RawEncoder):
+    """Writes QOI files, see https://qoiformat.org
+
+    Each pixel is encoded relative to the one before it, which makes the format
+    inherently serial. However, whether a pixel is a repeat of the previous pixel, or
+    of the last pixel with the same hash, can be decided for a whole band at once by
+    sorting the pixels by their hash. The previous pixel, the table of recently seen
+    pixels and any unfinished run are carried over from one band to the next.
+    """
+
+    name = "QOI"
+    modes = {"RGB", "RGBA"}
+
+    def __init__(self, width: int, height: int, mode: str):
+        super().__init__(width, height, mode)
+
+        self.rows = 0
+        """The number of rows encoded so far."""
+
+        self._previous = np.array([0, 0, 0, 255], dtype=np.uint8).view("<u4")[0]
+        self._index = np.zeros(64, dtype="<u4")
+        self._run = 0
+
+    def header(self) -> bytes:
+        channels = _CHANNELS[self.mode]
+        return b"qoif" + struct.pack(">IIBB", self.width, self.height, channels, 0)
+
+    def encode(self, rows: np.ndarray):
+        """Encode the next band of rows, returning the bytes to write.
+
+        The rows should be given as an array with shape :code:`(n, width * channels)`
+        """
+
+        done = self.rows + len(rows) == self.height
+        n = max(1, _QOI_BAND_SIZE // self.width)
+        chunks = []
+
+        for start in range(0, len(rows), n):
+            stop = min(start + n, len(rows))
+            last = done and stop == len(rows)
+
+            chunks.append(self._encode(rows[start:stop], last))
+
+        self.rows += len(rows)
+        return chunks
+
+    def _encode(self, rows: np.ndarray, last: bool) -> bytes:
+        channels = _CHANNELS[self.mode]
+        pixels = rows.reshape(-1, channels)
+
+        if channels == 3:
+            alpha = np.full((len(pixels), 1), 255, dtype=np.uint8)
+            pixels = np.concatenate([pixels, alpha], axis=1)
 
-    def __init__(self, img: PImage.Image):
-        self.img = img
-        """The wrapped pillow image object."""
+        values = np.ascontiguousarray(pixels).view("<u4").reshape(-1)
 
-    def __eq__(self, other):
+        previous = np.empty_like(values)
+        previous[0] = self._previous
+        previous[1:] = values[:-1]
 
-        if not isinstance(other, Image):
-            return False
+        run = values == previous
+        single = np.flatnonzero(~run)
 
-        a = np.asarray(self.img)
-        b = np.asarray(other.img)
+        # Pixels in a run never change the table, so only the others need looking up.
+        # Starting each group with the current contents of the table, a pixel can be
+        # found in the table if it's equal to the pixel before it in its group.
+        px = values[single]
+        hashes = _qoi_hash(px.view(np.uint8).reshape(-1, 4))
 
-        return (a == b).all()
+        keys = np.concatenate([np.arange(64, dtype=np.uint8), hashes])
+        table = np.concatenate([self._index, px])
 
-    def __add__(self, other):
+        order = np.argsort(keys, kind="stable")
+        grouped = table[order]
 
-        if isinstance(other, Image):
-            other = other.img
+        found = np.empty(len(order), dtype=bool)
+        found[order[1:]] = grouped[1:] == grouped[:-1]
+        found = found[64:]
 
-        if not isinstance(other, PImage.Image):
-            raise TypeError("Addition is only supported between images.")
+        ends = np.searchsorted(keys[order], np.arange(64), side="right") - 1
+        self._index = grouped[ends]
+        self._previous = values[-1]
 
-        img = self.copy()
-        img.alpha_composite(other)
+        # Runs are split into pieces of at most 62 pixels, each encoded by one byte at
+        # the position of the first pixel in the piece.
+        edges = np.diff(np.concatenate([[0], run.astype(np.int8), [0]]))
+        starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        counts = stops - starts
 
-        return img
+        prefix = b""
 
-    @property
-    def __array_interface__(self):
-        # Ensure that our version of an image also plays nice with numpy.
-        return self.img.__array_interface__
+        if len(starts) > 0 and starts[0] == 0:
+            counts[0] += self._run
 
-    def _repr_png_(self):
-        # Give nice previews in jupyter notebooks
-        return self.img._repr_png_()
+        elif self._run > 0:
+            prefix = bytes([_QOI_OP_RUN | (self._run - 1)])
 
-    @property
-    def size(self):
-        return self.img.size
+        self._run = 0
+        pieces = -(-counts // _QOI_MAX_RUN)
 
-    def alpha_composite(self, im, *args, **kwargs):
-        """Composites an image onto this image.
+        # An unfinished run could continue into the next band.
+        if not last and len(stops) > 0 and stops[-1] == len(run):
+            self._run = int(counts[-1] % _QOI_MAX_RUN)
+            pieces[-1] = counts[-1] // _QOI_MAX_RUN
 
-        See :meth:`pillow:PIL.Image.Image.alpha_composite`
-        """
+        first = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        piece = np.arange(len(first)) - first
 
-        if isinstance(im, Image):
-            im = im.img
+        remaining = np.repeat(counts, pieces) - piece * _QOI_MAX_RUN
+        length = np.minimum(remaining, _QOI_MAX_RUN) - 1
 
-        self.img.alpha_composite(im, *args, **kwargs)
+        emitted = ~run
+        emitted[np.repeat(starts, pieces) + piece] = True
+        runs = run[emitted]
 
-    def copy(self):
-        """Return a copy of the image.
-        See :meth:`pillow:PIL.Image.Image.copy`
-        """
-        return Image(self.img.copy())
+        # Every other pixel not found in the table is encoded by its difference from
+        # the previous pixel, or failing that its value.
+        other = ~found
+        tokens = np.flatnonzero(~runs)[other]
 
-    def paste(self, *args, **kwargs):
-        """Paste another image into this image.
+        px = px[other].view(np.uint8).reshape(-1, 4)
+        prev = previous[single[other]].view(np.uint8).reshape(-1, 4)
 
-        See :meth:`pillow:PIL.Image.Image.paste`
-        """
-        self.img.paste(*args, **kwargs)
+        # Differences wrap around, as they do when decoding
+        dr, dg, db = (px[:, :3] - prev[:, :3]).view(np.int8).T
+        dr_dg = dr - dg
+        db_dg = db - dg
 
-    def save(self, *args, **kwargs):
-        """Save the image with the given filename.
+        rgb = px[:, 3] == prev[:, 3]
+        diff = rgb & (dr >= -2) & (dr <= 1) & (dg >= -2) & (dg <= 1)
+        diff &= (db >= -2) & (db <= 1)
 
-        See :meth:`pillow:PIL.Image.Image.save`
-        """
-        self.img.save(*args, **kwargs)
+        luma = rgb & ~diff & (dg >= -32) & (dg <= 31)
+        luma &= (dr_dg >= -8) & (dr_dg <= 7) & (db_dg >= -8) & (db_dg <= 7)
 
-    def thumbnail(self, *args, **kwargs):
-        """Convert this image into a thumbail.
+        rgb &= ~diff & ~luma
+        rgba = px[:, 3] != prev[:, 3]
 
-        See :meth:`pillow:PIL.Image.Image.thumbnail`
-        """
+        lengths = np.ones(len(runs), dtype=np.int64)
+        lengths[tokens[luma]] = 2
+        lengths[tokens[rgb]] = 4
+        lengths[tokens[rgba]] = 5
 
-        self.img.thumbnail(*args, **kwargs)
+        offsets = np.cumsum(lengths) - lengths
+        data = np.empty(offsets[-1] + lengths[-1] if len(runs) else 0, dtype=np.uint8)
 
+        data[offsets[runs]] = _QOI_OP_RUN | length.astype(np.uint8)
+        data[offsets[~runs][found]] = _QOI_OP_INDEX | hashes[found]
 
-def new(color) -> Image:
-    """Creates a new image with the given background color."""
-    return ast.Node.builtin(name="image", color=color)
+        d = (dr[diff] + 2) << 4 | (dg[diff] + 2) << 2 | (db[diff] + 2)
+        data[offsets[tokens[diff]]] = _QOI_OP_DIFF | d.astype(np.uint8)
 
+        at = offsets[tokens[luma]]
+        data[at] = _QOI_OP_LUMA | (dg[luma] + 32).astype(np.uint8)
+        data[at + 1] = ((dr_dg[luma] + 8) << 4 | (db_dg[luma] + 8)).astype(np.uint8)
 
-def fromarray(*args, **kwargs):
-    """Create an image from an array
+        at = offsets[tokens[rgb]]
+        data[at] = _QOI_OP_RGB
 
-    See :func:`pillow:PIL.Image.fromarray`
+        for i in range(3):
+            data[at + i + 1] = px[rgb, i]
+
+        at = offsets[tokens[rgba]]
+        data[at] = _QOI_OP_RGBA
+
+        for i in range(4):
+            data[at + i + 1] = px[rgba, i]
+
+        return prefix + data.tobytes()
+
+    def finish(self):
+        return [_QOI_END]
+
+
+def _resolve(pointers: np.ndarray, values: np.ndarray, mask: int) -> np.ndarray:
+    """Given a forest of pointers to earlier entries, where :code:`-1` marks a root,
+    return the sum of the values along the path from each entry to its root.
+
+    The sums are computed by repeatedly pointing each entry at its grandparent, with
+    the given mask applied to each sum.
     """
-    return Image(PImage.fromarray(*args, **kwargs))
 
+    pointers, values = pointers.copy(), values.copy()
+    linked = np.flatnonzero(pointers >= 0)
 
-def load(*args, **kwargs) -> Image:
-    """Load an image from the given file.
+    while len(linked) > 0:
+        parents = pointers[linked]
+
+        values[linked] = (values[linked] + values[parents]) & mask
+        pointers[linked] = pointers[parents]
+
+        linked = linked[pointers[linked] >= 0]
+
+    return values
+
+
+def _qoi_starts(stream: np.ndarray) -> np.ndarray:
+    """Return the position of every op in the given QOI data.
+
+    Most ops are a single byte, so only the positions of the bytes that could start a
+    longer op need following. The ops that are followed are found by doubling the
+    number of steps taken each time.
+    """
+
+    n = len(stream)
+    lengths = np.zeros(n, dtype=np.int64)
+    lengths[stream >> 6 == 2] = 2
+    lengths[stream == _QOI_OP_RGB] = 4
+    lengths[stream == _QOI_OP_RGBA] = 5
+
+    # From each of these, the next one reached is the first one after the op.
+    longer = np.flatnonzero(lengths)
+    rank = np.cumsum(np.append(0, lengths > 0), dtype=np.int32)
+
+    jump = rank[np.minimum(longer + lengths[longer], n)]
+    jump = np.append(jump, np.int32(len(longer)))
+
+    path = np.zeros(1, dtype=np.int32)
+
+    while path[-1] < len(longer):
+        path = np.concatenate([path, jump[path]])
+        jump = jump[jump]
+
+    # Every byte but the rest of each longer op is the start of an op.
+    path = longer[path[path < len(longer)]]
+    counts = lengths[path] - 1
+
+    inside = np.repeat(path - np.cumsum(counts) + counts, counts)
+    inside += np.arange(len(inside)) + 1
+
+    starts = np.ones(n, dtype=bool)
+    starts[inside[inside < n]] = False
+
+    return np.flatnonzero(starts)
+
+
+def _qoi_decode(data: bytes) -> np.ndarray:
+    """Decode the given QOI file into an array of pixels.
+
+    The file is decoded in a handful of passes over all of its pixels at once, rather
+    than one pixel at a time.
+
+    - Each pixel is either given explicitly, taken from the table of recently seen
+      pixels, or the sum of a number of differences from the most recent such pixel.
+    - Pixels taken from the table are resolved as in :class:`_QOIEncoder`, grouping
+      the pixels by their hash to find the pixel each one refers to, then following
+      the references back to an explicitly given pixel.
+    - The hash of a pixel is known without decoding it, except for its alpha value
+      when that's taken from the table. This is assumed to be the last explicitly
+      given alpha value, and corrected until the decoded image agrees.
+    """
+
+    magic, width, height, channels, _ = struct.unpack(">4sIIBB", data[:14])
+
+    if magic != b"qoif" or channels not in {3, 4}:
+        raise ValueError("Not a QOI file")
+
+    stream = np.frombuffer(data, dtype=np.uint8, offset=14)
+    size = width * height
+
+    starts = _qoi_starts(stream)
+    ops = stream[starts]
+
+    run = (ops >> 6 == 3) & (ops < _QOI_OP_RGB)
+    counts = np.where(run, (ops & 63) + 1, 1)
+    covered = np.cumsum(counts)
+
+    if len(covered) == 0 or covered[-1] < size:
+        raise ValueError("The QOI file is truncated")
+
+    # Only as many ops as are needed to cover the image, with an extra op standing
+    # in for the pixel before the image.
+    count = np.searchsorted(covered, size) + 1
+    starts, counts = np.append(-1, starts[:count]), counts[:count]
+    ops = np.append(np.uint8(_QOI_OP_RGBA), ops[:count])
+
+    if starts[-1] + 5 > len(stream):
+        stream = np.append(stream, np.zeros(5, dtype=np.uint8))
+
+    tag = ops >> 6
+    index, diff, luma = tag == 0, tag == 1, tag == 2
+    rgba = ops == _QOI_OP_RGBA
+    given = rgba | (ops == _QOI_OP_RGB)
+
+    # The channels of each pixel, which are either given explicitly or the sum of the
+    # differences since the last explicit value. Differences wrap around, as do
+    # their sums.
+    values = [np.zeros(len(ops), dtype=np.uint8) for _ in range(4)]
+    deltas = [((ops >> s & 3) - np.uint8(2)) * diff for s in [4, 2, 0]]
+
+    for i in range(4):
+        positions = np.flatnonzero(given if i < 3 else rgba)
+        values[i][positions] = stream[starts[positions] + i + 1]
+
+    positions = np.flatnonzero(luma)
+    dg = (ops[positions] & 63) - np.uint8(32)
+    arg = stream[starts[positions] + 1]
+
+    deltas[0][positions] = dg + (arg >> 4) - np.uint8(8)
+    deltas[1][positions] = dg
+    deltas[2][positions] = dg + (arg & 15) - np.uint8(8)
+
+    for value, initial in zip(values, [0, 0, 0, 255]):
+        value[0] = initial
+
+    # Each pixel's color and alpha are relative to the most recent pixel which gives
+    # them explicitly, or takes them from the table.
+    positions = np.arange(len(ops))
+    color = np.maximum.accumulate(np.where(given | index, positions, 0))
+    alpha = np.maximum.accumulate(np.where(rgba | index, positions, 0))
+    last = np.maximum.accumulate(np.where(rgba, positions, 0))
+
+    totals = [np.cumsum(d, dtype=np.uint8) for d in deltas]
+    offsets = [t - t[color] for t in totals]
+
+    # Hashes are linear, so the hash of each pixel is the hash of the pixel it's
+    # relative to, plus the hash of the differences.
+    r, g, b, _ = values
+    hashes = np.where(index, ops & 63, r * 3 + g * 5 + b * 7)
+
+    r, g, b = totals
+    sums = r * 3 + g * 5 + b * 7
+    relative = hashes[color] + sums - sums[color]
+
+    tabled = index[color]
+    found = np.flatnonzero(index)
+
+    lookup = np.full(len(ops), -1)
+    lookup[found] = np.arange(len(found))
+
+    # Start by guessing that each pixel from the table has the last explicitly given
+    # alpha value, which is always right for images without any.
+    alphas = values[3][found] = values[3][last[found]]
+    opaque = not rgba[1:].any()
+
+    while True:
+        # Hash every pixel, using the current guess for each alpha value.
+        keys = (relative + np.where(tabled, 0, values[3][alpha] * 11)) & 63
+        keys[0] = 64
+
+        # As when encoding, each pixel from the table refers to the one before it in
+        # its group. If there isn't one, the table holds transparent black.
+        order = np.argsort(keys, kind="stable")
+
+        before = np.zeros(len(ops), dtype=np.int64)
+        before[order[1:]] = order[:-1]
+
+        refers = before[found]
+        missing = keys[refers] != keys[found]
+
+        if opaque and not missing.any():
+            break
+
+        # Follow the references back to an explicitly given alpha value.
+        source = alpha[refers]
+        parents = np.where(index[source] & ~missing, lookup[source], -1)
+        resolved = np.where(index[source] | missing, 0, values[3][source])
+
+        guess, alphas = alphas, _resolve(parents, resolved, 0xFF)
+        values[3][found] = alphas
+
+        # The references only change if the guess was wrong.
+        if (alphas == guess).all():
+            break
+
+    # Then follow them back to an explicitly given color, with the colors packed into
+    # fields wide enough to add two values before wrapping them around.
+    source = color[refers]
+    explicit = ~tabled[refers]
+    packed = np.zeros(len(found), dtype=np.int64)
+
+    for i in range(3):
+        value = offsets[i][refers] + values[i][source] * explicit
+        packed |= value.astype(np.int64) << (16 * i)
+
+    parents = np.where(tabled[refers] & ~missing, lookup[source], -1)
+    colors = _resolve(parents, np.where(missing, 0, packed), 0xFF00FF00FF)
+
+    for i in range(3):
+        values[i][found] = colors >> (16 * i)
+
+    pixels = np.empty((len(ops) - 1, 4), dtype=np.uint8)
+
+    for i in range(3):
+        pixels[:, i] = values[i][color[1:]] + offsets[i][1:]
+
+    pixels[:, 3] = values[3][alpha[1:]]
+
+    if run.any():
+        pixels = np.repeat(pixels, counts, axis=0)[:size]
+
+    return np.ascontiguousarray(pixels.reshape(height, width, 4)[:, :, :channels])
+
+
+_WEBP_MAX_SIZE = 16383
+
+
+class _WebPEncoder(_RawEncoder):
+    """Writes WebP files, lossless by default.
+
+    Pillow can only encode a complete image, so the rows are collected until all of
+    them have been written.
+    """
+
+    name = "WebP"
+    modes = {"RGB", "RGBA"}
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        mode: str,
+        *,
+        lossless: bool = True,
+        quality: int = 0,
+        method: int = 0,
+    ):
+        super().__init__(width, height, mode)
+
+        if not features.check("webp"):
+            raise ValueError("This version of pillow does not support WebP files")
+
+        if max(width, height) > _WEBP_MAX_SIZE:
+            raise ValueError(f"WebP files can be at most {_WEBP_MAX_SIZE} pixels wide")
+
+        self.lossless = lossless
+        self.quality = quality
+        self.method = method
+
+        self._rows = []
+
+    def encode(self, rows: np.ndarray):
+        self._rows.append(rows)
+        return []
+
+    def finish(self):
+        shape = (self.height, self.width, _CHANNELS[self.mode])
+        pixels = np.concatenate(self._rows).reshape(shape)
+
+        options = dict(lossless=self.lossless, quality=self.quality, method=self.method)
+
+        # Otherwise the color of transparent pixels is not kept
+        options["exact"] = self.lossless
+
+        with io.BytesIO() as stream:
+            PImage.fromarray(pixels).save(stream, "WEBP", **options)
+            return [stream.getvalue()]
+
+
+_ENCODERS = {
+    "npy": _NPYEncoder,
+    "png": _PNGEncoder,
+    "ppm": _PPMEncoder,
+    "qoi": _QOIEncoder,
+    "raw": _RawEncoder,
+    "rgba": _RGBAEncoder,
+    "tiff": _TIFFEncoder,
+    "webp": _WebPEncoder,
+}
+
+_EXTENSIONS = {
+    ".npy": "npy",
+    ".png": "png",
+    ".pgm": "ppm",
+    ".ppm": "ppm",
+    ".qoi": "qoi",
+    ".raw": "raw",
+    ".rgba": "rgba",
+    ".tif": "tiff",
+    ".tiff": "tiff",
+    ".webp": "webp",
+}
+
+
+def _stream(image, format: str = "png", **options):
+    """Encode the image in the given format, yielding it a chunk at a time.
+
+    Takes the same options as :func:`save`.
+    """
+
+    if isinstance(image, LazyImage):
+        image = image.render()
+
+    encoder = _ENCODERS[format]
+
+    if isinstance(image, Image) and image.mode in encoder.modes:
+        pixels, mode = image.array, image.mode
+
+    else:
+        img = image.img if isinstance(image, Image) else image
+
+        if img.mode not in encoder.modes:
+            img = img.convert("RGBA" if "RGBA" in encoder.modes else "RGB")
+
+        pixels, mode = np.asarray(img), img.mode
+
+    height, width = pixels.shape[:2]
+    encoder = encoder(width, height, mode, **options)
+
+    yield encoder.header()
+    yield from encoder.encode(pixels.reshape(height, -1))
+    yield from encoder.finish()
+
+
+class Writer:
+    """Write an image to a file a band of rows at a time.
+
+    Only the band currently being written needs to be held in memory, so this can be
+    used to produce images that are far larger than would fit in memory all at once.
+
+    ::
+
+       import numpy as np
+       import arlunio.image as image
+
+       width, height, rows = 50000, 50000, 500
+       gradient = np.linspace(0, 255, width).astype(np.uint8)
+
+       with image.Writer("gradient.png", width, height, mode="L") as writer:
+           for y in range(0, height, rows):
+               writer.write(np.broadcast_to(gradient, (rows, width)))
 
-    See :func:`pillow:PIL.Image.open`
+    Parameters
+    ----------
+    filename:
+        The filepath to write the image to.
+    width:
+        The width of the image in pixels.
+    height:
+        The height of the image in pixels.
+    mode:
+        The pillow mode describing the pixels, one of :code:`L`, :code:`LA`,
+        :code:`RGB` or :code:`RGBA`.
+    format:
+        The file format to write, one of the formats listed in :func:`save`. If
+        omitted this is chosen based on the filename's extension.
+    mkdirs:
+        If true, make any parent directories
+    options:
+        Any other options are passed onto the encoder, these are the same as the
+        options taken by :func:`save`.
+
+        WebP files can only be encoded once all the rows have been written, so the
+        complete image is held in memory.
+
+    Example
+    -------
+    >>> import pathlib
+    >>> import tempfile
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> path = pathlib.Path(tempfile.mkdtemp(), "band.ppm")
+    >>> with image.Writer(path, 4, 2, mode="RGB") as writer:
+    ...     writer.write(np.zeros((1, 4, 3), dtype=np.uint8))
+    ...     writer.write(np.full((1, 4, 3), 255, dtype=np.uint8))
+    >>> np.asarray(image.load(path))[:, :, 0]
+    array([[  0,   0,   0,   0],
+           [255, 255, 255, 255]], dtype=uint8)
     """
-    return Image(PImage.open(*args, **kwargs))
 
+    def __init__(
+        self,
+        filename: str,
+        width: int,
+        height: int,
+        *,
+        mode: str = "RGBA",
+        format: Optional[str] = None,
+        mkdirs: bool = False,
+        **options,
+    ):
+
+        if width <= 0 or height <= 0:
+            raise ValueError("The image must have a positive width and height.")
+
+        path = pathlib.Path(filename)
+
+        if format is None:
+            format = _EXTENSIONS.get(path.suffix.lower(), None)
+
+        if format not in _ENCODERS:
+            raise ValueError(f"Unable to write images to '{path.name}'")
+
+        if mode not in _CHANNELS:
+            raise ValueError(f"Unsupported mode '{mode}'")
+
+        self.width = width
+        self.height = height
+        self.mode = mode
+
+        self.rows = 0
+        """The number of rows written so far."""
+
+        self._encoder = _ENCODERS[format](width, height, mode, **options)
+
+        if not path.parent.exists() and mkdirs:
+            path.parent.mkdir(parents=True)
+
+        self._file = open(filename, "wb")
+        self._file.write(self._encoder.header())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        if exc_type is not None:
+            self._file.close()
+            return
+
+        self.close()
+
+    def write(self, band) -> None:
+        """Write the next band of rows to the file.
+
+        Parameters
+        ----------
+        band:
+            The rows to write, either as an image or an array of 8bit values with shape
+            :code:`(rows, width, channels)`
+        """
+
+        if isinstance(band, LazyImage):
+            band = band.render()
+
+        if isinstance(band, Image):
+            band = band.array if band.mode == self.mode else band.img
+
+        if isinstance(band, PImage.Image) and band.mode != self.mode:
+            band = band.convert(self.mode)
+
+        pixels = np.asarray(band)
+        channels = _CHANNELS[self.mode]
+
+        shape = (self.width,) if channels == 1 else (self.width, channels)
+
+        if pixels.dtype != np.uint8 or pixels.shape[1:] != shape:
+            expected = ", ".join(str(n) for n in ("rows", *shape))
+            raise ValueError(f"Expected an array of uint8 with shape ({expected})")
+
+        if self.rows + len(pixels) > self.height:
+            raise ValueError(f"Too many rows, the image is {self.height} rows high.")
+
+        rows = np.ascontiguousarray(pixels).reshape(len(pixels), -1)
+
+        for chunk in self._encoder.encode(rows):
+            self._file.write(chunk)
+
+        self.rows += len(pixels)
 
-def save(image: Image, filename: str, mkdirs: bool = False) -> None:
-    """Save an image in PNG format.
+    def close(self) -> None:
+        """Finish writing the image and close the file."""
 
-    :param filename: The filepath to save the image to.
-    :param mkdirs: If true, make any parent directories
+        if self._file.closed:
+            return
+
+        try:
+            if self.rows != self.height:
+                rows, height = self.rows, self.height
+                raise ValueError(f"Only {rows} of the {height} rows were written.")
+
+            for chunk in self._encoder.finish():
+                self._file.write(chunk)
+
+        finally:
+            self._file.close()
+
+
+def save(
+    image: Image,
+    filename: str,
+    mkdirs: bool = False,
+    *,
+    format: Optional[str] = None,
+    **options,
+) -> None:
+    """Save an image to a file.
+
+    The format is chosen based on the filename's extension, or the :code:`format`
+    option. The formats listed below are written by arlunio, any other extension is
+    passed onto :meth:`pillow:PIL.Image.Image.save` along with the options. Large PNG
+    images are split into bands of rows which are compressed in parallel.
+
+    ====== ================ ==========================================================
+    Format Extensions       Notes
+    ====== ================ ==========================================================
+    png    :code:`.png`     Small files, but slow to compress.
+    qoi    :code:`.qoi`     Around twice as fast to compress as PNG, for larger
+                            files.
+    webp   :code:`.webp`    Lossless by default, fast to compress with the smallest
+                            files. At most 16383 pixels wide and high.
+    npy    :code:`.npy`     The pixels as they are, loaded without copying them.
+    rgba   :code:`.rgba`    The RGBA pixels as they are, with no header.
+    raw    :code:`.raw`     The pixels as they are in the image's mode, with no
+                            header.
+    ppm    :code:`.ppm`,    Uncompressed L or RGB images.
+           :code:`.pgm`
+    tiff   :code:`.tif`,    Uncompressed images.
+           :code:`.tiff`
+    ====== ================ ==========================================================
+
+    Parameters
+    ----------
+    image:
+        The image to save.
+    filename:
+        The filepath to save the image to.
+    mkdirs:
+        If true, make any parent directories
+    format:
+        The format to save the image in, one of the formats listed above. If omitted
+        this is chosen based on the filename's extension.
+    compression:
+        PNG only. The zlib compression level, from :code:`0` (no compression) to
+        :code:`9` (smallest file, slowest). Defaults to :code:`6`.
+    strategy:
+        PNG only. The zlib compression strategy, one of :code:`default`,
+        :code:`filtered`, :code:`huffman`, :code:`rle` or :code:`fixed`. Images with
+        large areas of flat color often compress faster with :code:`rle`.
+    filter:
+        PNG only. The PNG filter applied to each row before compression, one of
+        :code:`none`, :code:`sub`, :code:`up` (the default) or :code:`paeth`.
+    workers:
+        PNG only. The maximum number of threads used to compress the image, if
+        omitted this will be chosen based on the number of processors available.
+    lossless:
+        WebP only. Set to false to save a lossy WebP file.
+    quality:
+        WebP only. From :code:`0` to :code:`100`, the effort spent compressing a
+        lossless file or the quality of a lossy one. Defaults to :code:`0`.
+    method:
+        WebP only. From :code:`0` (fastest, the default) to :code:`6` (smallest
+        file).
+
+    Example
+    -------
+    >>> import pathlib
+    >>> import tempfile
+    >>> import numpy as np
+    >>> import arlunio.image as image
+    >>> img = image.fromarray(np.full((2, 4, 4), 255, dtype=np.uint8))
+    >>> path = pathlib.Path(tempfile.mkdtemp(), "white.qoi")
+    >>> image.save(img, path)
+    >>> path.read_bytes()[:4]
+    b'qoif'
+    >>> image.load(path) == img
+    True
     """
     path = pathlib.Path(filename)
 
+    if format is None:
+        format = _EXTENSIONS.get(path.suffix.lower(), None)
+
+    if format is not None and format not in _ENCODERS:
+        raise ValueError(f"Unknown image format '{format}'")
+
     if not path.parent.exists() and mkdirs:
         path.parent.mkdir(parents=True)
 
     with open(filename, "wb") as f:
-        image.save(f)
+
+        # Leave any other formats to pillow, which picks one based on the extension.
+        if format is None:
+            image.save(f, **options)
+            return
+
+        for chunk in _stream(image, format, **options):
+            f.write(chunk)
+
+
+def iterencode(image: Image, **options):
+    """Encode the image as a base64 string, yielding it a piece at a time.
+
+    This avoids holding both the complete PNG file and its encoded version in memory.
+    Takes the same PNG options as :func:`save`.
+
+    Parameters
+    ----------
+    image:
+       The image to encode.
+    """
+
+    remainder = b""
+
+    for chunk in _stream(image, **options):
+        data = remainder + chunk
+
+        # Base64 encodes each group of 3 bytes independently.
+        n = len(data) - len(data) % 3
+        remainder = data[n:]
+
+        if n > 0:
+            yield base64.b64encode(data[:n])
+
+    if len(remainder) > 0:
+        yield base64.b64encode(remainder)
 
 
-def encode(image: Image) -> bytes:
+def encode(image: Image, **options) -> bytes:
     """Return the image encoded as a base64 string.
 
+    Takes the same PNG options as :func:`save`.
+
     Parameters
     ----------
     image:
@@ -157,11 +2353,7 @@ def encode(image: Image) -> bytes:
 
     """
 
-    with io.BytesIO() as byte_stream:
-        image.save(byte_stream, "PNG")
-        image_bytes = byte_stream.getvalue()
-
-        return base64.b64encode(image_bytes)
+    return b"".join(iterencode(image, **options))
 
 
 def decode(bytestring: bytes) -> Image:
@@ -192,7 +2384,60 @@ def decode(bytestring: bytes) -> Image:
     return Image(load(bytes_))
 
 
-def colorramp(values, start: Optional[str] = None, stop: Optional[str] = None) -> Image:
+def _lookup_table(stops, steps: int) -> np.ndarray:
+    """Compute the table of RGBA colors for a gradient with the given stops.
+
+    Each stop is a (position, color) pair, the table has :code:`steps` entries evenly
+    spaced between :math:`0` and :math:`1`.
+    """
+
+    positions = [position for position, _ in stops]
+
+    if any(b < a for a, b in zip(positions, positions[1:])):
+        raise ValueError("The positions of the stops must be in increasing order.")
+
+    colors = np.array([color.getcolor(c, "RGBA") for _, c in stops], dtype=float)
+    ts = np.linspace(0, 1, steps)
+
+    table = np.empty((steps, 4), dtype=np.uint8)
+
+    for channel in range(4):
+        values = np.interp(ts, positions, colors[:, channel])
+        table[:, channel] = np.floor(values)
+
+    return table
+
+
+def _as_stops(start, stop, stops):
+    """Normalise the arguments to :func:`colorramp` into a list of stops."""
+
+    if stops is None:
+        start = "black" if start is None else start
+        stop = "white" if stop is None else stop
+
+        return [(0, start), (1, stop)]
+
+    if start is not None or stop is not None:
+        raise ValueError("Specify either the start and stop colors or the stops.")
+
+    if len(stops) < 2:
+        raise ValueError("A gradient requires at least 2 stops.")
+
+    if all(isinstance(s, str) for s in stops):
+        positions = np.linspace(0, 1, len(stops))
+        return list(zip(positions, stops))
+
+    return list(stops)
+
+
+def colorramp(
+    values,
+    start: Optional[str] = None,
+    stop: Optional[str] = None,
+    *,
+    stops=None,
+    steps: int = 1024,
+) -> LazyImage:
     """Given a 2d array of values, produce an image gradient based on them.
 
     .. arlunio-image:: Colorramp Demo
@@ -222,6 +2467,10 @@ def colorramp(values, start: Optional[str] = None, stop: Optional[str] = None) -
 
     - Otherwise the color will be some mix between the two.
 
+    Rather than computing the color of each pixel directly, the gradient is computed
+    once as a table of :code:`steps` colors and each value is mapped onto the closest
+    entry below it in the table.
+
     Parameters
     ----------
     values:
@@ -230,6 +2479,13 @@ def colorramp(values, start: Optional[str] = None, stop: Optional[str] = None) -
        The color to use for values near :math:`0` (default, :code:`black`)
     stop:
        The color to use for values near :math:`1` (default, :code:`white`)
+    stops:
+       Used instead of :code:`start` and :code:`stop` to create a gradient with more
+       than two colors. This can either be a list of colors which will be evenly spaced
+       along the gradient, or a list of :code:`(position, color)` pairs where each
+       position is a number between :math:`0` and :math:`1`.
+    steps:
+       The number of entries in the gradient's lookup table.
 
     Examples
     --------
@@ -250,27 +2506,30 @@ def colorramp(values, start: Optional[str] = None, stop: Optional[str] = None) -
           y = image.colorramp(p[:, :, 1], start="#0000", stop="#00f7")
 
           img = x + y
-    """
 
-    # Scale all the values so that they fall into the range [0, 1]
-    minx = np.min(values)
-    vs = np.array(values) - minx
-    vs = vs / np.max(vs)
+    .. arlunio-image:: Colorramp Demo 3
+       :include-code:
+
+       ::
+
+          import arlunio.image as image
+          import numpy as np
 
-    if start is None:
-        start = "black"
+          values = np.linspace(0, 1, 256).reshape(1, -1).repeat(64, axis=0)
+          img = image.colorramp(
+              values, stops=[(0, "black"), (0.2, "red"), (0.8, "yellow"), (1, "white")]
+          )
+    """
 
-    if stop is None:
-        stop = "white"
+    table = _lookup_table(_as_stops(start, stop, stops), steps)
 
-    start = color.getcolor(start, "RGBA")
-    stop = color.getcolor(stop, "RGBA")
+    if callable(values):
+        values = values()
 
-    funcs = [math.lerp(a, b) for a, b in zip(start, stop)]
-    channels = [np.floor(func(vs)) for func in funcs]
+    if not isinstance(values, ast.Node):
+        values = ast.Node.builtin(name="array", value=np.asarray(values))
 
-    pixels = np.array(np.dstack(channels), dtype=np.uint8)
-    return fromarray(pixels)
+    return LazyImage(ast.Node.colorramp(values, table))
 
 
 def fill(
@@ -278,13 +2537,16 @@ def fill(
     foreground: Optional[str] = None,
     background: Optional[str] = None,
     image: Optional[Image] = None,
-) -> Image:
+) -> LazyImage:
     """Apply color to an image, as specified by a mask.
 
     Parameters
     ----------
     mask:
-        The mask that selects the region to be coloured
+        The mask that selects the region to be coloured. This can also be an array of
+        values between :math:`0` and :math:`1` (e.g. as produced by
+        :class:`arlunio.mask.Coverage`) in which case the color will be blended in
+        according to each value.
     foreground:
         A string representation of the color to use, this can be in any format that is
         supported by the :mod:`pillow:PIL.ImageColor` module. If omitted this will
@@ -326,7 +2588,109 @@ def fill(
         background = "#0000" if background is None else background
         image = new(color=background)
 
+    if isinstance(region, np.ndarray):
+        region = ast.Node.builtin(name="array", value=region)
+
     if not isinstance(region, ast.Node):
         region = region()
 
-    return ast.Node.fill(image, region, fill_color)
+    size = image._size if isinstance(image, LazyImage) else None
+    return LazyImage(ast.Node.fill(image, region, fill_color), size=size)
+
+
+def thumbnails(image, sizes, supersample: int = 2) -> List[Image]:
+    """Create thumbnails of an image at several sizes, from a single render.
+
+    Each thumbnail is shrunk to fit within the given size, preserving the image's
+    aspect ratio. Images made only from shapes are drawn directly at the size of the
+    largest thumbnail, :code:`supersample` times larger in each direction to smooth
+    the edges. Any other image is drawn at its full size.
+
+    The thumbnails are made from a mipmap pyramid, where each level is half the size
+    of the one above it. Each thumbnail is shrunk from the smallest level that's at
+    least twice as large as it, so even small thumbnails are made from a single quick
+    resize.
+
+    Parameters
+    ----------
+    image:
+        The image to make thumbnails of, this can be an :class:`Image` or a
+        :class:`LazyImage`.
+    sizes:
+        The maximum :code:`(width, height)` of each thumbnail.
+    supersample:
+        How many times larger to draw images made only from shapes, compared to the
+        largest thumbnail.
+
+    Example
+    -------
+    >>> import arlunio.image as image
+    >>> import arlunio.shape as shape
+    >>> img = image.fill(shape.Circle(), foreground="red")
+    >>> [thumb.size for thumb in image.thumbnails(img, [(64, 64), (256, 256)])]
+    [(64, 36), (256, 144)]
+    """
+
+    if len(sizes) == 0:
+        return []
+
+    if isinstance(image, LazyImage) and _fixed_size(image) is None:
+        bounds = image.size or _default_size()
+        fitted = [_fit(bounds, size) for size in sizes]
+
+        width, height = max(fitted, key=lambda size: size[0] * size[1])
+        base = image.render((width * supersample, height * supersample)).img
+
+    else:
+        if isinstance(image, LazyImage):
+            image = image.render()
+
+        base = image.img
+        fitted = [_fit(base.size, size) for size in sizes]
+
+    # Halve the image until the smallest thumbnail has a level between 2 and 4 times
+    # its size.
+    smallest = min(fitted, key=lambda size: size[0] * size[1])
+    levels = [base]
+
+    while all(
+        length >= 4 * target for length, target in zip(levels[-1].size, smallest)
+    ):
+        levels.append(levels[-1].reduce(2))
+
+    results = []
+
+    for width, height in fitted:
+        level = [
+            img for img in levels if img.width >= 2 * width and img.height >= 2 * height
+        ]
+        level = level[-1] if len(level) > 0 else base
+
+        factor = level.width // width
+
+        if level.size == (width * factor, height * factor):
+            level = level.reduce(factor)
+        else:
+            level = level.resize((width, height), PImage.BICUBIC)
+
+        results.append(Image(level))
+
+    return results
+
+
+def thumbnail(image, size, supersample: int = 2) -> Image:
+    """Create a thumbnail of an image.
+
+    See :func:`thumbnails`, which this calls with a single size.
+
+    Parameters
+    ----------
+    image:
+        The image to make a thumbnail of.
+    size:
+        The maximum :code:`(width, height)` of the thumbnail.
+    supersample:
+        How many times larger to draw images made only from shapes, compared to the
+        thumbnail.
+    """
+    return thumbnails(image, [size], supersample=supersample)[0]
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
-import functools
 import logging
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
 from typing import Union
 
 import numpy as np
 
 import arlunio as ar
+import arlunio.ast as ast
+import arlunio.math as math
+from arlunio.backends.numpy import NumpyBackend
 
 
 class Mask(np.ndarray):
@@ -38,10 +45,18 @@ class Mask(np.ndarray):
         return np.logical_not(self)
 
     def __sub__(self, other):
-        return np.logical_and(self, np.logical_not(other))
+        # For booleans 'a AND (NOT b)' is the same as 'a > b', which saves allocating
+        # an intermediate array for 'NOT b'
+        return np.greater(self, np.asarray(other, dtype=bool))
 
     def __rsub__(self, other):
-        return np.logical_and(other, np.logical_not(self))
+        return np.greater(np.asarray(other, dtype=bool), self)
+
+    def __imul__(self, other):
+        return np.logical_and(self, other, out=self)
+
+    def __isub__(self, other):
+        return np.greater(self, np.asarray(other, dtype=bool), out=self)
 
     @classmethod
     def empty(cls, *shape):
@@ -175,7 +190,53 @@ def MaskMul(
     return a(width=width, height=height) * b(width=width, height=height)
 
 
-def any_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
+def _as_nodes(args) -> List[ast.Node]:
+    """Ensure that all the given conditions can be part of an expression tree."""
+
+    nodes = []
+
+    for arg in args:
+
+        if isinstance(arg, ast.Node):
+            nodes.append(arg)
+            continue
+
+        if isinstance(arg, (bool, np.bool_)):
+            nodes.append(ast.Node.scalar(arg))
+            continue
+
+        raise TypeError(f"Unable to combine {type(arg).__name__} with an expression")
+
+    return nodes
+
+
+def _reduce(ufunc, args, out: Optional[np.ndarray] = None) -> Mask:
+    """Reduce the given conditions with a logical ufunc, writing each step into a single
+    output buffer."""
+
+    if len(args) == 0:
+        raise TypeError("At least one condition is required.")
+
+    if out is None:
+        shape = np.broadcast_shapes(*[np.shape(arg) for arg in args])
+        out = np.empty(shape, dtype=bool)
+
+    first, *rest = args
+
+    if len(rest) == 0:
+        out[...] = first
+    else:
+        ufunc(first, rest[0], out=out)
+
+    for arg in rest[1:]:
+        ufunc(out, arg, out=out)
+
+    return out if isinstance(out, Mask) else Mask(out)
+
+
+def any_(
+    *args: Union[bool, np.ndarray, Mask], out: Optional[np.ndarray] = None
+) -> Mask:
     """Given a number of conditions, return :code:`True` if any of the conditions
     are true.
 
@@ -184,11 +245,23 @@ def any_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
     inputs. This also means that this function will accept arrays of differing sizes,
     assuming that they can be broadcasted to a common shape.
 
+    Rather than allocating a new array for each pair of conditions, the result is
+    accumulated in place in a single boolean array.
+
+    If any of the conditions are expressions (:class:`arlunio.ast.Node`) then an
+    expression representing their union is returned instead. When evaluated, each
+    condition will only be computed at the points not already selected by an earlier
+    one.
+
     Parameters
     ----------
     args:
       A number of boolean conditions, a condition can either be a single boolean value
       or a numpy array of boolean values.
+    out:
+      If given, the result will be written into this boolean array rather than a newly
+      allocated one. It must have the shape the conditions broadcast to and should
+      not be the same array as any of the conditions after the second.
 
     Examples
     --------
@@ -219,6 +292,14 @@ def any_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
     Mask([[ True,  True],
           [ True, False]])
 
+    An existing array can be reused to hold the result with the :code:`out` argument
+
+    >>> buffer = np.empty(3, dtype=bool)
+    >>> mask.any_(x1, x2, x3, out=buffer)
+    Mask([ True,  True,  True])
+    >>> buffer
+    array([ True,  True,  True])
+
 
     See Also
     --------
@@ -232,10 +313,15 @@ def any_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
     :data:`numpy:numpy.logical_or`
        Reference documentation on the :code:`numpy.logical_or` function
     """
-    return Mask(functools.reduce(np.logical_or, args))
+    if any(isinstance(arg, ast.Node) for arg in args):
+        return ast.Node.union(*_as_nodes(args))
+
+    return _reduce(np.logical_or, args, out=out)
 
 
-def all_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
+def all_(
+    *args: Union[bool, np.ndarray, Mask], out: Optional[np.ndarray] = None
+) -> Mask:
     """Given a number of conditions, return :code:`True` only if **all**
     of the given conditions are true.
 
@@ -244,11 +330,23 @@ def all_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
     inputs. This also means that this function will accept arrays of differing sizes,
     assuming that they can be broadcasted to a common shape.
 
+    Rather than allocating a new array for each pair of conditions, the result is
+    accumulated in place in a single boolean array.
+
+    If any of the conditions are expressions (:class:`arlunio.ast.Node`) then an
+    expression representing their intersection is returned instead. When evaluated,
+    each condition will only be computed at the points that satisfy all of the earlier
+    ones.
+
     Parameters
     ----------
     args:
       A number of boolean conditions, a conditon can either be a single boolean value,
       or a numpy array of boolean values.
+    out:
+      If given, the result will be written into this boolean array rather than a newly
+      allocated one. It must have the shape the conditions broadcast to and should
+      not be the same array as any of the conditions after the second.
 
     Examples
     --------
@@ -279,6 +377,14 @@ def all_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
     Mask([[False, False],
           [ True, False]])
 
+    An existing array can be reused to hold the result with the :code:`out` argument
+
+    >>> buffer = np.empty(3, dtype=bool)
+    >>> mask.all_(x1, x2, x3, out=buffer)
+    Mask([False, False,  True])
+    >>> buffer
+    array([False, False,  True])
+
 
     See Also
     --------
@@ -292,7 +398,183 @@ def all_(*args: Union[bool, np.ndarray, Mask]) -> Mask:
     :data:`numpy:numpy.logical_and`
        Reference documentation on the :code:`logical_and` function.
     """
-    return Mask(functools.reduce(np.logical_and, args))
+    if any(isinstance(arg, ast.Node) for arg in args):
+        return ast.Node.intersect(*_as_nodes(args))
+
+    return _reduce(np.logical_and, args, out=out)
+
+
+def _lazy_reduce(conditions, inputs: Dict[str, Any], undecided: bool) -> Mask:
+    """Combine conditions one at a time, only evaluating each condition at the points
+    whose value is still equal to :code:`undecided`."""
+
+    if len(conditions) == 0:
+        raise TypeError("At least one condition is required.")
+
+    shape = np.broadcast_shapes(*[np.shape(v) for v in inputs.values()])
+    inputs = {k: np.broadcast_to(v, shape) for k, v in inputs.items()}
+
+    def evaluate(condition, index=None):
+
+        if not callable(condition):
+            condition = np.broadcast_to(condition, shape)
+            return condition if index is None else condition.flat[index]
+
+        if index is None:
+            return condition(**inputs)
+
+        return condition(**{k: v.flat[index] for k, v in inputs.items()})
+
+    first, *rest = conditions
+    result = np.array(np.broadcast_to(evaluate(first), shape), dtype=bool)
+
+    for condition in rest:
+        index = np.flatnonzero(result == undecided)
+
+        if index.size == 0:
+            break
+
+        result.flat[index] = evaluate(condition, index)
+
+    return Mask(result)
+
+
+def lazy_any(
+    *conditions: Union[bool, np.ndarray, Callable[..., np.ndarray]], **inputs
+) -> Mask:
+    """Given a number of conditions, return :code:`True` if any of the conditions are
+    true, only evaluating each condition where it could still make a difference.
+
+    Conditions can be given as values (like :func:`any_`) or as callables. Callables
+    are called with the given keyword :code:`inputs` restricted to the points that
+    none of the previous conditions have selected, so putting cheap or broad
+    conditions first avoids most of the work required by later ones.
+
+    Parameters
+    ----------
+    conditions:
+      A number of boolean conditions or functions that compute them.
+    inputs:
+      The arrays to pass to each callable condition as keyword arguments. They should
+      all broadcast to the shape of the final mask.
+
+    Example
+    -------
+
+    >>> import numpy as np
+    >>> import arlunio.mask as mask
+    >>> x = np.linspace(-1, 1, 5)
+    >>> mask.lazy_any(lambda x: x < -0.5, lambda x: x > 0.5, x=x)
+    Mask([ True, False, False, False,  True])
+
+    Here the second condition is only evaluated on the 4 values of :code:`x` that are
+    not less than :code:`-0.5`
+
+    >>> seen = []
+    >>> def gt(x):
+    ...     seen.append(x)
+    ...     return x > 0.5
+    >>> mask.lazy_any(x < -0.5, gt, x=x)
+    Mask([ True, False, False, False,  True])
+    >>> seen
+    [array([-0.5,  0. ,  0.5,  1. ])]
+    """
+    return _lazy_reduce(conditions, inputs, undecided=False)
+
+
+def lazy_all(
+    *conditions: Union[bool, np.ndarray, Callable[..., np.ndarray]], **inputs
+) -> Mask:
+    """Given a number of conditions, return :code:`True` only if **all** of the
+    conditions are true, only evaluating each condition where it could still make a
+    difference.
+
+    Conditions can be given as values (like :func:`all_`) or as callables. Callables
+    are called with the given keyword :code:`inputs` restricted to the points that
+    satisfy all of the previous conditions, so putting the most selective conditions
+    first avoids most of the work required by later ones.
+
+    Parameters
+    ----------
+    conditions:
+      A number of boolean conditions or functions that compute them.
+    inputs:
+      The arrays to pass to each callable condition as keyword arguments. They should
+      all broadcast to the shape of the final mask.
+
+    Example
+    -------
+
+    >>> import numpy as np
+    >>> import arlunio.mask as mask
+    >>> x = np.linspace(-1, 1, 5)
+    >>> y = np.array([[1], [0]])
+    >>> mask.lazy_all(
+    ...     lambda x, y: np.abs(x) < 0.6,
+    ...     lambda x, y: np.abs(y) < 0.5,
+    ...     x=x,
+    ...     y=y,
+    ... )
+    Mask([[False, False, False, False, False],
+          [False,  True,  True,  True, False]])
+    """
+    return _lazy_reduce(conditions, inputs, undecided=True)
+
+
+class Accumulator:
+    """Build up a mask incrementally, combining each new condition into a single
+    preallocated buffer.
+
+    This is useful when a mask is made from many conditions, since no intermediate
+    masks are allocated when combining them.
+
+    Parameters
+    ----------
+    shape:
+      The shape of the mask to build.
+    fill:
+      The value the mask should start with, (default: :code:`False`)
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from arlunio.mask import Accumulator
+    >>> x = np.array([-1, -0.5, 0, 0.5, 1])
+    >>> acc = Accumulator(5)
+    >>> acc.union(x < -0.6, x > 0.6).mask
+    Mask([ True, False, False, False,  True])
+
+    Each method returns the accumulator itself so calls can be chained
+
+    >>> acc = Accumulator((5,), fill=True)
+    >>> acc.intersect(x < 1).subtract(x == 0).mask
+    Mask([ True,  True, False,  True, False])
+    """
+
+    def __init__(self, *shape, fill: bool = False):
+        if len(shape) == 1 and isinstance(shape[0], tuple):
+            shape = shape[0]
+
+        self.mask = Mask(np.full(shape, fill))
+        """The mask being built."""
+
+    def union(self, *conditions) -> Accumulator:
+        """Add all points where **any** of the given conditions are true."""
+        _reduce(np.logical_or, (self.mask, *conditions), out=self.mask)
+        return self
+
+    def intersect(self, *conditions) -> Accumulator:
+        """Only keep points where **all** of the given conditions are true."""
+        _reduce(np.logical_and, (self.mask, *conditions), out=self.mask)
+        return self
+
+    def subtract(self, *conditions) -> Accumulator:
+        """Remove all points where any of the given conditions are true."""
+
+        for condition in conditions:
+            self.mask -= condition
+
+        return self
 
 
 @ar.definition
@@ -629,3 +911,143 @@ def Pixelize(width: int, height: int, *, mask=None, defn=None, scale=16) -> Mask
     empty = Mask.empty(m, n)
 
     return Mask(np.block([[fill if col else empty for col in row] for row in mask]))
+
+
+def _as_array(values, backend: NumpyBackend) -> np.ndarray:
+    """Evaluate any expressions, so that we're working with concrete values."""
+
+    if isinstance(values, ast.Node):
+        return backend.eval(values)
+
+    return np.asarray(values)
+
+
+def _find_edges(mask: np.ndarray) -> np.ndarray:
+    """Return a mask selecting the points that differ from one of their horizontal or
+    vertical neighbours."""
+
+    edges = np.full(mask.shape, False)
+
+    diff = mask[:, 1:] != mask[:, :-1]
+    edges[:, 1:] |= diff
+    edges[:, :-1] |= diff
+
+    diff = mask[1:, :] != mask[:-1, :]
+    edges[1:, :] |= diff
+    edges[:-1, :] |= diff
+
+    return edges
+
+
+def _pixel_gradient(values: np.ndarray, rows: np.ndarray, cols: np.ndarray):
+    """Return how much the given values change when moving a single pixel across and
+    down, at each of the given points."""
+
+    height, width = values.shape
+
+    left, right = np.maximum(cols - 1, 0), np.minimum(cols + 1, width - 1)
+    up, down = np.maximum(rows - 1, 0), np.minimum(rows + 1, height - 1)
+
+    across = (values[rows, right] - values[rows, left]) / np.maximum(right - left, 1)
+    down = (values[down, cols] - values[up, cols]) / np.maximum(down - up, 1)
+
+    return across, down
+
+
+@ar.definition
+def Coverage(
+    width: int, height: int, x: math.X, y: math.Y, *, defn=None, samples=4, budget=None
+) -> np.ndarray:
+    """Produce an antialiased version of a mask, where each pixel holds the fraction of
+    it that is covered by the mask.
+
+    .. arlunio-image:: Antialiased Circle
+       :align: right
+
+       ::
+
+          import arlunio.image as image
+          import arlunio.mask as mask
+          import arlunio.shape as shape
+
+          circle = mask.Coverage(defn=shape.Circle(r1=0.75))
+          img = image.fill(circle(width=256, height=256))
+
+    The mask produced by the given definition is first evaluated once per pixel. Only
+    the pixels on the boundary of this mask, those that differ from one of their
+    neighbours, are then evaluated again at :math:`n \\times n` points spread across
+    the pixel. This gives smooth edges for a fraction of the cost of rendering the whole
+    image at a higher resolution.
+
+    The given definition must be able to accept arrays of arbitrary shape for its
+    :code:`x` and :code:`y` inputs.
+
+    .. note::
+
+       Since the boundary is found by evaluating the mask at the center of each pixel,
+       features smaller than a pixel may be missed entirely.
+
+    Attributes
+    ----------
+    defn:
+        The mask producing definition to antialias.
+    samples:
+        The number of samples to take along each axis of a boundary pixel, so that each
+        boundary pixel is evaluated :code:`samples ** 2` times.
+    budget:
+        If set, the maximum number of additional samples to take in total. The number
+        of samples per pixel will be reduced in order to fit within this budget.
+
+    Example
+    -------
+
+    >>> import numpy as np
+    >>> import arlunio as ar
+    >>> import arlunio.mask as mask
+    >>> import arlunio.math as math
+
+    >>> @ar.definition
+    ... def Left(x: math.X, y: math.Y) -> mask.Mask:
+    ...     return mask.Mask(x < 0.3)
+
+    >>> coverage = mask.Coverage(defn=Left(), samples=4)
+    >>> coverage(width=5, height=2)
+    array([[1.  , 1.  , 0.75, 0.  , 0.  ],
+           [1.  , 1.  , 0.75, 0.  , 0.  ]])
+    """
+
+    if defn is None:
+        raise ValueError("You must provide a mask producing definition.")
+
+    backend = NumpyBackend(width=width, height=height)
+
+    x = _as_array(x, backend)
+    y = _as_array(y, backend)
+    x, y = np.broadcast_arrays(x, y)
+
+    inside = np.asarray(defn(x=x, y=y), dtype=bool)
+    coverage = inside.astype(float)
+
+    rows, cols = np.nonzero(_find_edges(inside))
+    n = samples
+
+    if budget is not None and len(rows) > 0:
+        n = min(n, int(np.sqrt(budget / len(rows))))
+
+    if n < 2 or len(rows) == 0:
+        return coverage
+
+    # Sample points, in pixels relative to the pixel's center.
+    offsets = (np.arange(n) + 0.5) / n - 0.5
+    across, down = (o.reshape(1, -1) for o in np.meshgrid(offsets, offsets))
+
+    dx_across, dx_down = _pixel_gradient(x, rows, cols)
+    dy_across, dy_down = _pixel_gradient(y, rows, cols)
+
+    xs = x[rows, cols, None] + across * dx_across[:, None] + down * dx_down[:, None]
+    ys = y[rows, cols, None] + across * dy_across[:, None] + down * dy_down[:, None]
+
+    subsamples = np.asarray(defn(x=xs, y=ys), dtype=bool)
+    coverage[rows, cols] = np.mean(subsamples, axis=1)
+
+    return coverage
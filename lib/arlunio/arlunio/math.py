@@ -10,10 +10,14 @@ import arlunio.ast as ast
 
 
 def sqrt(x):
-    return ast.Node.sqrt(x)
 
+    if isinstance(x, ast.Node):
+        return ast.Node.sqrt(x)
 
-def clamp(vs, min_=0, max_=1):
+    return np.sqrt(x)
+
+
+def clamp(vs, min_=0, max_=1, out=None):
     """Force an array of values to stay within a range of values.
 
     Parameters
@@ -24,6 +28,9 @@ def clamp(vs, min_=0, max_=1):
       The minimum value the result should contain
     max_:
       The maximum value the result should contain
+    out:
+      If given, the array to write the result into. This can be :code:`vs` itself to
+      clamp the values in place.
 
     Examples
     --------
@@ -40,21 +47,61 @@ def clamp(vs, min_=0, max_=1):
 
     >>> clamp(vs, min_=-1, max_=0.5)
     array([-1. , -0.4,  0.2,  0.5,  0.5,  0.5])
+
+    Passing the array itself as :code:`out` will clamp the values in place
+
+    >>> _ = clamp(vs, out=vs)
+    >>> vs
+    array([0. , 0. , 0.2, 0.8, 1. , 1. ])
+    """
+    return np.clip(vs, min_, max_, out=out)
+
+
+def dot(us, vs, out=None):
+    """Return the dot product of two arrays of vectors.
+
+    Parameters
+    ----------
+    us:
+      The first array of vectors, the vectors are taken along the last axis.
+    vs:
+      The second array of vectors.
+    out:
+      If given, the array to write the result into.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from arlunio.math import dot
+    >>> dot(np.array([[1, 2, 3], [1, 0, 0]]), np.array([1, 1, 1]))
+    array([6, 1])
     """
-    vs = np.array(vs)
-    vs[vs > max_] = max_
-    vs[vs < min_] = min_
+    return np.einsum("...i,...i->...", us, vs, out=out)
+
 
-    return vs
+def length(vs, out=None):
+    """Return the length of each vector in an array of vectors.
 
+    Parameters
+    ----------
+    vs:
+      The array of vectors, the vectors are taken along the last axis.
+    out:
+      If given, the array to write the result into.
 
-def dot(us, vs):
-    """Return the dot product of two arrays of vectors."""
-    return np.sum(us * vs, axis=-1)
+    Example
+    -------
+    >>> import numpy as np
+    >>> from arlunio.math import length
+    >>> length(np.array([[3.0, 4.0], [0.0, 2.0]]))
+    array([5., 2.])
+    """
 
+    if out is None:
+        out = np.empty(np.shape(vs)[:-1])
 
-def length(vs):
-    return np.sqrt(np.sum(vs * vs, axis=-1))
+    dot(vs, vs, out=out)
+    return np.sqrt(out, out=out)
 
 
 def lerp(start: float = 0, stop: float = 1) -> Callable[[float], float]:
@@ -88,28 +135,56 @@ def lerp(start: float = 0, stop: float = 1) -> Callable[[float], float]:
     >>> f(ts)
     array([ 3.        ,  1.66666667,  0.33333333, -1.        ])
 
+    The returned function also accepts an :code:`out` argument to write the result
+    into, which can be the array of :code:`t` values itself
+
+    >>> _ = f(ts, out=ts)
+    >>> ts
+    array([ 3.        ,  1.66666667,  0.33333333, -1.        ])
+
     """
 
-    def f(t: float) -> float:
-        return (1 - t) * start + t * stop
+    def f(t: float, out=None) -> float:
+
+        if out is None:
+            return (1 - t) * start + t * stop
+
+        # t may be out itself, so scale it by stop before it is overwritten
+        end = np.multiply(t, stop)
+
+        np.subtract(1, t, out=out)
+        np.multiply(out, start, out=out)
+        return np.add(out, end, out=out)
 
     return f
 
 
-def normalise(vs):
-    """Normalise an array into the range :math:`[0, 1]`
+def normalise(vs, out=None, scratch=None):
+    """Scale each vector in an array of vectors to have unit length.
 
     Parameters
     ----------
     vs:
-       The array to normalise.
+       The array to normalise, the vectors are taken along the last axis.
+    out:
+       If given, the array to write the result into. This can be :code:`vs` itself to
+       normalise the vectors in place.
+    scratch:
+       If given, an array with shape :code:`vs.shape[:-1]` used to hold the length of
+       each vector. Passing the same array in repeated calls avoids allocating new
+       memory each time.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from arlunio.math import normalise
+    >>> normalise(np.array([[3.0, 4.0], [0.0, 2.0]]))
+    array([[0.6, 0.8],
+           [0. , 1. ]])
     """
 
-    if len(vs.shape) == 1:
-        return vs / length(vs)
-
-    if len(vs.shape) == 2:
-        return vs / length(vs)[:, np.newaxis]
+    lengths = length(vs, out=scratch)
+    return np.divide(vs, lengths[..., np.newaxis], out=out)
 
 
 @ar.definition
@@ -254,6 +329,36 @@ def Y(*, y0=0, scale=1, stretch=False):
     return ast.Node.builtin(name="y", y0=y0, scale=scale, stretch=stretch)
 
 
+def _polar_builtin(name, x, y, **attributes):
+    """If given the standard :math:`x` and :math:`y` coordinates return the builtin
+    for the corresponding polar coordinate, allowing the backend to reuse previously
+    computed grids."""
+
+    builtins = [
+        isinstance(v, ast.Node) and v.ntype == ast.NodeType.BUILTIN for v in [x, y]
+    ]
+
+    if not all(builtins):
+        return None
+
+    xattrs, yattrs = x.attributes, y.attributes
+
+    if xattrs["name"] != "x" or yattrs["name"] != "y":
+        return None
+
+    if any(xattrs[k] != yattrs[k] for k in ["scale", "stretch"]):
+        return None
+
+    return ast.Node.builtin(
+        name=name,
+        x0=xattrs["x0"],
+        y0=yattrs["y0"],
+        scale=xattrs["scale"],
+        stretch=xattrs["stretch"],
+        **attributes,
+    )
+
+
 @ar.definition
 def R(x: X, y: Y):
     """Polar :math:`r` coordinates.
@@ -306,7 +411,12 @@ def R(x: X, y: Y):
     :code:`R` definition.
 
     """
-    return np.sqrt(x * x + y * y)
+    polar = _polar_builtin("r", x, y)
+
+    if polar is not None:
+        return polar
+
+    return sqrt(x * x + y * y)
 
 
 @ar.definition
@@ -375,6 +485,11 @@ def T(x: X, y: Y, *, t0=0):
               [0.        , 0.        , 0.        , 0.        , 0.        ]])
 
     """
+    polar = _polar_builtin("t", x, y, t0=t0)
+
+    if polar is not None:
+        return polar
+
     t = np.arctan2(y, x)
     return t - t0
 
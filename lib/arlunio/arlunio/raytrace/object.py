@@ -61,7 +61,8 @@ def Sphere(
 
     # Determine the points of intersection and surface normals at t
     p = rays[hits].at(t)
-    normals = normalise(p - center)
+    normals = p - center
+    normalise(normals, out=normals)
 
     # Finally determine which rays are hitting the outside surface of the sphere
     front_face = dot(rays.direction[hits], normals) < 0
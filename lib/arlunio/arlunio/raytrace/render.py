@@ -190,13 +190,11 @@ def SampledRenderer(width: int, height: int, *, kernel=None, samples=10) -> imag
         cols += kernel(width=width, height=height) * scale
 
     # Gamma correction...
-    cols = np.sqrt(cols)
+    np.sqrt(cols, out=cols)
 
-    r = math.clamp(cols[:, 0], 0, 0.99999) * 256
-    g = math.clamp(cols[:, 1], 0, 0.99999) * 256
-    b = math.clamp(cols[:, 2], 0, 0.99999) * 256
+    math.clamp(cols, 0, 0.99999, out=cols)
+    cols *= 256
 
-    color = np.array(np.dstack([r, g, b])[0], dtype=np.uint8)
-    color = color.reshape(height, width, 3)
+    color = cols.astype(np.uint8).reshape(height, width, 3)
 
     return image.fromarray(color, "RGB")
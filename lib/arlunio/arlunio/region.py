@@ -1,9 +1,9 @@
-import arlunio.ast as ast
+import arlunio.mask as mask
 
 
-def intersect(r1, r2):
-    return ast.Node.intersect(r1, r2)
+def intersect(*regions):
+    return mask.all_(*regions)
 
 
-def union(r1, r2):
-    return ast.Node.union(r1, r2)
+def union(*regions):
+    return mask.any_(*regions)
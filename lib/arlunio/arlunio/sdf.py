@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import numpy as np
+
+import arlunio as ar
+import arlunio.mask as mask
+import arlunio.math as math
+import arlunio.shape as shape
+
+_EPSILON = 1e-12
+
+
+def _band(d, inner, outer):
+    """Given a distance like field, return the field for the band between the inner
+    and outer values."""
+
+    mid = (inner + outer) / 2
+    half = (outer - inner) / 2
+
+    return np.abs(d - mid) - half
+
+
+def _box(xs, ys, w, h):
+    """The exact distance to an axis aligned box centered at the origin."""
+
+    qx = xs - w
+    qy = ys - h
+
+    outside = np.sqrt(np.maximum(qx, 0) ** 2 + np.maximum(qy, 0) ** 2)
+    inside = np.minimum(np.maximum(qx, qy), 0)
+
+    return outside + inside
+
+
+@ar.definition
+def Circle(x: math.X, y: math.Y, *, xc=0, yc=0, r1=0, r2=0.8) -> np.ndarray:
+    """The signed distance field for :class:`arlunio.shape.Circle`.
+
+    Takes the same attributes as the shape it represents.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> x = np.array([0, 0.4, 0.8, 1.2])
+    >>> sdf.Circle(r2=0.8)(x=x, y=0)
+    array([-0.8, -0.4,  0. ,  0.4])
+
+    Setting :code:`r1` gives the field for a ring
+
+    >>> x = np.array([0, 0.5, 0.75, 1, 1.5])
+    >>> sdf.Circle(r1=0.5, r2=1)(x=x, y=0)
+    array([ 0.5 ,  0.  , -0.25,  0.  ,  0.5 ])
+    """
+
+    d = np.sqrt((x - xc) ** 2 + (y - yc) ** 2)
+
+    if r1 <= 0:
+        return d - r2
+
+    return _band(d, r1, r2)
+
+
+@ar.definition
+def Ellipse(
+    x: math.X, y: math.Y, *, xc=0, yc=0, a=2, b=1, r=0.8, pt=None
+) -> np.ndarray:
+    """An approximate signed distance field for :class:`arlunio.shape.Ellipse`.
+
+    Takes the same attributes as the shape it represents. The distance is estimated
+    by dividing the ellipse's implicit function by the length of its gradient, which
+    is accurate close to the boundary.
+    """
+
+    u = x - xc
+    v = y - yc
+
+    a = a ** 2
+    b = b ** 2
+
+    ellipse = np.sqrt(u * u / a + v * v / b)
+    grad = np.sqrt((u / a) ** 2 + (v / b) ** 2) / np.maximum(ellipse, _EPSILON)
+    grad = np.maximum(grad, _EPSILON)
+
+    if pt is None:
+        return (ellipse - r * r) / grad
+
+    inner = (1 - pt) * r ** 2
+    outer = (1 + pt) * r ** 2
+
+    return _band(ellipse, inner, outer) / grad
+
+
+@ar.definition
+def SuperEllipse(
+    x: math.X, y: math.Y, *, xc=0, yc=0, a=1, b=1, n=3, r=0.8, m=None, pt=None
+) -> np.ndarray:
+    """An approximate signed distance field for :class:`arlunio.shape.SuperEllipse`.
+
+    Takes the same attributes as the shape it represents. The distance is estimated
+    by dividing the super ellipse's implicit function by the length of its gradient,
+    which is accurate close to the boundary.
+    """
+
+    if m is None:
+        m = n
+
+    u = np.abs((x - xc) / a)
+    v = np.abs((y - yc) / b)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gu = n * u ** (n - 1) / a
+        gv = m * v ** (m - 1) / b
+
+    # The gradient is unbounded along the axes when n, m < 1.
+    grad = np.sqrt(np.nan_to_num(gu * gu + gv * gv, nan=np.inf))
+    grad = np.maximum(grad, _EPSILON)
+
+    ellipse = u ** n + v ** m
+
+    if pt is None:
+        return (ellipse - r) / grad
+
+    inner = (1 - pt) * r
+    outer = (1 + pt) * r
+
+    return _band(ellipse, inner, outer) / grad
+
+
+@ar.definition
+def Square(x: math.X, y: math.Y, *, xc=0, yc=0, size=0.8, pt=None) -> np.ndarray:
+    """The signed distance field for :class:`arlunio.shape.Square`.
+
+    Takes the same attributes as the shape it represents.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> x = np.array([0, 0.4, 0.8, 1.2])
+    >>> sdf.Square(size=0.8)(x=x, y=0)
+    array([-0.8, -0.4,  0. ,  0.4])
+    """
+
+    xs = np.abs(x - xc)
+    ys = np.abs(y - yc)
+
+    if pt is None:
+        return _box(xs, ys, size, size)
+
+    s = (1 - pt) * size
+    S = (1 + pt) * size
+
+    return np.maximum(_box(xs, ys, S, S), -_box(xs, ys, s, s))
+
+
+@ar.definition
+def Rectangle(
+    x: math.X, y: math.Y, *, xc=0, yc=0, size=0.6, ratio=1.618, pt=None
+) -> np.ndarray:
+    """The signed distance field for :class:`arlunio.shape.Rectangle`.
+
+    Takes the same attributes as the shape it represents.
+    """
+
+    xs = np.abs(x - xc)
+    ys = np.abs(y - yc)
+
+    height = np.sqrt(size / ratio)
+    width = height * ratio
+
+    if pt is None:
+        return _box(xs, ys, width, height)
+
+    w, W = (1 - pt) * width, (1 + pt) * width
+    h, H = (1 - pt) * height, (1 + pt) * height
+
+    return np.maximum(_box(xs, ys, W, H), -_box(xs, ys, w, h))
+
+
+_SHAPES = {
+    shape.Circle: Circle,
+    shape.Ellipse: Ellipse,
+    shape.Rectangle: Rectangle,
+    shape.Square: Square,
+    shape.SuperEllipse: SuperEllipse,
+}
+
+
+def of(defn: ar.Defn) -> ar.Defn:
+    """Return the signed distance field definition for the given shape.
+
+    The returned definition will share the attribute values of the given shape.
+
+    Parameters
+    ----------
+    defn:
+        An instance of one of the stock shapes in :mod:`arlunio.shape`.
+
+    Example
+    -------
+    >>> import arlunio.sdf as sdf
+    >>> import arlunio.shape as shape
+    >>> sdf.of(shape.Square(xc=0.5, size=0.2))
+    Square(xc=0.5, yc=0, size=0.2, pt=None, x0=0, scale=1, stretch=False, y0=0)
+    """
+
+    sdf = _SHAPES.get(type(defn), None)
+
+    if sdf is None:
+        name = type(defn).__name__
+        raise TypeError(f"There is no signed distance field for '{name}'")
+
+    return sdf(**defn.values(inherited=True))
+
+
+def union(*fields: np.ndarray) -> np.ndarray:
+    """Combine the given fields so that a point is inside the result if it is inside
+    **any** of them.
+
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> sdf.union(np.array([-1, 1, 2]), np.array([1, -1, 3]))
+    array([-1, -1,  2])
+    """
+    return np.minimum.reduce(np.broadcast_arrays(*fields))
+
+
+def intersect(*fields: np.ndarray) -> np.ndarray:
+    """Combine the given fields so that a point is inside the result if it is inside
+    **all** of them.
+
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> sdf.intersect(np.array([-1, 1, -2]), np.array([1, -1, -3]))
+    array([ 1,  1, -2])
+    """
+    return np.maximum.reduce(np.broadcast_arrays(*fields))
+
+
+def subtract(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Remove the region described by the field :code:`b` from the field :code:`a`.
+
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> sdf.subtract(np.array([-1, -1, 1]), np.array([-2, 2, -2]))
+    array([ 2, -1,  2])
+    """
+    return np.maximum(a, -b)
+
+
+def offset(field: np.ndarray, amount: float) -> np.ndarray:
+    """Grow the region described by the field by the given amount, or shrink it if
+    :code:`amount` is negative.
+
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> sdf.offset(np.array([-1.0, 0.0, 1.0]), 0.5)
+    array([-1.5, -0.5,  0.5])
+    """
+    return field - amount
+
+
+def outline(field: np.ndarray, thickness: float) -> np.ndarray:
+    """Return the field describing the outline of a region, where the outline extends
+    :code:`thickness` either side of the region's border.
+
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> sdf.outline(np.array([-1.0, -0.1, 0.0, 0.1, 1.0]), 0.2)
+    array([ 0.8, -0.1, -0.2, -0.1,  0.8])
+    """
+    return np.abs(field) - thickness
+
+
+def to_mask(field: np.ndarray) -> mask.Mask:
+    """Convert a field into a mask, selecting all the points inside the region.
+
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> sdf.to_mask(np.array([-1.0, 0.0, 1.0]))
+    Mask([ True, False, False])
+    """
+    return mask.Mask(field < 0)
+
+
+def to_coverage(field: np.ndarray, feather: float) -> np.ndarray:
+    """Convert a field into an antialiased coverage array, suitable for use with
+    :func:`arlunio.image.fill`.
+
+    Points further than :code:`feather / 2` inside or outside the region's border are
+    fully covered or empty respectively, while points in between fade linearly.
+    Setting :code:`feather` to the width of a pixel gives antialiased edges, while
+    larger values give softer edges.
+
+    >>> import numpy as np
+    >>> import arlunio.sdf as sdf
+    >>> sdf.to_coverage(np.array([-1.0, -0.25, 0.0, 0.25, 1.0]), 1)
+    array([1.  , 0.75, 0.5 , 0.25, 0.  ])
+    """
+    return np.clip(0.5 - field / feather, 0, 1)
@@ -3,8 +3,12 @@ from __future__ import annotations
 import numpy as np
 
 import arlunio as ar
+import arlunio.ast as ast
 import arlunio.math as math
 import arlunio.region as region
+from arlunio.backends.numpy import NumpyBackend
+from arlunio.backends.numpy import x_axis
+from arlunio.backends.numpy import y_axis
 
 # TODO: Remove this in favour of 'region'
 import arlunio.mask as mask
@@ -265,6 +269,41 @@ def Ellipse(x: math.X, y: math.Y, *, xc=0, yc=0, a=2, b=1, r=0.8, pt=None) -> ma
     return mask.all_(inner < ellipse, ellipse < outer)
 
 
+_MAX_INTEGER_POWER = 16
+"""The largest integer exponent computed by repeated multiplication."""
+
+
+def _abs_power(values, n):
+    """Compute :code:`np.abs(values) ** n`, avoiding numpy's general floating point
+    power where we can."""
+
+    values = np.abs(values)
+
+    if np.ndim(n) != 0:
+        return values ** n
+
+    if n == 0.5:
+        return np.sqrt(values)
+
+    if n != int(n) or not (1 <= n <= _MAX_INTEGER_POWER):
+        return values ** n
+
+    # Exponentiation by squaring
+    n = int(n)
+    result = None
+
+    while n > 0:
+        if n & 1:
+            result = values if result is None else result * values
+
+        n >>= 1
+
+        if n > 0:
+            values = values * values
+
+    return result
+
+
 @ar.definition
 def SuperEllipse(
     x: math.X, y: math.Y, *, xc=0, yc=0, a=1, b=1, n=3, r=0.8, m=None, pt=None
@@ -396,13 +435,18 @@ def SuperEllipse(
 
     """
 
-    x = x - xc
-    y = y - yc
-
     if m is None:
         m = n
 
-    ellipse = np.abs(x / a) ** n + np.abs(y / b) ** m
+    # Each term only depends on one of the coordinates so when evaluating on a grid
+    # they can be computed along the axes, leaving only the sum for every point.
+    if all(np.ndim(v) == 0 for v in [xc, yc, a, b, n, m]):
+        axes = _grid_axes(x, y)
+
+        if axes is not None:
+            x, y = axes[0].reshape(1, -1), axes[1].reshape(-1, 1)
+
+    ellipse = _abs_power((x - xc) / a, n) + _abs_power((y - yc) / b, m)
 
     if pt is None:
         return mask.Mask(ellipse < r)
@@ -413,6 +457,78 @@ def SuperEllipse(
     return mask.all_(inner < ellipse, ellipse < outer)
 
 
+def _grid_axes(x, y):
+    """If the given coordinates describe a grid, with :math:`x` increasing or decreasing
+    along each row and :math:`y` along each column, return the axes that define it."""
+
+    x, y = np.asarray(x), np.asarray(y)
+
+    if x.ndim != 2 or y.ndim != 2:
+        return None
+
+    xs, ys = x[0, :], y[:, 0]
+    height, width = len(ys), len(xs)
+
+    if x.shape[0] not in {1, height} or y.shape[1] not in {1, width}:
+        return None
+
+    if not (x == xs).all() or not (y == ys.reshape(-1, 1)).all():
+        return None
+
+    for axis in [xs, ys]:
+        steps = np.diff(axis)
+
+        if not ((steps >= 0).all() or (steps <= 0).all()):
+            return None
+
+    return xs, ys
+
+
+def _span(axis, center, size):
+    """Return the slice selecting the points on the (monotonic) axis that are within
+    the given distance of the center."""
+
+    index = np.flatnonzero(np.abs(axis - center) < size)
+
+    if len(index) == 0:
+        return slice(0, 0)
+
+    return slice(index[0], index[-1] + 1)
+
+
+def _box(x, y, xc, yc, outer, inner=None):
+    """Select the points within the axis aligned box centered on :math:`(x_c, y_c)`
+    with the given half width and height, excluding those in the inner box if given.
+
+    When the points form a grid the box covers a range of rows and columns, so rather
+    than testing every point we can find the range from the axes and fill it in
+    directly.
+    """
+
+    boxes = [outer] if inner is None else [outer, inner]
+    scalar = all(np.ndim(v) == 0 for v in [xc, yc, *outer, *(inner or [])])
+    axes = _grid_axes(x, y) if scalar else None
+
+    if axes is None:
+        xs = np.abs(x - xc)
+        ys = np.abs(y - yc)
+
+        result, *rest = [mask.all_(xs < w, ys < h) for w, h in boxes]
+
+        for other in rest:
+            result -= other
+
+        return result
+
+    xs, ys = axes
+    result = mask.Mask.empty(len(ys), len(xs))
+
+    for value, (w, h) in zip([True, False], boxes):
+        result[_span(ys, yc, h), _span(xs, xc, w)] = value
+
+    return result
+
+
 @ar.definition
 def Square(x: math.X, y: math.Y, *, xc=0, yc=0, size=0.8, pt=None) -> mask.Mask:
     """
@@ -478,19 +594,13 @@ def Square(x: math.X, y: math.Y, *, xc=0, yc=0, size=0.8, pt=None) -> mask.Mask:
           img = square(width=1920, height=1080)
     """
 
-    xs = np.abs(x - xc)
-    ys = np.abs(y - yc)
-
     if pt is None:
-        return mask.all_(xs < size, ys < size)
+        return _box(x, y, xc, yc, (size, size))
 
     s = (1 - pt) * size
     S = (1 + pt) * size
 
-    inner = mask.all_(xs < s, ys < s)
-    outer = mask.all_(xs < S, ys < S)
-
-    return outer - inner
+    return _box(x, y, xc, yc, (S, S), inner=(s, s))
 
 
 @ar.definition
@@ -556,26 +666,41 @@ def Rectangle(
           image = demo(width=1920, height=1080)
     """
 
-    xs = np.abs(x - xc)
-    ys = np.abs(y - yc)
-
     height = np.sqrt(size / ratio)
     width = height * ratio
 
     if pt is None:
-        return mask.all_(xs < width, ys < height)
+        return _box(x, y, xc, yc, (width, height))
 
     w, W = (1 - pt) * width, (1 + pt) * width
     h, H = (1 - pt) * height, (1 + pt) * height
 
-    inner = mask.all_(xs < w, ys < h)
-    outer = mask.all_(xs < W, ys < H)
+    return _box(x, y, xc, yc, (W, H), inner=(w, h))
+
+
+def _edges(a, b, c, sign):
+    """Return the coefficients :math:`(A, B, C)` of the edge functions
+    :math:`Ax + By + C` of the triangle :math:`abc`.
+
+    Each function is positive for points to the left of its edge, the :code:`sign`
+    should be negative for triangles given in clockwise order so that points inside
+    the triangle are always positive.
+    """
+
+    for p, q in [(a, b), (b, c), (c, a)]:
+        px, py = p[..., 0], p[..., 1]
+        qx, qy = q[..., 0], q[..., 1]
 
-    return outer - inner
+        A = (py - qy) * sign
+        B = (qx - px) * sign
+
+        yield A, B, -(A * px + B * py)
 
 
 @ar.definition
-def Triangle(p: math.Barycentric) -> mask.Mask:
+def Triangle(
+    x: math.X, y: math.Y, *, a=(0.5, -0.5), b=(0, 0.5), c=(-0.5, -0.5)
+) -> mask.Mask:
     """A triangle.
 
     .. arlunio-image:: Triangle Demo
@@ -589,10 +714,888 @@ def Triangle(p: math.Barycentric) -> mask.Mask:
           tri = shape.Triangle()
           image = img.fill(tri(width=256, height=256))
 
+    A point is inside the triangle if it lies on the inside of each of the triangle's
+    three edges. Each edge is described by a linear function of :math:`x` and
+    :math:`y` so when given the coordinate axes, rather than full coordinate grids, the
+    triangle can be drawn without constructing any intermediate grids beyond the
+    final result. The edges are then only tested over the rows and columns within
+    the triangle's bounding box.
+
+    Attributes
+    ----------
+    a:
+        The cartesian :math:`(x, y)` coordinates of the point :math:`a`
+    b:
+        The cartesian :math:`(x, y)` coordinates of the point :math:`b`
+    c:
+        The cartesian :math:`(x, y)` coordinates of the point :math:`c`
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.shape as shape
+    >>> x = np.linspace(-1, 1, 5)
+    >>> y = np.linspace(1, -1, 5).reshape(-1, 1)
+    >>> shape.Triangle(a=(1, -1), b=(-1, 1), c=(-1, -1))(x=x, y=y)
+    Mask([[False, False, False, False, False],
+          [False, False, False, False, False],
+          [False,  True, False, False, False],
+          [False,  True,  True, False, False],
+          [False, False, False, False, False]])
+    """
+
+    a, b, c = np.asarray(a), np.asarray(b), np.asarray(c)
+
+    # Orient the edges so that points inside the triangle are positive, regardless of
+    # the order the points are given in.
+    ab, ac = b - a, c - a
+    sign = np.sign(ab[..., 0] * ac[..., 1] - ab[..., 1] * ac[..., 0])
+
+    edges = list(_edges(a, b, c, sign))
+    scalar = all(p.shape == (2,) for p in [a, b, c])
+    axes = _grid_axes(x, y) if scalar else None
+
+    if axes is None:
+        return mask.all_(*(A * x + (B * y + C) > 0 for A, B, C in edges))
+
+    # Only the rows and columns within the triangle's bounding box need testing.
+    xs, ys = axes
+    points = np.stack([a, b, c])
+
+    cols = slice(*_pixel_range(xs, points[:, 0].min(), points[:, 0].max()))
+    rows = slice(*_pixel_range(ys, points[:, 1].min(), points[:, 1].max()))
+
+    x, y = xs[cols].reshape(1, -1), ys[rows].reshape(-1, 1)
+    result = mask.Mask.empty(len(ys), len(xs))
+
+    mask.all_(*(A * x + (B * y + C) > 0 for A, B, C in edges), out=result[rows, cols])
+    return result
+
+
+_FILL_RULES = {
+    "evenodd": lambda winding: winding % 2 == 1,
+    "nonzero": lambda winding: winding != 0,
+}
+
+# The same rules, written using only the operations expressions support.
+_NODE_FILL_RULES = {
+    "evenodd": lambda winding: (-1) ** winding < 0,
+    "nonzero": lambda winding: mask.any_(winding < -0.5, winding > 0.5),
+}
+
+
+def _polygon_edges(points):
+    """Return the start and end points of each edge of the closed polygon with the
+    given vertices, horizontal edges are dropped as they never cross a scanline."""
+
+    start = np.asarray(points, dtype=float)
+    end = np.roll(start, -1, axis=0)
+
+    keep = start[:, 1] != end[:, 1]
+    return start[keep], end[keep]
+
+
+def _crossings(start, end, y):
+    """Return the :math:`x` coordinate where each edge crosses the line at the given
+    height(s), along with the direction the edge is heading."""
+
+    x0, y0 = start[..., 0], start[..., 1]
+    x1, y1 = end[..., 0], end[..., 1]
+
+    crossing = x0 + (y - y0) * ((x1 - x0) / (y1 - y0))
+    direction = np.where(y1 > y0, 1, -1)
+
+    return crossing, direction
+
+
+def _winding(x, y, start, end):
+    """Compute the winding number of each point by testing it against every edge."""
+
+    winding = np.zeros(np.broadcast(x, y).shape, dtype=int)
+
+    for p, q in zip(start, end):
+        lower, upper = sorted([p[1], q[1]])
+        crossing, direction = _crossings(p, q, y)
+
+        crossed = (lower <= y) & (y < upper) & (x > crossing)
+        winding += np.where(crossed, direction, 0)
+
+    return winding
+
+
+def _winding_node(x, y, start, end, rule):
+    """Build an expression testing each point against every edge, for when the
+    coordinates are themselves expressions.
+
+    The edges are only tested at the points within the polygon's bounding box.
+    """
+
+    if len(start) == 0:
+        return x > np.inf
+
+    terms = []
+
+    for p, q in zip(start, end):
+        lower, upper = sorted([p[1], q[1]])
+        crossing, direction = _crossings(p, q, y)
+
+        # Equivalent to (lower <= y) & (y < upper) & (x > crossing)
+        crossed = (1 - (y < lower)) * (y < upper) * (x > crossing)
+        terms.append(crossed * float(direction))
+
+    winding = ast.Node(ntype=ast.NodeType.PLUS, children=terms)
+
+    points = np.concatenate([start, end])
+    xmin, ymin = points.min(axis=0)
+    xmax, ymax = points.max(axis=0)
+
+    return mask.all_(
+        x > xmin,
+        x < np.nextafter(xmax, np.inf),
+        y > np.nextafter(ymin, -np.inf),
+        y < ymax,
+        _NODE_FILL_RULES[rule](winding),
+    )
+
+
+def _scanline(xs, ys, start, end, rule):
+    """Fill the polygon with the given edges using an active edge table.
+
+    For each edge we find the scanlines it crosses and the pixel where it crosses each
+    of them. The winding number then only changes at these crossings so it can be
+    recovered by summing along each row, which is restricted to the rows and columns
+    the polygon covers.
+    """
+
+    result = mask.Mask.empty(len(ys), len(xs))
+
+    # Work in terms of increasing coordinates, writing the result through a view that
+    # undoes any flips.
+    view = result
+
+    if xs[0] > xs[-1]:
+        xs, view = xs[::-1], view[:, ::-1]
+
+    if ys[0] > ys[-1]:
+        ys, view = ys[::-1], view[::-1, :]
+
+    # Scanline y is crossed by an edge if lower <= y < upper
+    lower = np.minimum(start[:, 1], end[:, 1])
+    upper = np.maximum(start[:, 1], end[:, 1])
+
+    first = np.searchsorted(ys, lower, side="left")
+    counts = np.searchsorted(ys, upper, side="left") - first
+
+    if counts.sum() == 0:
+        return result
+
+    edge = np.repeat(np.arange(len(start)), counts)
+    row = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    row += first[edge]
+
+    crossing, direction = _crossings(start[edge], end[edge], ys[row])
+
+    # Points are inside an edge if they lie to the right of where it crosses.
+    col = np.searchsorted(xs, crossing, side="right")
+
+    r0, r1 = row.min(), row.max() + 1
+    c0, c1 = col.min(), min(col.max(), len(xs))
+
+    delta = np.zeros((r1 - r0, len(xs) + 1 - c0), dtype=int)
+    np.add.at(delta, (row - r0, col - c0), direction)
+
+    winding = np.cumsum(delta[:, : c1 - c0], axis=1)
+    view[r0:r1, c0:c1] = _FILL_RULES[rule](winding)
+
+    return result
+
+
+def _fill_polygon(x, y, points, rule):
+    if rule not in _FILL_RULES:
+        rules = ", ".join(f"'{r}'" for r in _FILL_RULES)
+        raise ValueError(f"Unknown fill rule '{rule}', expected one of {rules}")
+
+    start, end = _polygon_edges(points)
+
+    if isinstance(x, ast.Node) or isinstance(y, ast.Node):
+        return _winding_node(x, y, start, end, rule)
+
+    axes = _grid_axes(x, y)
+
+    if axes is not None:
+        return _scanline(*axes, start, end, rule)
+
+    return mask.Mask(_FILL_RULES[rule](_winding(x, y, start, end)))
+
+
+@ar.definition
+def Polygon(x: math.X, y: math.Y, *, points=None, rule="nonzero") -> mask.Mask:
+    """A polygon.
+
+    .. arlunio-image:: Polygon Demo
+       :align: right
+
+       ::
+
+          import numpy as np
+
+          import arlunio.image as image
+          import arlunio.shape as shape
+
+          t = np.linspace(0, 2 * np.pi, 11)[:-1]
+          r = np.where(np.arange(10) % 2 == 0, 0.9, 0.4)
+          points = np.stack([r * np.sin(t), r * np.cos(t)], axis=1)
+
+          star = shape.Polygon(points=points)
+          img = image.fill(star(width=256, height=256))
+
+    When evaluated on a grid of points, the polygon is drawn using a scanline fill,
+    only doing work proportional to the number of edges and the area covered by the
+    polygon. Otherwise each point is tested against every edge, which when drawn by
+    giving the :code:`width` and :code:`height` is limited to the points within the
+    polygon's bounding box.
+
+    Attributes
+    ----------
+    points:
+        The :math:`(x, y)` coordinates of the polygon's vertices, the polygon is
+        automatically closed.
+    rule:
+        The rule used to decide which points are inside the polygon, either
+        :code:`nonzero` or :code:`evenodd`. These only differ for polygons that
+        intersect themselves.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.shape as shape
+    >>> x = np.linspace(-1, 1, 6)
+    >>> y = np.linspace(1, -1, 6).reshape(-1, 1)
+    >>> shape.Polygon(points=[(-0.9, -0.9), (0.9, -0.9), (0, 0.9)])(x=x, y=y)
+    Mask([[False, False, False, False, False, False],
+          [False, False, False, False, False, False],
+          [False, False,  True,  True, False, False],
+          [False, False,  True,  True, False, False],
+          [False,  True,  True,  True,  True, False],
+          [False, False, False, False, False, False]])
+    """
+
+    if points is None:
+        raise ValueError("You must provide the polygon's points.")
+
+    return _fill_polygon(x, y, points, rule)
+
+
+def _flatten(curve, tolerance):
+    """Approximate the Bezier curve with the given control points by line segments.
+
+    The maximum distance between a Bezier curve of degree :math:`d` and the line
+    segments joining :math:`n + 1` evenly spaced points along it is at most
+    :math:`d(d - 1)M / 8n^2` where :math:`M` is the length of the largest second
+    difference of the control points. We choose :math:`n` so that this is within the
+    given tolerance.
+    """
+
+    curve = np.asarray(curve, dtype=float)
+    degree = len(curve) - 1
+
+    if degree < 2:
+        return curve
+
+    M = np.sqrt((np.diff(curve, n=2, axis=0) ** 2).sum(axis=1)).max()
+    n = max(1, int(np.ceil(np.sqrt(degree * (degree - 1) * M / (8 * tolerance)))))
+
+    # Evaluate the curve using de Casteljau's algorithm.
+    t = np.linspace(0, 1, n + 1).reshape(-1, 1, 1)
+    points = np.broadcast_to(curve, (n + 1, *curve.shape))
+
+    while points.shape[1] > 1:
+        points = (1 - t) * points[:, :-1] + t * points[:, 1:]
+
+    return points[:, 0]
+
+
+def _path_points(curves, tolerance):
+    """Flatten each of the curves in a path and join them into a single polygon."""
+
+    points = [_flatten(curve, tolerance) for curve in curves]
+    points = np.concatenate(points)
+
+    # Drop any repeated points where one curve joins the next.
+    keep = np.any(points != np.roll(points, 1, axis=0), axis=1)
+    return points[keep]
+
+
+@ar.definition
+def Path(
+    x: math.X, y: math.Y, *, curves=None, rule="nonzero", tolerance=1e-3
+) -> mask.Mask:
+    """A closed path made up of straight lines and Bezier curves.
+
+    .. arlunio-image:: Path Demo
+       :align: right
+
+       ::
+
+          import arlunio.image as image
+          import arlunio.shape as shape
+
+          heart = shape.Path(
+              curves=[
+                  [(0, -0.8), (-1.2, 0), (-0.6, 1.1), (0, 0.4)],
+                  [(0, 0.4), (0.6, 1.1), (1.2, 0), (0, -0.8)],
+              ]
+          )
+          img = image.fill(heart(width=256, height=256))
+
+    Each curve in the path is approximated by a number of straight line segments and
+    the resulting outline is filled as a :class:`Polygon`.
+
+    Attributes
+    ----------
+    curves:
+        A list of curves, each given by its control points. Two points give a straight
+        line, three a quadratic Bezier curve, four a cubic and so on. Each curve is
+        joined to the next and the last is joined back to the start of the first.
+    rule:
+        The rule used to decide which points are inside the path, see
+        :class:`Polygon`
+    tolerance:
+        The maximum distance between each curve and the line segments used to
+        approximate it.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.shape as shape
+    >>> x = np.linspace(-1, 1, 6)
+    >>> y = np.linspace(1, -1, 6).reshape(-1, 1)
+    >>> arch = shape.Path(curves=[[(-0.9, -0.9), (0, 2.5), (0.9, -0.9)]])
+    >>> arch(x=x, y=y)
+    Mask([[False, False, False, False, False, False],
+          [False, False,  True,  True, False, False],
+          [False, False,  True,  True, False, False],
+          [False,  True,  True,  True,  True, False],
+          [False,  True,  True,  True,  True, False],
+          [False, False, False, False, False, False]])
+    """
+
+    if curves is None:
+        raise ValueError("You must provide the path's curves.")
+
+    return _fill_polygon(x, y, _path_points(curves, tolerance), rule)
+
+
+def _thickness(pt):
+    return 1 if pt is None else 1 + pt
+
+
+def _circle_bounds(defn):
+    return defn.xc, defn.yc, defn.r2, defn.r2
+
+
+def _ellipse_bounds(defn):
+    r = defn.r ** 2 * _thickness(defn.pt)
+    return defn.xc, defn.yc, np.abs(defn.a) * r, np.abs(defn.b) * r
+
+
+def _super_ellipse_bounds(defn):
+    m = defn.n if defn.m is None else defn.m
+    r = defn.r * _thickness(defn.pt)
+
+    w = np.abs(defn.a) * r ** (1 / defn.n)
+    h = np.abs(defn.b) * r ** (1 / m)
+
+    return defn.xc, defn.yc, w, h
+
+
+def _square_bounds(defn):
+    size = defn.size * _thickness(defn.pt)
+    return defn.xc, defn.yc, size, size
+
+
+def _rectangle_bounds(defn):
+    height = np.sqrt(defn.size / defn.ratio) * _thickness(defn.pt)
+    return defn.xc, defn.yc, height * defn.ratio, height
+
+
+def _triangle_bounds(defn):
+    points = np.stack(np.broadcast_arrays(defn.a, defn.b, defn.c))
+
+    lower = points.min(axis=0)
+    upper = points.max(axis=0)
+
+    xc, yc = (upper + lower)[..., 0] / 2, (upper + lower)[..., 1] / 2
+    w, h = (upper - lower)[..., 0] / 2, (upper - lower)[..., 1] / 2
+
+    return xc, yc, w, h
+
+
+def _points_bounds(points):
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+    lower = points.min(axis=0)
+    upper = points.max(axis=0)
+
+    return (*((upper + lower) / 2), *((upper - lower) / 2))
+
+
+def _polygon_bounds(defn):
+    return _points_bounds(defn.points)
+
+
+def _path_bounds(defn):
+    # A Bezier curve lies within the convex hull of its control points.
+    return _points_bounds(np.concatenate([np.reshape(c, (-1, 2)) for c in defn.curves]))
+
+
+_BOUNDS = {
+    Circle: _circle_bounds,
+    Ellipse: _ellipse_bounds,
+    SuperEllipse: _super_ellipse_bounds,
+    Square: _square_bounds,
+    Rectangle: _rectangle_bounds,
+    Triangle: _triangle_bounds,
+    Polygon: _polygon_bounds,
+    Path: _path_bounds,
+}
+
+
+def bounds(defn: ar.Defn):
+    """Return the bounding box of the given shape.
+
+    The bounding box is given as a tuple :code:`(xmin, ymin, xmax, ymax)` in the
+    coordinate system the shape is defined in, all points selected by the shape are
+    guaranteed to lie within it. This only holds when the shape is evaluated with its
+    default :code:`x` and :code:`y` inputs.
+
+    If any of the shape's attributes are arrays then the bounds will also be arrays,
+    giving the bounding box of each instance of the shape.
+
+    Parameters
+    ----------
+    defn:
+        An instance of one of :class:`Circle`, :class:`Ellipse`,
+        :class:`SuperEllipse`, :class:`Square`, :class:`Rectangle`,
+        :class:`Triangle`, :class:`Polygon` or :class:`Path`
+
+    Example
+    -------
+    >>> import arlunio.shape as shape
+    >>> shape.bounds(shape.Circle(xc=0.5, r2=0.25))
+    (0.25, -0.25, 0.75, 0.25)
+    >>> shape.bounds(shape.Square(size=0.5, pt=0.2))
+    (-0.6, -0.6, 0.6, 0.6)
     """
 
-    l1 = p[:, :, 0]
-    l2 = p[:, :, 1]
-    l3 = p[:, :, 2]
+    impl = _BOUNDS.get(type(defn), None)
+
+    if impl is None:
+        raise TypeError(f"Unable to determine the bounds of '{type(defn).__name__}'")
+
+    xc, yc, w, h = impl(defn)
+    return xc - w, yc - h, xc + w, yc + h
+
+
+def _pixel_range(axis, start, stop):
+    """Given a (monotonic) coordinate axis, find the range of indices whose coordinates
+    fall between start and stop (inclusive)."""
+
+    if axis[0] > axis[-1]:
+        axis, start, stop = -axis, -stop, -start
+
+    first = np.searchsorted(axis, start, side="left")
+    last = np.searchsorted(axis, stop, side="right")
+
+    return first, last
+
+
+def _bin(first_col, last_col, first_row, last_row, size, ncols):
+    """Assign each instance to all of the tiles its pixel bounds overlap.
+
+    Returns two arrays, the tile ids and the instance each belongs to, sorted by tile
+    and then instance.
+    """
+
+    visible = (last_col > first_col) & (last_row > first_row)
+    index = np.flatnonzero(visible)
+
+    tx0, tx1 = first_col[index] // size, (last_col[index] - 1) // size
+    ty0, ty1 = first_row[index] // size, (last_row[index] - 1) // size
+
+    nx = tx1 - tx0 + 1
+    counts = nx * (ty1 - ty0 + 1)
+
+    instance = np.repeat(np.arange(len(index)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    tx = tx0[instance] + local % nx[instance]
+    ty = ty0[instance] + local // nx[instance]
+
+    tiles = ty * ncols + tx
+    instance = index[instance]
+
+    order = np.lexsort((instance, tiles))
+    return tiles[order], instance[order]
+
+
+_COORDINATES = {"x0": 0, "y0": 0, "scale": 1, "stretch": False}
+"""The default coordinate system, for shapes that don't depend on both x and y."""
+
+
+def _axes(defn, width, height):
+    """Return the x and y coordinate axes the given shape is drawn with."""
+
+    values = {**_COORDINATES, **defn.values(inherited=True)}
+    coords = {k: values[k] for k in ["scale", "stretch"]}
+
+    xs = x_axis(width, height, x0=values["x0"], **coords)
+    ys = y_axis(width, height, y0=values["y0"], **coords)
+
+    return xs, ys
+
+
+_MAX_BATCH_SIZE = 2 ** 22
+"""The maximum number of points to evaluate at once when drawing a batch of shapes."""
+
+
+def _draw_tile(result, x, y, defn, instances, members):
+    """Draw the given instances of a shape into a single tile of the result."""
+
+    values = defn.values(inherited=True)
+    chunk = max(1, _MAX_BATCH_SIZE // (x.size * y.size))
+
+    for i in range(0, len(members), chunk):
+        index = members[i : i + chunk]
+
+        attrs = {
+            k: v[index].reshape(len(index), 1, 1, *v.shape[1:])
+            for k, v in instances.items()
+        }
+        inside = type(defn)(**{**values, **attrs})(x=x, y=y)
+        inside = np.broadcast_to(inside, (len(index), y.size, x.size))
+
+        if result.dtype == bool:
+            result |= np.any(inside, axis=0)
+            continue
+
+        found = np.where(inside, index.reshape(-1, 1, 1), -1)
+        np.maximum(result, np.max(found, axis=0), out=result)
+
+
+@ar.definition
+def Batch(width: int, height: int, *, defn=None, instances=None, ids=False, tile=64):
+    """Draw many instances of the same shape in a single pass.
+
+    .. arlunio-image:: Batch Demo
+       :align: right
+
+       ::
+
+          import numpy as np
+          import numpy.random as npr
+
+          import arlunio.image as image
+          import arlunio.shape as shape
+
+          gen = npr.default_rng(seed=1)
+          circles = shape.Batch(
+              defn=shape.Circle(),
+              instances={
+                  "xc": gen.uniform(-1, 1, 100),
+                  "yc": gen.uniform(-1, 1, 100),
+                  "r2": gen.uniform(0.02, 0.1, 100),
+              },
+          )
+
+          img = image.fill(circles(width=256, height=256))
+
+    Rather than evaluating each instance of a shape across the entire image, each
+    instance is only evaluated within its bounding box (see :func:`bounds`). The image
+    is divided into tiles, each of which evaluates all the instances overlapping it in
+    one go.
+
+    Attributes
+    ----------
+    defn:
+        An instance of the shape to draw, any attribute not given in
+        :code:`instances` will take its value from here. This also determines the
+        coordinate system (:code:`scale`, :code:`x0`, etc.) used.
+    instances:
+        A dictionary mapping attribute names to arrays holding the value of that
+        attribute for each instance. The first axis of each array is the instance, so
+        for example the points of many triangles would be given as arrays of shape
+        :code:`(n, 2)`.
+    ids:
+        If :code:`True`, rather than a mask return an array of integers where each
+        pixel holds the index of the (last) instance that covers it, or :code:`-1` if
+        there are none.
+    tile:
+        The size of the (square) tiles the image is divided into.
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> import arlunio.shape as shape
+    >>> squares = shape.Batch(
+    ...     defn=shape.Square(size=0.25),
+    ...     instances={"xc": np.array([-0.5, 0.5]), "yc": np.array([0.5, -0.5])},
+    ...     ids=True,
+    ... )
+    >>> squares(width=6, height=6)
+    array([[-1, -1, -1, -1, -1, -1],
+           [-1,  0, -1, -1, -1, -1],
+           [-1, -1, -1, -1, -1, -1],
+           [-1, -1, -1, -1, -1, -1],
+           [-1, -1, -1, -1,  1, -1],
+           [-1, -1, -1, -1, -1, -1]])
+    """
+
+    if defn is None:
+        raise ValueError("You must provide the shape to draw.")
+
+    instances = {} if instances is None else instances
+    instances = {k: np.asarray(v) for k, v in instances.items()}
+    n = len(next(iter(instances.values()))) if instances else 1
+
+    values = defn.values(inherited=True)
+    xs, ys = _axes(defn, width, height)
+
+    if ids:
+        result = np.full((height, width), -1)
+    else:
+        result = mask.Mask.empty(height, width)
+
+    # Find the pixels covered by each instance's bounding box.
+    box = bounds(type(defn)(**{**values, **instances}))
+    xmin, ymin, xmax, ymax = (np.broadcast_to(b, (n,)) for b in box)
+
+    first_col, last_col = _pixel_range(xs, xmin, xmax)
+    first_row, last_row = _pixel_range(ys, ymin, ymax)
+
+    ncols = int(np.ceil(width / tile))
+    tiles, members = _bin(first_col, last_col, first_row, last_row, tile, ncols)
+
+    # Each run of equal tile ids is a tile along with the instances that overlap it.
+    starts = np.flatnonzero(np.diff(tiles, prepend=-1))
+    stops = np.append(starts[1:], len(tiles))
+
+    for start, stop in zip(starts, stops):
+        ty, tx = divmod(tiles[start], ncols)
+
+        rows = slice(ty * tile, min((ty + 1) * tile, height))
+        cols = slice(tx * tile, min((tx + 1) * tile, width))
+
+        x, y = xs[cols].reshape(1, 1, -1), ys[rows].reshape(1, -1, 1)
+        _draw_tile(result[rows, cols], x, y, defn, instances, members[start:stop])
+
+    return result
+
+
+def mesh(vertices, faces, *, ids=False, tile=64, **attributes) -> ar.Defn:
+    """Return a definition that draws the given triangle mesh.
+
+    This is a :class:`Batch` of :class:`Triangle` instances, one for each face of the
+    mesh.
+
+    Parameters
+    ----------
+    vertices:
+        An array of shape :code:`(n, 2)` containing the :math:`(x, y)` coordinates of
+        each of the mesh's vertices.
+    faces:
+        An array of shape :code:`(m, 3)` containing the indices of the three vertices
+        that make up each face of the mesh.
+    ids:
+        If :code:`True`, the definition will return the index of the (last) face
+        covering each pixel, rather than a mask. See :class:`Batch`
+    tile:
+        The size of the tiles the image is divided into. See :class:`Batch`
+    attributes:
+        Any other attributes, such as :code:`scale` to pass on to the :class:`Triangle`
+        definition.
+
+    Example
+    -------
+    >>> import arlunio.shape as shape
+    >>> vertices = [(-0.9, -0.9), (0.9, -0.9), (0.9, 0.5), (-0.9, 0.5)]
+    >>> rect = shape.mesh(vertices, [(0, 1, 2), (0, 2, 3)], ids=True)
+    >>> rect(width=6, height=6)
+    array([[-1, -1, -1, -1, -1, -1],
+           [-1, -1, -1, -1, -1, -1],
+           [-1,  1,  1,  1,  0, -1],
+           [-1,  1,  1,  0,  0, -1],
+           [-1,  1,  0,  0,  0, -1],
+           [-1, -1, -1, -1, -1, -1]])
+    """
+
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+
+    return Batch(
+        defn=Triangle(**attributes),
+        instances={"a": a, "b": b, "c": c},
+        ids=ids,
+        tile=tile,
+    )
+
+
+def _pixel_bounds(defn, xs, ys):
+    """Return the range of columns and rows that may be covered by the given shape.
+
+    If we can't determine the bounds of the shape we have to assume it covers
+    everything.
+    """
+
+    try:
+        xmin, ymin, xmax, ymax = bounds(defn)
+    except TypeError:
+        return 0, len(xs), 0, len(ys)
+
+    first_col, last_col = _pixel_range(xs, xmin, xmax)
+    first_row, last_row = _pixel_range(ys, ymin, ymax)
+
+    return first_col, last_col, first_row, last_row
+
+
+def _draw_all(defn, width, height):
+    """Evaluate the given shape over the whole image.
+
+    Shapes may depend on the width and height of the image, rather than just the
+    :code:`x` and :code:`y` coordinates, so they cannot be evaluated one tile at a time.
+    """
+
+    result = defn(width=width, height=height)
+
+    if isinstance(result, ast.Node):
+        result = NumpyBackend(width, height).eval(result)
+
+    return np.broadcast_to(result, (height, width))
+
+
+@ar.definition
+def Scene(width: int, height: int, *, shapes=None, ids=False, tile=64):
+    """Draw a scene made up of many shapes.
+
+    .. arlunio-image:: Scene Demo
+       :align: right
+
+       ::
+
+          import numpy.random as npr
+
+          import arlunio.image as image
+          import arlunio.shape as shape
+
+          gen = npr.default_rng(seed=2)
+          shapes = []
+
+          for xc, yc, r in gen.uniform([-1, -1, 0.02], [1, 1, 0.1], (200, 3)):
+              if r < 0.06:
+                  shapes.append(shape.Circle(xc=xc, yc=yc, r2=r))
+              else:
+                  shapes.append(shape.Square(xc=xc, yc=yc, size=r, pt=0.2))
+
+          scene = shape.Scene(shapes=shapes)
+          img = image.fill(scene(width=256, height=256))
+
+    The image is divided into tiles and an index is built recording which shapes
+    overlap each tile based on their bounding boxes (see :func:`bounds`). Each tile
+    is then only evaluated against the shapes that overlap it, so that the cost of
+    drawing the scene depends on how many shapes overlap a given area rather than on
+    the total number of shapes.
+
+    Shapes whose bounds cannot be determined are evaluated once over the whole image
+    and copied into every tile. Unlike :class:`Batch` the shapes do not need to be of
+    the same type, or use the same coordinate system.
+
+    Attributes
+    ----------
+    shapes:
+        The list of shapes that make up the scene.
+    ids:
+        If :code:`True`, rather than a mask return an array of integers where each
+        pixel holds the index of the (last) shape in the list that covers it, or
+        :code:`-1` if there are none.
+    tile:
+        The size of the (square) tiles the image is divided into.
+
+    Example
+    -------
+    >>> import arlunio.shape as shape
+    >>> scene = shape.Scene(
+    ...     shapes=[shape.Square(xc=-0.5, size=0.25), shape.Circle(xc=0.5, r2=0.4)],
+    ...     ids=True,
+    ... )
+    >>> scene(width=6, height=6)
+    array([[-1, -1, -1, -1, -1, -1],
+           [-1, -1, -1, -1, -1, -1],
+           [-1,  0, -1,  1,  1, -1],
+           [-1,  0, -1,  1,  1, -1],
+           [-1, -1, -1, -1, -1, -1],
+           [-1, -1, -1, -1, -1, -1]])
+    """
+
+    shapes = [] if shapes is None else shapes
+
+    if ids:
+        result = np.full((height, width), -1)
+    else:
+        result = mask.Mask.empty(height, width)
+
+    if len(shapes) == 0:
+        return result
+
+    # Shapes typically share the same coordinate system, so only compute it once.
+    axes, coords = {}, []
+
+    for defn in shapes:
+        values = {**_COORDINATES, **defn.values(inherited=True)}
+        key = tuple(values[k] for k in _COORDINATES)
+
+        if key not in axes:
+            axes[key] = _axes(defn, width, height)
+
+        coords.append(axes[key])
+
+    # Shapes without known bounds cover every tile, so draw them in full up front.
+    unbounded = {
+        i: _draw_all(defn, width, height)
+        for i, defn in enumerate(shapes)
+        if type(defn) not in _BOUNDS
+    }
+
+    # Build the index, the list of shapes that overlap each tile.
+    pixels = [_pixel_bounds(defn, *xy) for defn, xy in zip(shapes, coords)]
+    first_col, last_col, first_row, last_row = (np.array(p) for p in zip(*pixels))
+
+    ncols = int(np.ceil(width / tile))
+    tiles, members = _bin(first_col, last_col, first_row, last_row, tile, ncols)
+
+    starts = np.flatnonzero(np.diff(tiles, prepend=-1))
+    stops = np.append(starts[1:], len(tiles))
+
+    for start, stop in zip(starts, stops):
+        ty, tx = divmod(tiles[start], ncols)
+
+        rows = slice(ty * tile, min((ty + 1) * tile, height))
+        cols = slice(tx * tile, min((tx + 1) * tile, width))
+        region = result[rows, cols]
+
+        for i in members[start:stop]:
+            if i in unbounded:
+                inside = unbounded[i][rows, cols]
+            else:
+                xs, ys = coords[i]
+                x, y = xs[cols].reshape(1, -1), ys[rows].reshape(-1, 1)
+
+                inside = np.broadcast_to(shapes[i](x=x, y=y), region.shape)
+
+            if ids:
+                region[inside] = i
+            else:
+                region |= inside
 
-    return mask.all_(0 < l1, l1 < 1, 0 < l2, l2 < 1, 0 < l3, l3 < 1)
+    return result
@@ -0,0 +1,331 @@
+"""Benchmarks for :mod:`arlunio.image`.
+
+These are not part of the test suite, run them directly to see how long filling and
+compositing images takes::
+
+   $ python benchmarks/bench_image.py
+"""
+import io
+import pathlib
+import tempfile
+import timeit
+
+import numpy as np
+import PIL.Image as PImage
+
+import arlunio.image as image
+import arlunio.shape as shape
+from arlunio.backends.numpy import NumpyBackend
+from arlunio.backends.numpy import premultiply
+from arlunio.image import _stream
+
+WIDTH, HEIGHT = 1920, 1080
+LAYERS = 20
+
+COLORS = ["#f00", "#0f0", "#00f", "#ff0", "#0ff", "#f0f", "#fff", "#000"]
+
+
+def report(name, stmt, number=10):
+    """Print the average time taken to run the given statement."""
+
+    seconds = timeit.timeit(stmt, number=number) / number
+    print(f"{name:<40} {seconds * 1000:8.2f}ms")
+
+
+def layers(coverage=False):
+    """Return a stack of randomly placed regions to fill."""
+
+    rng = np.random.default_rng(0)
+    xs = np.arange(WIDTH).reshape(1, -1)
+    ys = np.arange(HEIGHT).reshape(-1, 1)
+
+    regions = []
+
+    for _ in range(LAYERS):
+        cx, cy, r = rng.integers(0, WIDTH), rng.integers(0, HEIGHT), 200
+        d = np.sqrt((xs - cx) ** 2 + (ys - cy) ** 2)
+
+        if coverage:
+            regions.append(np.clip(r - d, 0, 1))
+        else:
+            regions.append(d < r)
+
+    return regions
+
+
+def paste(regions):
+    """Fill each region by pasting it onto a pillow image, as we used to."""
+
+    img = PImage.new("RGBA", (WIDTH, HEIGHT), color="#0000")
+
+    for i, region in enumerate(regions):
+        if np.issubdtype(region.dtype, np.floating):
+            region = np.round(np.clip(region, 0, 1) * 255).astype(np.uint8)
+
+        img.paste(COLORS[i % len(COLORS)], mask=PImage.fromarray(region))
+
+    return img
+
+
+def canvas(regions):
+    """Fill each region on a single numpy canvas."""
+
+    tree = image.new(color="#0000")
+
+    for i, region in enumerate(regions):
+        tree = image.fill(region, foreground=COLORS[i % len(COLORS)], image=tree)
+
+    return NumpyBackend(WIDTH, HEIGHT).eval(tree)
+
+
+def bench_fill():
+    for kind, coverage in [("mask", False), ("coverage", True)]:
+        regions = layers(coverage=coverage)
+        label = f"{LAYERS} layers ({kind})"
+
+        report(f"{label} paste", lambda: paste(regions))
+        report(f"{label} canvas", lambda: canvas(regions))
+
+
+def flatten(regions):
+    """Fill each region as a layer, flattened in a single pass."""
+
+    stack = image.Layers(background="#0000")
+
+    for i, region in enumerate(regions):
+        stack.add(region, color=COLORS[i % len(COLORS)])
+
+    return stack.flatten()
+
+
+def bench_layers():
+    for kind, coverage in [("mask", False), ("coverage", True)]:
+        regions = layers(coverage=coverage)
+        label = f"{LAYERS} layers ({kind})"
+
+        report(f"{label} fill", lambda: canvas(regions))
+        report(f"{label} flatten", lambda: flatten(regions))
+
+
+def bench_composite():
+    rng = np.random.default_rng(0)
+    images = [
+        rng.integers(0, 256, size=(HEIGHT, WIDTH, 4), dtype=np.uint8)
+        for _ in range(LAYERS)
+    ]
+
+    pillow = [PImage.fromarray(pixels) for pixels in images]
+    canvases = [image.Canvas(premultiply(pixels)) for pixels in images]
+
+    def add():
+        result = pillow[0]
+
+        for img in pillow[1:]:
+            result = PImage.alpha_composite(result, img)
+
+        return result
+
+    def composite():
+        result = canvases[0].copy()
+
+        for canvas in canvases[1:]:
+            result.composite(canvas)
+
+        return result.toimage()
+
+    report(f"{LAYERS} images alpha_composite", add)
+    report(f"{LAYERS} images canvas", composite)
+
+    # Small sprites placed across a large image.
+    size = 256
+    positions = rng.integers(0, [WIDTH - size, HEIGHT - size], size=(LAYERS, 2))
+
+    background = PImage.new("RGBA", (WIDTH, HEIGHT), color="white")
+    sprites = [PImage.fromarray(pixels[:size, :size]) for pixels in images]
+
+    def add_sprites():
+        result = image.Image(background)
+
+        for (x, y), sprite in zip(positions, sprites):
+            layer = PImage.new("RGBA", (WIDTH, HEIGHT))
+            layer.paste(sprite, (int(x), int(y)))
+
+            result = result + layer
+
+        return result
+
+    def composite_sprites():
+        result = image.Canvas.new(WIDTH, HEIGHT, background="white")
+
+        for (x, y), sprite in zip(positions, sprites):
+            result.composite(image.Canvas.fromimage(sprite), dest=(x, y))
+
+        return result.toimage()
+
+    report(f"{LAYERS} sprites add", add_sprites)
+    report(f"{LAYERS} sprites canvas", composite_sprites)
+
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4K": (3840, 2160),
+    "8K": (7680, 4320),
+}
+
+
+def scene(width, height):
+    """Return an image resembling a typical render: smooth gradients and flat
+    colors."""
+
+    xs = np.linspace(-1, 1, width).reshape(1, -1)
+    ys = np.linspace(-1, 1, height).reshape(-1, 1)
+
+    pixels = np.asarray(image.colorramp(np.sin(4 * xs) * np.cos(3 * ys))).copy()
+    pixels[xs ** 2 + ys ** 2 < 0.25] = (255, 0, 0, 255)
+
+    return image.fromarray(pixels)
+
+
+def report_size(name, encode, number=3):
+    """Print the average time taken to encode an image and the size of the result."""
+
+    seconds = timeit.timeit(encode, number=number) / number
+    size = len(encode())
+
+    print(f"{name:<40} {seconds * 1000:8.2f}ms {size / 2 ** 20:8.2f}MiB")
+
+
+def bench_encode():
+    for label, (width, height) in RESOLUTIONS.items():
+        img = scene(width, height)
+
+        def pillow(**kwargs):
+            with io.BytesIO() as stream:
+                img.save(stream, "PNG", **kwargs)
+                return stream.getvalue()
+
+        def banded(**kwargs):
+            return b"".join(_stream(img, **kwargs))
+
+        report_size(f"{label} pillow", lambda: pillow())
+        report_size(f"{label} pillow level 9", lambda: pillow(compress_level=9))
+        report_size(f"{label} up", lambda: banded())
+        report_size(f"{label} paeth", lambda: banded(filter="paeth"))
+        report_size(f"{label} up level 1", lambda: banded(compression=1))
+        report_size(f"{label} up rle", lambda: banded(strategy="rle"))
+        report_size(f"{label} up, 1 thread", lambda: banded(workers=1))
+
+
+def bench_eq():
+    for label, (width, height) in RESOLUTIONS.items():
+        a = scene(width, height)
+        b = a.copy()
+
+        def pillow():
+            return (np.asarray(a.img) == np.asarray(b.img)).all()
+
+        report(f"{label} eq pillow", pillow)
+        report(f"{label} eq", lambda: a == b)
+        report(f"{label} asarray", lambda: np.asarray(a))
+
+
+def shapes():
+    """Return a scene made only of shapes, which can be drawn at any size."""
+
+    img = image.new("white")
+
+    for i in range(LAYERS):
+        circle = shape.Circle(xc=(i % 5) * 0.4 - 0.8, yc=(i // 5) * 0.4 - 0.6, r2=0.3)
+        img = img.fill(circle, foreground=COLORS[i % len(COLORS)])
+
+    return img
+
+
+def bench_progressive():
+    scene = shapes()
+
+    def first():
+        return next(scene.progressive(size=(WIDTH, HEIGHT)))
+
+    def progressive():
+        return list(scene.progressive(size=(WIDTH, HEIGHT)))
+
+    report(f"{LAYERS} shapes draw", lambda: NumpyBackend(WIDTH, HEIGHT).draw(scene))
+    report(f"{LAYERS} shapes first preview", first)
+    report(f"{LAYERS} shapes progressive", progressive)
+
+
+THUMBNAILS = [(400, 400), (200, 200), (100, 100)]
+
+
+def bench_thumbnails():
+    scene = shapes()
+
+    def pillow():
+        img = image.Image(NumpyBackend(WIDTH, HEIGHT).draw(scene))
+        thumbs = []
+
+        for size in THUMBNAILS:
+            thumb = img.copy()
+            thumb.thumbnail(size)
+            thumbs.append(thumb)
+
+        return thumbs
+
+    report(f"{len(THUMBNAILS)} thumbnails full render", pillow, number=3)
+    report(f"{len(THUMBNAILS)} thumbnails", lambda: image.thumbnails(scene, THUMBNAILS))
+    report(
+        f"{len(THUMBNAILS)} thumbnails, 4x",
+        lambda: image.thumbnails(scene, THUMBNAILS, supersample=4),
+    )
+
+
+FORMATS = {
+    "png": {},
+    "png level 1": dict(compression=1),
+    "qoi": {},
+    "webp": {},
+    "webp method 4": dict(method=4, quality=80),
+    "npy": {},
+    "rgba": {},
+}
+
+
+def bench_formats():
+    directory = pathlib.Path(tempfile.mkdtemp())
+
+    for label, (width, height) in RESOLUTIONS.items():
+        img = scene(width, height)
+
+        for name, options in FORMATS.items():
+            path = directory / f"image.{name.split()[0]}"
+
+            def save():
+                image.save(img, path, **options)
+
+            def load():
+                # Copy the pixels, as the npy and rgba formats are loaded lazily.
+                return np.array(image.load(path, size=img.size))
+
+            encode = timeit.timeit(save, number=3) / 3
+            decode = timeit.timeit(load, number=3) / 3
+            size = path.stat().st_size
+
+            print(
+                f"{label + ' ' + name:<40} {encode * 1000:8.2f}ms "
+                f"{decode * 1000:8.2f}ms {size / 2 ** 20:8.2f}MiB"
+            )
+
+            path.unlink()
+
+
+if __name__ == "__main__":
+    bench_fill()
+    bench_layers()
+    bench_composite()
+    bench_encode()
+    bench_eq()
+    bench_progressive()
+    bench_thumbnails()
+    bench_formats()
@@ -0,0 +1,45 @@
+"""Benchmarks for :mod:`arlunio.shape`.
+
+These are not part of the test suite, run them directly to see how long drawing each
+shape takes::
+
+   $ python benchmarks/bench_shape.py
+"""
+import timeit
+
+import numpy as np
+
+import arlunio.shape as shape
+from arlunio.backends.numpy import x_axis
+from arlunio.backends.numpy import y_axis
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def report(name, stmt, number=10):
+    """Print the average time taken to run the given statement."""
+
+    seconds = timeit.timeit(stmt, number=number) / number
+    print(f"{name:<40} {seconds * 1000:8.2f}ms")
+
+
+def naive_super_ellipse(x, y, *, n, m, a=1, b=1, r=0.8):
+    return np.abs(x / a) ** n + np.abs(y / b) ** m < r
+
+
+def bench_super_ellipse():
+    xs, ys = x_axis(WIDTH, HEIGHT), y_axis(WIDTH, HEIGHT)
+    x, y = np.meshgrid(xs, ys)
+    xs, ys = xs.reshape(1, -1), ys.reshape(-1, 1)
+
+    for n, m in [(0.1, 0.1), (0.5, 0.5), (2, 2), (3, 3), (2.5, 0.1)]:
+        defn = shape.SuperEllipse(n=n, m=m)
+        label = f"SuperEllipse(n={n}, m={m})"
+
+        report(f"{label} naive", lambda: naive_super_ellipse(x, y, n=n, m=m))
+        report(f"{label} grid", lambda: defn(x=x, y=y))
+        report(f"{label} axes", lambda: defn(x=xs, y=ys))
+
+
+if __name__ == "__main__":
+    bench_super_ellipse()
@@ -0,0 +1,562 @@
+import numpy as np
+import numpy.testing as npt
+import PIL.Image as PImage
+import py.test
+from hypothesis import given
+from hypothesis.extra.numpy import arrays
+from hypothesis.strategies import booleans
+from hypothesis.strategies import integers
+from hypothesis.strategies import just
+from hypothesis.strategies import sampled_from
+from hypothesis.strategies import tuples
+
+import arlunio.ast as ast
+import arlunio.image as image
+import arlunio.math as math
+import arlunio.pattern as pattern
+import arlunio.shape as shape
+import arlunio.testing as T
+from arlunio.backends.numpy import GridCache
+from arlunio.backends.numpy import NumpyBackend
+from arlunio.backends.numpy import composite
+from arlunio.backends.numpy import polar_grids
+from arlunio.backends.numpy import premultiply
+from arlunio.backends.numpy import unpremultiply
+from arlunio.backends.numpy import x_axis
+from arlunio.backends.numpy import y_axis
+
+
+def x():
+    return ast.Node.builtin(name="x", x0=0, scale=1, stretch=True)
+
+
+def y():
+    return ast.Node.builtin(name="y", y0=0, scale=1, stretch=True)
+
+
+def grid(width, height):
+    """Return the coordinate grid the backend should produce."""
+
+    xs = np.linspace(-1, 1, width)
+    ys = np.linspace(1, -1, height)
+
+    return np.meshgrid(xs, ys)
+
+
+class RecordingBackend(NumpyBackend):
+    """A backend that records the builtins it evaluates."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evaluated = []
+
+    def eval_builtin(self, tree: ast.Node):
+        self.evaluated.append((tree.attributes["name"], self.shape))
+        return super().eval_builtin(tree)
+
+
+class TestShortCircuit:
+    """Tests for the short circuit evaluation of intersections and unions."""
+
+    @given(width=T.dimension, height=T.dimension)
+    def test_intersect(self, width, height):
+        """Ensure that an intersection gives the same result as combining each
+        condition over the full image."""
+
+        xs, ys = grid(width, height)
+        tree = ast.Node.intersect(x() > -0.5, y() < 0.25, x() + y() < 0.5)
+
+        backend = NumpyBackend(width=width, height=height)
+        expected = np.logical_and.reduce([xs > -0.5, ys < 0.25, xs + ys < 0.5])
+
+        assert (backend.eval(tree) == expected).all()
+
+    @given(width=T.dimension, height=T.dimension)
+    def test_union(self, width, height):
+        """Ensure that a union gives the same result as combining each condition
+        over the full image."""
+
+        xs, ys = grid(width, height)
+        tree = ast.Node.union(x() < -0.5, y() > 0.25, x() + y() > 0.5)
+
+        backend = NumpyBackend(width=width, height=height)
+        expected = np.logical_or.reduce([xs < -0.5, ys > 0.25, xs + ys > 0.5])
+
+        assert (backend.eval(tree) == expected).all()
+
+    @given(width=T.dimension, height=T.dimension)
+    def test_nested(self, width, height):
+        """Ensure that selections compose correctly when nested."""
+
+        xs, ys = grid(width, height)
+        tree = ast.Node.intersect(
+            x() > -0.5, ast.Node.union(y() > 0.5, ast.Node.intersect(x() < 0, y() < 0))
+        )
+
+        backend = NumpyBackend(width=width, height=height)
+        expected = (xs > -0.5) & ((ys > 0.5) | ((xs < 0) & (ys < 0)))
+
+        assert (backend.eval(tree) == expected).all()
+
+    @py.test.mark.parametrize(
+        "tree, expected",
+        [
+            (ast.Node.intersect(x() > 2, y() < 0), ["x"]),
+            (ast.Node.union(x() < 2, y() < 0), ["x"]),
+            (ast.Node.intersect(x() > 0, y() < 0), ["x", "y"]),
+        ],
+    )
+    def test_skips_decided(self, tree, expected):
+        """Ensure that later conditions are only evaluated at the pixels that are still
+        undecided."""
+
+        backend = RecordingBackend(width=4, height=4)
+        backend.eval(tree)
+
+        assert [name for name, _ in backend.evaluated] == expected
+        assert backend.evaluated[0][1] == (4, 4)
+
+        if len(expected) > 1:
+            assert backend.evaluated[1][1] == (8,)
+
+    def test_selection_restored(self):
+        """Ensure that the selection is reset after evaluation."""
+
+        backend = NumpyBackend(width=4, height=4)
+        backend.eval(ast.Node.intersect(x() > 0, y() > 0))
+
+        assert backend.selection is None
+        assert backend.shape == (4, 4)
+
+    @py.test.mark.parametrize(
+        "combine, expected",
+        [
+            (ast.Node.union, [[1, 1, 0, 0], [1, 0, 1, 0]]),
+            (ast.Node.intersect, [[1, 0, 0, 0], [0, 0, 0, 0]]),
+        ],
+    )
+    def test_arrays_unchanged(self, combine, expected):
+        """Ensure that the arrays given to the backend are not modified, even when
+        their values are the starting point of the result."""
+
+        a = np.array([[1, 1, 0, 0], [1, 0, 0, 0]], dtype=bool)
+        b = np.array([[1, 0, 0, 0], [0, 0, 1, 0]], dtype=bool)
+
+        tree = combine(
+            ast.Node.builtin(name="array", value=a),
+            ast.Node.builtin(name="array", value=b),
+        )
+
+        backend = NumpyBackend(width=4, height=2)
+        result = backend.eval(tree)
+
+        assert (result == np.array(expected, dtype=bool)).all()
+        assert a.tolist() == [[1, 1, 0, 0], [1, 0, 0, 0]]
+        assert b.tolist() == [[1, 0, 0, 0], [0, 0, 1, 0]]
+
+
+class ShapeRecordingBackend(NumpyBackend):
+    """A backend that records the shape of the result of each node it evaluates."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evaluated = []
+
+    def _eval(self, tree: ast.Node):
+        result = super()._eval(tree)
+        self.evaluated.append((tree.ntype, np.shape(result)))
+
+        return result
+
+
+class TestSeparable:
+    """Tests for the separable evaluation of expressions."""
+
+    @given(width=T.dimension, height=T.dimension)
+    def test_arithmetic(self, width, height):
+        """Ensure that arithmetic on coordinates gives the same result as on the full
+        coordinate grids."""
+
+        xs, ys = grid(width, height)
+        tree = (x() * 2 - y() / 4) * (x() + 1) ** 2 - y() - x()
+
+        backend = NumpyBackend(width=width, height=height)
+        expected = (xs * 2 - ys / 4) * (xs + 1) ** 2 - ys - xs
+
+        npt.assert_allclose(backend.eval(tree), expected)
+
+    @given(width=T.dimension, height=T.dimension)
+    def test_checker(self, width, height):
+        """Ensure that the checker pattern can be evaluated."""
+
+        xs, ys = grid(width, height)
+        tree = pattern.Checker()(x=x(), y=y())
+
+        backend = NumpyBackend(width=width, height=height)
+        assert (backend.eval(tree) == (xs * ys > 0)).all()
+
+    def test_one_dimensional(self):
+        """Ensure that functions of only x or only y are computed as a single row or
+        column, only the final combination should be computed for every pixel."""
+
+        tree = (x() - 0.5) ** 2 + ast.Node.sqrt(y() * y()) < 1
+
+        backend = ShapeRecordingBackend(width=8, height=4)
+        assert backend.eval(tree).shape == (4, 8)
+
+        full = [ntype for ntype, shape in backend.evaluated if shape == (4, 8)]
+        assert full == [ast.NodeType.PLUS, ast.NodeType.LESS]
+
+        shapes = {shape for _, shape in backend.evaluated}
+        assert shapes == {(), (1, 8), (4, 1), (4, 8)}
+
+    def test_constant(self):
+        """Ensure that results that don't depend on the coordinates are expanded to the
+        full image."""
+
+        backend = NumpyBackend(width=4, height=2)
+        result = backend.eval(x() * 0 + 1)
+
+        assert result.shape == (2, 4)
+        assert (result == 1).all()
+
+    def test_array_unchanged(self):
+        """Ensure that arrays given to the backend are not modified."""
+
+        values = np.ones((2, 4))
+        tree = ast.Node.builtin(name="array", value=values) + x()
+
+        backend = NumpyBackend(width=4, height=2)
+        backend.eval(tree)
+
+        assert (values == 1).all()
+
+
+class TestPolar:
+    """Tests for the cached polar coordinate builtins."""
+
+    @given(
+        width=T.dimension,
+        height=T.dimension,
+        x0=sampled_from([0, 0.5]),
+        y0=sampled_from([0, -1]),
+        scale=sampled_from([1, 2.5]),
+        stretch=booleans(),
+    )
+    def test_values(self, width, height, x0, y0, scale, stretch):
+        """Ensure that the polar coordinates match the values computed directly from
+        the cartesian coordinates."""
+
+        coords = {"scale": scale, "stretch": stretch}
+        xs = x_axis(width, height, x0=x0, **coords).reshape(1, -1)
+        ys = y_axis(width, height, y0=y0, **coords).reshape(-1, 1)
+
+        backend = NumpyBackend(width=width, height=height)
+        r = math.R(x0=x0, y0=y0, **coords)(width=width, height=height)
+        t = math.T(x0=x0, y0=y0, t0=1, **coords)(width=width, height=height)
+
+        npt.assert_allclose(backend.eval(r), np.sqrt(xs * xs + ys * ys), atol=1e-12)
+        npt.assert_allclose(backend.eval(t), np.arctan2(ys, xs) - 1, atol=1e-12)
+
+    @py.test.mark.parametrize("width, height", [(41, 309), (2, 27), (8, 5)])
+    def test_theta_middle_row(self, width, height):
+        """Ensure that the angle along the negative x axis matches arctan2, which
+        depends on the sign of y even when it's zero."""
+
+        xs = x_axis(width, height).reshape(1, -1)
+        ys = y_axis(width, height).reshape(-1, 1)
+
+        backend = NumpyBackend(width=width, height=height)
+        t = backend.eval(math.T()(width=width, height=height))
+
+        npt.assert_allclose(t, np.arctan2(ys, xs), atol=1e-12)
+
+    def test_cached(self):
+        """Ensure that grids are reused between evaluations and cannot be modified."""
+
+        polar_grids.clear()
+        backend = NumpyBackend(width=16, height=8)
+        r = math.R()(width=16, height=8)
+
+        first = backend.eval(r)
+        assert backend.eval(r) is first
+        assert not first.flags.writeable
+
+        # Arithmetic on the grid should not try to modify it in place.
+        result = backend.eval(r + 1)
+
+        npt.assert_array_equal(result, first + 1)
+        assert len(polar_grids) == 1
+
+    def test_selection(self):
+        """Ensure that the polar builtins respect the current selection."""
+
+        r = math.R()(width=8, height=4)
+        backend = NumpyBackend(width=8, height=4)
+
+        expected = backend.eval(r)
+        index = np.array([0, 5, 17, 31])
+
+        npt.assert_array_equal(backend.eval_selected(r, index), expected.flat[index])
+
+    def test_fallback(self):
+        """Ensure that the coordinates are still computed directly when not given the
+        standard coordinates."""
+
+        x = np.array([3.0, 0.0])
+        y = np.array([4.0, 2.0])
+
+        npt.assert_array_equal(math.R()(x=x, y=y), [5, 2])
+        npt.assert_allclose(math.T()(x=x, y=y), np.arctan2(y, x))
+
+
+class TestGridCache:
+    """Tests for the :code:`GridCache`."""
+
+    def test_bounded(self):
+        """Ensure that the least recently used grids are dropped when the cache is
+        full."""
+
+        cache = GridCache(max_bytes=3 * 80)
+
+        for key in ["a", "b", "c"]:
+            cache.get(key, lambda: np.zeros(10))
+
+        cache.get("a", lambda: np.zeros(10))
+        cache.get("d", lambda: np.zeros(10))
+
+        assert len(cache) == 3
+        assert cache.nbytes <= cache.max_bytes
+
+        calls = []
+        cache.get("b", lambda: calls.append("b") or np.zeros(10))
+        cache.get("a", lambda: calls.append("a") or np.zeros(10))
+
+        assert calls == ["b"]
+
+    def test_too_large(self):
+        """Ensure that grids larger than the cache are not stored."""
+
+        cache = GridCache(max_bytes=8)
+        grid = cache.get("a", lambda: np.zeros(10))
+
+        assert grid.shape == (10,)
+        assert len(cache) == 0
+
+
+class TestFill:
+    """Tests for evaluating fill nodes"""
+
+    def test_coverage(self):
+        """Ensure that fractional coverage blends the color into the image."""
+
+        coverage = np.array([[0.0, 0.25], [0.5, 1.0]])
+        tree = image.fill(coverage, foreground="#f00", background="#00f")
+
+        backend = NumpyBackend(width=2, height=2)
+        pixels = np.asarray(backend.eval(tree))
+
+        red = np.round(coverage * 255)
+        npt.assert_array_equal(pixels[:, :, 0], red)
+        npt.assert_array_equal(pixels[:, :, 2], 255 - red)
+        npt.assert_array_equal(pixels[:, :, 3], 255)
+
+    def test_mask(self):
+        """Ensure that boolean masks can be filled."""
+
+        region = np.array([[True, False], [False, True]])
+        tree = image.fill(region, foreground="#f00", background="#00f")
+
+        backend = NumpyBackend(width=2, height=2)
+        pixels = np.asarray(backend.eval(tree))
+
+        npt.assert_array_equal(pixels[region], [[255, 0, 0, 255]] * 2)
+        npt.assert_array_equal(pixels[~region], [[0, 0, 255, 255]] * 2)
+
+    @given(width=T.dimension, height=T.dimension)
+    def test_matches_paste(self, width, height):
+        """Ensure that blending the color gives the same result as pasting it with
+        pillow."""
+
+        coverage = np.random.default_rng(width * height).random((height, width))
+        tree = image.fill(coverage, foreground="#f80c", background="#1234")
+
+        backend = NumpyBackend(width=width, height=height)
+        pixels = np.asarray(backend.eval(tree))
+
+        expected = PImage.new("RGBA", (width, height), color="#1234")
+        mask = PImage.fromarray(np.round(coverage * 255).astype(np.uint8))
+        expected.paste((255, 136, 0, 204), mask=mask)
+
+        npt.assert_array_equal(pixels, np.asarray(expected))
+
+    def test_layers(self):
+        """Ensure that a stack of fills is drawn in order."""
+
+        tree = image.new(color="#000")
+
+        for i, color in enumerate(["#f00", "#0f0", "#00f"]):
+            region = np.zeros((3, 3), dtype=bool)
+            region[: 3 - i, : 3 - i] = True
+
+            tree = image.fill(region, foreground=color, image=tree)
+
+        backend = NumpyBackend(width=3, height=3)
+        pixels = np.asarray(backend.eval(tree))
+
+        npt.assert_array_equal(pixels[0, 0], [0, 0, 255, 255])
+        npt.assert_array_equal(pixels[1, 1], [0, 255, 0, 255])
+        npt.assert_array_equal(pixels[2, 2], [255, 0, 0, 255])
+
+    def test_existing_image(self):
+        """Ensure that filling an existing image leaves the original untouched."""
+
+        img = image.fromarray(np.zeros((2, 2, 3), dtype=np.uint8))
+        region = np.array([[True, False], [False, True]])
+        tree = image.fill(region, foreground="#f00", image=img)
+
+        backend = NumpyBackend(width=2, height=2)
+        result = backend.eval(tree)
+
+        assert result.mode == "RGB"
+        npt.assert_array_equal(np.asarray(result)[region], [[255, 0, 0]] * 2)
+        npt.assert_array_equal(np.asarray(img), 0)
+
+
+class TestComposite:
+    """Tests for compositing premultiplied pixels."""
+
+    @py.test.mark.parametrize(
+        "op,expected",
+        [
+            ("clear", [0, 0, 0, 0]),
+            ("source", [0.5, 0, 0, 0.5]),
+            ("destination", [0, 0, 0.5, 0.5]),
+            ("over", [0.5, 0, 0.25, 0.75]),
+            ("destination_over", [0.25, 0, 0.5, 0.75]),
+            ("in", [0.25, 0, 0, 0.25]),
+            ("destination_in", [0, 0, 0.25, 0.25]),
+            ("out", [0.25, 0, 0, 0.25]),
+            ("destination_out", [0, 0, 0.25, 0.25]),
+            ("atop", [0.25, 0, 0.25, 0.5]),
+            ("destination_atop", [0.25, 0, 0.25, 0.5]),
+            ("xor", [0.25, 0, 0.25, 0.5]),
+            ("plus", [0.5, 0, 0.5, 1]),
+        ],
+    )
+    def test_porter_duff(self, op, expected):
+        """Ensure that each of the Porter-Duff operators is implemented correctly."""
+
+        destination = np.array([[0, 0, 0.5, 0.5]], dtype=np.float32)
+        source = np.array([[0.5, 0, 0, 0.5]], dtype=np.float32)
+
+        result = composite(destination, source, op=op)
+
+        assert result is destination
+        npt.assert_allclose(destination, [expected])
+
+    @py.test.mark.parametrize(
+        "mode,expected",
+        [
+            ("normal", [1, 0, 0, 1]),
+            ("multiply", [0.5, 0, 0, 1]),
+            ("screen", [1, 0.5, 0.5, 1]),
+            ("darken", [0.5, 0, 0, 1]),
+            ("lighten", [1, 0.5, 0.5, 1]),
+        ],
+    )
+    def test_blend_modes(self, mode, expected):
+        """Ensure that each of the blend modes mixes the source with the
+        destination."""
+
+        destination = np.array([[0.5, 0.5, 0.5, 1]], dtype=np.float32)
+        source = np.array([[1, 0, 0, 1]], dtype=np.float32)
+
+        composite(destination, source, mode=mode)
+        npt.assert_allclose(destination, [expected])
+
+    def test_blend_mode_transparent_destination(self):
+        """Ensure that blend modes have no effect where there is nothing to blend
+        with."""
+
+        destination = np.zeros((1, 4), dtype=np.float32)
+        source = np.array([[0.5, 0, 0, 0.5]], dtype=np.float32)
+
+        composite(destination, source, mode="multiply")
+        npt.assert_allclose(destination, source)
+
+    def test_unknown_operator(self):
+        """Ensure that unknown operators are rejected."""
+
+        pixels = np.zeros((1, 4), dtype=np.float32)
+
+        with py.test.raises(ValueError) as err:
+            composite(pixels, pixels, op="under")
+
+        assert "Unknown compositing operator 'under'" in str(err.value)
+
+    @given(pixels=arrays(np.uint8, tuples(integers(1, 16), integers(1, 16), just(4))))
+    def test_premultiply_roundtrip(self, pixels):
+        """Ensure that premultiplying pixels and converting back again preserves
+        every pixel's alpha, and the color of opaque pixels."""
+
+        result = unpremultiply(premultiply(pixels))
+        opaque = pixels[..., 3] == 255
+
+        npt.assert_array_equal(result[..., 3], pixels[..., 3])
+        npt.assert_array_equal(result[opaque], pixels[opaque])
+
+
+class TestRefine:
+    """Tests for drawing an image by refining a coarser drawing of it."""
+
+    def scene(self):
+        img = image.new("white")
+
+        for i, color in enumerate(["#f00", "#0f08", "#00f"]):
+            circle = shape.Circle(xc=(i - 1) * 0.5, r2=0.5)
+            img = img.fill(circle, foreground=color)
+
+        return img + image.fill(shape.Circle(r1=0.1, r2=0.2), foreground="#ff08")
+
+    @py.test.mark.parametrize("size", [(160, 120), (200, 75), (75, 200)])
+    def test_matches_draw(self, size):
+        """Ensure that refining a coarse drawing gives the same result as drawing the
+        image in full."""
+
+        tree = self.scene()
+        width, height = size
+
+        coarse = NumpyBackend(width // 4, height // 4).draw(tree)
+        backend = RecordingBackend(width, height)
+
+        expected = NumpyBackend(width, height).draw(tree)
+        npt.assert_array_equal(backend.refine(tree, coarse), expected)
+
+        # Only the pixels close to the edges of the circles should be evaluated.
+        assert all(len(shape) == 1 for _, shape in backend.evaluated)
+        assert all(shape[0] < width * height / 2 for _, shape in backend.evaluated)
+
+    def test_uniform(self):
+        """Ensure that nothing is evaluated when the coarse drawing is a single
+        color."""
+
+        tree = image.fill(shape.Circle(xc=4), foreground="red", background="blue")
+
+        coarse = NumpyBackend(4, 4).draw(tree)
+        backend = RecordingBackend(16, 16)
+
+        pixels = backend.refine(tree, coarse)
+
+        assert backend.evaluated == []
+        assert (pixels == [0, 0, 255, 255]).all()
+
+    def test_colorramp(self):
+        """Ensure that colorramps, which depend on every value at once, are drawn in
+        full."""
+
+        tree = image.colorramp(math.X())
+        coarse = NumpyBackend(4, 4).draw(tree)
+
+        expected = NumpyBackend(16, 16).draw(tree)
+        npt.assert_array_equal(NumpyBackend(16, 16).refine(tree, coarse), expected)
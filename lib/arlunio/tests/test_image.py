@@ -1,13 +1,24 @@
+import base64
+import io
+import struct
 import unittest.mock as mock
+import zlib
 
 import numpy as np
 import PIL.Image as PImage
 import py.test
 from hypothesis import given
 from hypothesis import settings
+from hypothesis.extra.numpy import arrays
+from hypothesis.strategies import integers
+from hypothesis.strategies import sampled_from
+from hypothesis.strategies import tuples
 
+import arlunio.ast as ast
 import arlunio.image as image
+import arlunio.shape as shape
 import arlunio.testing as T
+from arlunio.backends.numpy import NumpyBackend
 
 
 @given(width=T.dimension, height=T.dimension)
@@ -52,6 +63,21 @@ def test_new_image_validation(args, kwargs, message):
     assert message in str(err.value)
 
 
+@py.test.fixture
+def drawn(monkeypatch):
+    """Record the size of each image drawn by the backend."""
+
+    sizes = []
+    draw = NumpyBackend.draw
+
+    def record(backend, tree):
+        sizes.append((backend.width, backend.height))
+        return draw(backend, tree)
+
+    monkeypatch.setattr(NumpyBackend, "draw", record)
+    return sizes
+
+
 class TestImage:
     """Tests for our image class"""
 
@@ -114,6 +140,177 @@ class TestImage:
         assert c == d
 
 
+class TestArrayImage:
+    """Tests for the array holding an image's pixels."""
+
+    def setup_method(self):
+        rng = np.random.default_rng(0)
+
+        self.pixels = rng.integers(0, 256, size=(40, 30, 4), dtype=np.uint8)
+        self.source = rng.integers(0, 256, size=(20, 15, 4), dtype=np.uint8)
+        self.mask = rng.integers(0, 256, size=(20, 15), dtype=np.uint8)
+
+    @py.test.mark.parametrize(
+        "kwargs",
+        [{}, {"dest": (20, 30)}, {"dest": (2, 3), "source": (4, 5, 10, 18)}],
+    )
+    def test_alpha_composite(self, monkeypatch, kwargs):
+        """Ensure that compositing onto an array, a few rows at a time, gives the same
+        result as pillow."""
+
+        monkeypatch.setattr(image, "_BAND_SIZE", 4 * 30 * 3)
+
+        expected = PImage.fromarray(self.pixels)
+        expected.alpha_composite(PImage.fromarray(self.source), **kwargs)
+
+        pixels = self.pixels.copy()
+        image.Image(pixels).alpha_composite(image.fromarray(self.source), **kwargs)
+
+        assert (pixels == np.asarray(expected)).all()
+
+    @py.test.mark.parametrize(
+        "args",
+        [("source", (5, 7)), ("source", (-4, 30), "mask"), ("red", (1, 2), "mask")],
+    )
+    def test_paste(self, monkeypatch, args):
+        """Ensure that pasting onto an array, a few rows at a time, gives the same
+        result as pillow."""
+
+        monkeypatch.setattr(image, "_BAND_SIZE", 4 * 30 * 3)
+
+        im, box, *mask = args
+        im = PImage.fromarray(self.source) if im == "source" else im
+        mask = PImage.fromarray(self.mask) if mask else None
+
+        expected = PImage.fromarray(self.pixels)
+        expected.paste(im, box, mask)
+
+        pixels = self.pixels.copy()
+        image.Image(pixels).paste(im, box, mask)
+
+        assert (pixels == np.asarray(expected)).all()
+
+    def test_array_interface(self):
+        """Ensure that the array backing an image is shared with numpy and pillow,
+        rather than copied."""
+
+        img = image.Image(self.pixels)
+        assert np.shares_memory(np.asarray(img), self.pixels)
+
+        self.pixels[0, 0] = (1, 2, 3, 4)
+        assert img.img.getpixel((0, 0)) == (1, 2, 3, 4)
+        assert img.size == (30, 40)
+
+    @py.test.mark.parametrize(
+        "pixels",
+        [
+            np.zeros((4, 4, 5), dtype=np.uint8),
+            np.zeros((4, 4, 4), dtype=np.float32),
+            np.zeros((4, 4), dtype=np.int64),
+            np.zeros((4, 8, 4), dtype=np.uint8)[:, ::2],
+        ],
+    )
+    def test_invalid_array(self, pixels):
+        """Ensure that we only accept contiguous arrays that pillow understands."""
+
+        with py.test.raises(ValueError):
+            image.Image(pixels)
+
+    @py.test.mark.parametrize("index", [(0, 0, 0), (20, 15, 2), (-1, -1, -1)])
+    def test_eq(self, monkeypatch, index):
+        """Ensure that images are only equal if every pixel matches."""
+
+        monkeypatch.setattr(image, "_BAND_SIZE", 4 * 30 * 3)
+
+        a = image.Image(self.pixels)
+        b = a.copy()
+
+        assert a == b
+        assert a == image.Image(self.pixels)
+
+        b.array[index] ^= 1
+        assert a != b
+
+    def test_eq_mode(self):
+        """Ensure that images with the same bytes but different modes are not equal."""
+
+        pixels = self.pixels.reshape(40, 120)
+
+        assert image.Image(pixels) != image.Image(pixels.view(np.int32))
+        assert image.Image(pixels) != image.Image(pixels[:, :60].copy())
+
+    @py.test.mark.parametrize(
+        "mode,expected", [("1", "L"), ("P", "RGBA"), ("CMYK", "RGB"), ("LA", "LA")]
+    )
+    def test_pillow_modes(self, mode, expected):
+        """Ensure that pillow images are converted to a mode we can hold in an array,
+        if necessary."""
+
+        img = image.Image(PImage.new(mode, (3, 2)))
+
+        assert img.mode == expected
+        assert img.img.mode == expected
+        assert img.size == (3, 2)
+
+    @py.test.mark.parametrize("channels", [3, 4])
+    def test_pillow_view(self, channels):
+        """Ensure that the pillow image always matches the array."""
+
+        img = image.fromarray(self.pixels[..., :channels].copy())
+        assert (np.asarray(img.img) == img.array).all()
+
+        img.array[...] = 0
+        assert (np.asarray(img.img) == 0).all()
+
+    def test_fromarray(self):
+        """Ensure that creating an image from an array doesn't copy it."""
+
+        img = image.fromarray(self.pixels)
+        assert np.shares_memory(img.array, self.pixels)
+
+        img = image.fromarray(self.pixels[..., 0], "L")
+        assert img.mode == "L"
+
+    def test_memmap(self, tmp_path):
+        """Ensure that a memory mapped image writes its pixels to disk."""
+
+        path = tmp_path / "image.rgba"
+
+        img = image.Image.memmap(path, 30, 40, background="#00f")
+        img.alpha_composite(image.fromarray(self.source), (5, 6))
+        img.array.flush()
+
+        expected = PImage.new("RGBA", (30, 40), color="#00f")
+        expected.alpha_composite(PImage.fromarray(self.source), (5, 6))
+
+        pixels = np.fromfile(path, dtype=np.uint8).reshape(40, 30, 4)
+        assert (pixels == np.asarray(expected)).all()
+
+    def test_thumbnail(self, tmp_path):
+        """Ensure that making a thumbnail of a memory mapped image leaves the file
+        alone."""
+
+        img = image.Image.memmap(tmp_path / "image.rgba", 30, 40, background="red")
+        img.thumbnail((15, 20))
+
+        assert not isinstance(img.array, np.memmap)
+        assert img.size == (15, 20)
+        assert (tmp_path / "image.rgba").stat().st_size == 30 * 40 * 4
+
+    def test_view_after_thumbnail(self):
+        """Ensure that arrays taken from an image stay valid once the image is given a
+        new array."""
+
+        img = image.Image(self.pixels.copy())
+        view = np.asarray(img)
+
+        img.thumbnail((15, 20))
+        del img
+
+        assert view.shape == (40, 30, 4)
+        assert (view == self.pixels).all()
+
+
 class TestColorramp:
     """Tests for the image.colorramp function."""
 
@@ -149,6 +346,62 @@ class TestColorramp:
 
         assert (np.asarray(img) == pix).all()
 
+    def test_stops(self):
+        """Ensure that the colorramp can produce gradients with more than 2 colors."""
+
+        values = np.array([[0.0, 0.25], [0.5, 1.0]])
+        img = image.colorramp(values, stops=["#f00", "#0f0", "#00f"], steps=5)
+
+        pix = np.array(
+            [
+                [[255, 0, 0, 255], [127, 127, 0, 255]],
+                [[0, 255, 0, 255], [0, 0, 255, 255]],
+            ],
+            dtype=np.uint8,
+        )
+
+        assert (np.asarray(img) == pix).all()
+
+    def test_stop_positions(self):
+        """Ensure that the colorramp respects the position of each stop."""
+
+        values = np.array([[0.0, 0.2, 1.0]])
+        stops = [(0, "black"), (0.2, "red"), (1, "red")]
+        img = image.colorramp(values, stops=stops, steps=6)
+
+        pix = np.array(
+            [[[0, 0, 0, 255], [255, 0, 0, 255], [255, 0, 0, 255]]], dtype=np.uint8
+        )
+
+        assert (np.asarray(img) == pix).all()
+
+    def test_steps(self):
+        """Ensure that the values are quantised to the number of steps in the
+        gradient."""
+
+        values = np.linspace(0, 1, 64).reshape(8, 8)
+        img = image.colorramp(values, steps=2)
+
+        pix = np.asarray(img)
+        expected = np.where(values[..., None] < 1, 0, 255)
+
+        assert (pix[..., :3] == expected).all()
+
+    def test_constant_values(self):
+        """Ensure that the colorramp can handle an array of identical values."""
+
+        img = image.colorramp(np.full((4, 4), 2.0))
+        assert (np.asarray(img) == [0, 0, 0, 255]).all()
+
+    def test_start_and_stops(self):
+        """Ensure that the colorramp rejects both the start/stop colors and the
+        stops."""
+
+        with py.test.raises(ValueError) as err:
+            image.colorramp(np.ones((2, 2)), start="red", stops=["red", "blue"])
+
+        assert "either the start and stop colors or the stops" in str(err.value)
+
 
 class TestFill:
     """Tests for the image.fill function."""
@@ -216,3 +469,802 @@ class TestFill:
         expected[mask] = (0, 0, 0, 255)
 
         assert (np.asarray(new_image) == expected).all()
+
+
+class TestLazyImage:
+    """Tests for the image.LazyImage class."""
+
+    def test_render_once(self, drawn):
+        """Ensure that an image is only drawn once, when its pixels are needed."""
+
+        mask = np.array([[True, False], [False, True]])
+        img = image.fill(mask, foreground="red")
+
+        assert img.size == (2, 2)
+        assert drawn == []
+
+        assert img.render() is img.render()
+        assert np.asarray(img)[0, 0].tolist() == [255, 0, 0, 255]
+        assert drawn == [(2, 2)]
+
+    def test_thumbnail(self, drawn):
+        """Ensure that images made from shapes are drawn at the size of the
+        thumbnail."""
+
+        img = image.fill(shape.Circle(), foreground="red")
+        img.thumbnail((96, 96))
+        img.thumbnail((960, 960))
+
+        assert np.asarray(img).shape == (54, 96, 4)
+        assert drawn == [(96, 54)]
+
+    def test_progressive(self, drawn):
+        """Ensure that progressive rendering draws the image at increasing sizes, and
+        ends up with the same result as drawing it in one go."""
+
+        img = image.fill(shape.Circle(), foreground="red", background="white")
+        img.thumbnail((320, 320))
+
+        steps = list(img.progressive())
+
+        assert [step.size for step in steps] == [(20, 12), (80, 45), (320, 180)]
+        assert drawn == [(20, 12), (320, 180)]
+
+        assert img.render() is steps[-1]
+        assert steps[-1] == image.Image(NumpyBackend(320, 180).draw(img))
+
+    def test_progressive_details(self):
+        """Ensure that details too small to be seen in the previews are still drawn in
+        the final image."""
+
+        ring = shape.Circle(r1=0.5, r2=0.53)
+        img = image.fill(ring, foreground="red", background="white")
+
+        steps = list(img.progressive(size=(480, 270)))
+        expected = image.Image(NumpyBackend(480, 270).draw(img))
+
+        assert steps[-1] == expected
+        assert steps[-1] == img.render((480, 270))
+
+    def test_progressive_array(self):
+        """Ensure that images made from arrays are drawn in a single step."""
+
+        img = image.fill(np.array([[True, False]]), foreground="red")
+        steps = list(img.progressive(start=4, step=2))
+
+        assert len(steps) == 1
+        assert steps[0] is img.render()
+
+    def test_thumbnail_array(self):
+        """Ensure that images made from arrays are resized, since they can only be
+        drawn at one size."""
+
+        values = np.linspace(0, 1, 64).reshape(8, 8)
+
+        img = image.colorramp(values)
+        img.thumbnail((4, 4))
+
+        expected = image.colorramp(values).img
+        expected.thumbnail((4, 4))
+
+        assert img.size == (4, 4)
+        assert (np.asarray(img) == np.asarray(expected)).all()
+
+    def test_composite(self):
+        """Ensure that lazy images can be composited together."""
+
+        values = np.linspace(0, 1, 12).reshape(3, 4)
+        mask = values > 0.5
+
+        ramp = image.colorramp(values)
+        circle = image.fill(mask, foreground="#f008")
+
+        canvas = image.Canvas.fromimage(ramp.render())
+        canvas.composite(image.Canvas.fromimage(circle.render()))
+
+        assert (np.asarray(ramp + circle) == np.asarray(canvas.toimage())).all()
+
+        img = ramp.render() + circle
+        assert isinstance(img, image.Image)
+
+    def test_save(self, tmp_path):
+        """Ensure that lazy images are drawn when they're saved."""
+
+        img = image.fill(np.array([[True, False]]), foreground="blue")
+
+        image.save(img, tmp_path / "a.png")
+        img.save(tmp_path / "b.png")
+
+        for name in ["a.png", "b.png"]:
+            with PImage.open(tmp_path / name) as saved:
+                assert (np.asarray(saved) == np.asarray(img)).all()
+
+
+class TestThumbnails:
+    """Tests for the image.thumbnails function."""
+
+    def test_draws_once(self, drawn):
+        """Ensure that images made from shapes are drawn once, at the size of the
+        largest thumbnail."""
+
+        img = image.fill(shape.Circle(), foreground="red", background="white")
+        thumbs = image.thumbnails(img, [(64, 64), (256, 256), (16, 16)], supersample=3)
+
+        assert [thumb.size for thumb in thumbs] == [(64, 36), (256, 144), (16, 9)]
+        assert drawn == [(768, 432)]
+
+    def test_no_sizes(self, drawn):
+        """Ensure that asking for no thumbnails returns nothing, without drawing the
+        image."""
+
+        img = image.fill(shape.Circle(), foreground="red")
+
+        assert image.thumbnails(img, []) == []
+        assert image.thumbnails(img.render((8, 4)), []) == []
+        assert drawn == [(8, 4)]
+
+    @py.test.mark.parametrize("size", [(256, 256), (64, 64), (16, 16)])
+    def test_quality(self, size):
+        """Ensure that each thumbnail is close to drawing the image at that size."""
+
+        img = image.fill(shape.Circle(r1=0.3, r2=0.6), foreground="red")
+        (thumb,) = image.thumbnails(img, [size], supersample=2)
+
+        assert image.thumbnail(img, size, supersample=2) == thumb
+
+        width, height = thumb.size
+        pixels = NumpyBackend(width * 2, height * 2).draw(img)
+        expected = PImage.fromarray(pixels).reduce(2)
+
+        assert np.abs(np.asarray(thumb, dtype=int) - np.asarray(expected)).mean() < 2
+
+    def test_image(self):
+        """Ensure that existing images are shrunk to fit, but never enlarged."""
+
+        img = image.fromarray(np.zeros((30, 50, 4), dtype=np.uint8))
+        thumbs = image.thumbnails(img, [(100, 100), (20, 20), (3, 3)])
+
+        assert [thumb.size for thumb in thumbs] == [(50, 30), (20, 12), (3, 2)]
+
+    def test_pillow_sizes(self):
+        """Ensure that thumbnails are the same size as pillow would make them."""
+
+        for size in [(200, 200), (2000, 100), (100, 2000), (7, 3)]:
+            expected = PImage.new("RGBA", (1920, 1080))
+            expected.thumbnail(size)
+
+            img = image.fromarray(np.zeros((1080, 1920, 4), dtype=np.uint8))
+            assert image.thumbnail(img, size).size == expected.size
+
+
+class TestLayers:
+    """Tests for the image.Layers class."""
+
+    @settings(max_examples=20, deadline=None)
+    @given(masks=arrays(np.bool_, tuples(integers(1, 8), integers(1, 16), T.dimension)))
+    def test_matches_fill(self, masks):
+        """Ensure that flattening opaque layers gives the same result as filling each
+        mask in turn."""
+
+        colors = ["#f00", "#0f0", "#00f", "#ff0"]
+
+        layers = image.Layers(background="white")
+        tree = image.new(color="white")
+
+        for i, m in enumerate(masks):
+            layers.add(m, color=colors[i % 4])
+            tree = image.fill(m, foreground=colors[i % 4], image=tree)
+
+        _, height, width = masks.shape
+        expected = NumpyBackend(width=width, height=height).eval(tree)
+
+        assert (np.asarray(layers.flatten()) == np.asarray(expected)).all()
+
+    def test_translucent(self):
+        """Ensure that translucent layers are composited over the layers beneath
+        them."""
+
+        region = np.array([[True, False]])
+
+        layers = image.Layers(background="#00f")
+        layers.add(region, color="#ff000080")
+
+        pix = np.array([[[128, 0, 127, 255], [0, 0, 255, 255]]], dtype=np.uint8)
+        assert (np.asarray(layers.flatten()) == pix).all()
+
+    def test_transparent_background(self):
+        """Ensure that layers over a transparent background keep their color."""
+
+        region = np.array([[0.5, 1.0]])
+
+        layers = image.Layers()
+        layers.add(region, color="#f00")
+
+        pix = np.array([[[255, 0, 0, 128], [255, 0, 0, 255]]], dtype=np.uint8)
+        assert (np.asarray(layers.flatten()) == pix).all()
+
+    @py.test.mark.parametrize(
+        "mode,expected",
+        [
+            ("normal", (255, 0, 0)),
+            ("multiply", (128, 0, 0)),
+            ("screen", (255, 128, 128)),
+            ("darken", (128, 0, 0)),
+            ("lighten", (255, 128, 128)),
+        ],
+    )
+    def test_blend_modes(self, mode, expected):
+        """Ensure that each of the blend modes mixes the color with the layers
+        beneath it."""
+
+        region = np.array([[True]])
+
+        layers = image.Layers(background="#808080")
+        layers.add(region, color="#f00", mode=mode)
+
+        assert tuple(np.asarray(layers.flatten())[0, 0, :3]) == expected
+
+    def test_unknown_blend_mode(self):
+        """Ensure that an unknown blend mode is rejected."""
+
+        with py.test.raises(ValueError) as err:
+            image.Layers().add(np.array([[True]]), mode="overlay")
+
+        assert "Unknown blend mode 'overlay'" in str(err.value)
+
+    def test_missing_dimensions(self):
+        """Ensure that the image size must be given when it cannot be taken from any
+        of the layers."""
+
+        layers = image.Layers()
+        layers.add(shape.Circle(r2=0.5))
+
+        with py.test.raises(ValueError) as err:
+            layers.flatten()
+
+        assert "width and height" in str(err.value)
+
+        pix = np.asarray(layers.flatten(width=8, height=4))
+        inside = np.zeros((4, 8), dtype=bool)
+        inside[1:3, 3:5] = True
+
+        assert (pix[inside] == [0, 0, 0, 255]).all()
+        assert (pix[~inside] == [0, 0, 0, 0]).all()
+
+    def test_shapes(self):
+        """Ensure that layers made from shapes are drawn at the given size, as in the
+        example in the docs."""
+
+        layers = image.Layers(background="white")
+
+        for i, color in enumerate(["#f00", "#0f0", "#00f"]):
+            circle = shape.Circle(xc=(i - 1) * 0.5, r2=0.6)
+            layers.add(circle, color=color, mode="multiply")
+
+        img = layers.flatten(width=512, height=256)
+
+        assert img.size == (512, 256)
+        assert np.asarray(img)[128, 256].tolist() == [0, 0, 0, 255]
+        assert np.asarray(img)[0, 0].tolist() == [255, 255, 255, 255]
+
+    def test_array_size(self):
+        """Ensure that the size is taken from layers that depend on an array."""
+
+        values = np.zeros((3, 5), dtype=bool)
+        region = ast.Node.builtin(name="array", value=values)
+
+        layers = image.Layers().add(shape.Circle(r2=0.5)).add(region)
+        assert layers.flatten().size == (5, 3)
+
+
+class TestCanvas:
+    """Tests for the image.Canvas class."""
+
+    @given(pixels=arrays(np.uint8, (2, 8, 8, 4)))
+    def test_matches_alpha_composite(self, pixels):
+        """Ensure that compositing canvases gives the same result as pillow's
+        alpha_composite, up to rounding.
+
+        The color of fully transparent pixels is not preserved.
+        """
+
+        a, b = image.fromarray(pixels[0]), image.fromarray(pixels[1])
+        expected = np.asarray(PImage.alpha_composite(a.img, b.img))
+
+        canvas = image.Canvas.fromimage(a).composite(image.Canvas.fromimage(b))
+        result = np.asarray(canvas.toimage()).astype(int)
+
+        visible = expected[..., 3] > 0
+
+        assert (np.abs(result - expected)[visible] <= 1).all()
+        assert (result[~visible] == 0).all()
+
+    def test_composite(self):
+        """Ensure that compositing happens in place, at the given position."""
+
+        canvas = image.Canvas.new(4, 2, background="#00f")
+        red = image.Canvas.new(2, 2, background="#f00")
+
+        result = canvas.composite(red, dest=(1, 0))
+        assert result is canvas
+
+        pix = np.asarray(canvas.toimage())
+
+        assert (pix[:, 1:3] == [255, 0, 0, 255]).all()
+        assert (pix[:, 0] == [0, 0, 255, 255]).all()
+        assert (pix[:, 3] == [0, 0, 255, 255]).all()
+
+    def test_composite_outside(self):
+        """Ensure that a source placed off the edge of the canvas is clipped."""
+
+        canvas = image.Canvas.new(2, 2, background="#00f")
+        red = image.Canvas.new(2, 2, background="#f00")
+
+        canvas.composite(red, dest=(1, -1))
+        pix = np.asarray(canvas.toimage())
+
+        assert (pix[0, 1] == [255, 0, 0, 255]).all()
+        assert (pix[1] == [0, 0, 255, 255]).all()
+        assert (pix[0, 0] == [0, 0, 255, 255]).all()
+
+        canvas.composite(red, dest=(2, 0))
+        assert (np.asarray(canvas.toimage()) == pix).all()
+
+    def test_composite_box(self):
+        """Ensure that compositing can be restricted to part of the canvas."""
+
+        canvas = image.Canvas.new(4, 4)
+        red = image.Canvas.new(4, 4, background="#f00")
+
+        canvas.composite(red, op="source", box=(1, 2, 3, 4))
+        pix = np.asarray(canvas.toimage())
+
+        inside = np.zeros((4, 4), dtype=bool)
+        inside[2:4, 1:3] = True
+
+        assert (pix[inside] == [255, 0, 0, 255]).all()
+        assert (pix[~inside] == [0, 0, 0, 0]).all()
+
+    def test_add(self):
+        """Ensure that adding canvases together returns a new canvas."""
+
+        a = image.Canvas.new(2, 2, background="#00f")
+        b = image.Canvas.new(2, 2, background="#f00")
+
+        c = a + b
+        assert c is not a
+
+        assert (np.asarray(a.toimage()) == [0, 0, 255, 255]).all()
+        assert (np.asarray(c.toimage()) == [255, 0, 0, 255]).all()
+
+        a += b
+        assert (np.asarray(a.toimage()) == [255, 0, 0, 255]).all()
+
+    def test_bbox(self):
+        """Ensure that a fully transparent canvas has no bounding box."""
+
+        assert image.Canvas.new(4, 4).bbox() is None
+        assert image.Canvas.new(4, 4, background="red").bbox() == (0, 0, 4, 4)
+
+
+class TestPNG:
+    """Tests for the PNG encoder used by image.save and image.encode"""
+
+    @py.test.mark.parametrize("filter", ["none", "sub", "up", "paeth"])
+    @py.test.mark.parametrize(
+        "mode,channels", [("L", ()), ("LA", (2,)), ("RGB", (3,)), ("RGBA", (4,))]
+    )
+    def test_roundtrip(self, monkeypatch, filter, mode, channels):
+        """Ensure that images split across many bands can be read back exactly."""
+
+        monkeypatch.setattr(image, "_PNG_BAND_SIZE", 1024)
+
+        pixels = np.random.default_rng(0).integers(0, 256, size=(37, 53, *channels))
+        pixels = pixels.astype(np.uint8)
+
+        img = image.fromarray(pixels, mode=mode)
+        data = image.encode(img, filter=filter, workers=4)
+
+        result = np.asarray(image.decode(data))
+        assert (result == pixels).all()
+
+    @py.test.mark.parametrize(
+        "strategy", ["default", "filtered", "huffman", "rle", "fixed"]
+    )
+    @py.test.mark.parametrize("compression", [-1, 0, 1, 6, 9])
+    def test_zlib_stream(self, monkeypatch, strategy, compression):
+        """Ensure that the compressed data forms a single valid zlib stream."""
+
+        monkeypatch.setattr(image, "_PNG_BAND_SIZE", 1024)
+
+        pixels = np.random.default_rng(1).integers(0, 256, size=(29, 17, 4))
+        img = image.fromarray(pixels.astype(np.uint8))
+
+        options = dict(compression=compression, strategy=strategy)
+        data = b"".join(image._stream(img, **options))
+        pos, stream = len(image._PNG_SIGNATURE), b""
+
+        while pos < len(data):
+            length, tag = struct.unpack(">I4s", data[pos : pos + 8])
+
+            if tag == b"IDAT":
+                stream += data[pos + 8 : pos + 8 + length]
+
+            pos += length + 12
+
+        # Each row is prefixed with the filter type
+        assert len(zlib.decompress(stream)) == 29 * (17 * 4 + 1)
+
+    def test_save(self, tmp_path):
+        """Ensure that the saved file is the same as the encoded image."""
+
+        pixels = np.random.default_rng(2).integers(0, 256, size=(8, 8, 4))
+        img = image.fromarray(pixels.astype(np.uint8))
+
+        path = tmp_path / "image.png"
+        image.save(img, path, compression=9)
+
+        assert base64.b64encode(path.read_bytes()) == image.encode(img, compression=9)
+        assert (np.asarray(image.load(path)) == pixels).all()
+
+    @py.test.mark.parametrize("extension,format", [("jpg", "JPEG"), ("bmp", "BMP")])
+    def test_save_pillow(self, tmp_path, extension, format):
+        """Ensure that other formats are still saved by pillow, based on the
+        extension."""
+
+        img = image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8))
+
+        path = tmp_path / f"image.{extension}"
+        image.save(img, path)
+
+        assert PImage.open(path).format == format
+
+    def test_iterencode(self, monkeypatch):
+        """Ensure that encoding the image in pieces gives the same result."""
+
+        monkeypatch.setattr(image, "_PNG_BAND_SIZE", 1024)
+
+        pixels = np.random.default_rng(3).integers(0, 256, size=(64, 64, 4))
+        img = image.fromarray(pixels.astype(np.uint8))
+
+        chunks = list(image.iterencode(img))
+
+        assert len(chunks) > 1
+        assert all(len(c) % 4 == 0 for c in chunks)
+        assert b"".join(chunks) == image.encode(img)
+
+    @py.test.mark.parametrize(
+        "kwargs,message",
+        [
+            ({"filter": "average"}, "Unknown PNG filter 'average'"),
+            ({"strategy": "fastest"}, "Unknown compression strategy 'fastest'"),
+        ],
+    )
+    def test_validation(self, kwargs, message):
+        """Ensure that unknown options are rejected."""
+
+        img = image.fromarray(np.zeros((2, 2, 4), dtype=np.uint8))
+
+        with py.test.raises(ValueError) as err:
+            image.encode(img, **kwargs)
+
+        assert message in str(err.value)
+
+
+class TestQOI:
+    """Tests for encoding and decoding QOI files."""
+
+    @staticmethod
+    def encode(pixels, rows):
+        height, width, channels = pixels.shape
+        mode = "RGB" if channels == 3 else "RGBA"
+
+        encoder = image._QOIEncoder(width, height, mode)
+        data = [encoder.header()]
+
+        for y in range(0, height, rows):
+            data += encoder.encode(pixels[y : y + rows].reshape(-1, width * channels))
+
+        return b"".join(data + encoder.finish())
+
+    @given(
+        pixels=arrays(
+            np.uint8,
+            tuples(integers(1, 16), integers(1, 16), sampled_from([3, 4])),
+            elements=sampled_from([0, 1, 2, 40, 255]),
+        ),
+        rows=integers(1, 4),
+    )
+    @settings(deadline=None)
+    def test_bands(self, pixels, rows):
+        """Ensure that encoding an image in bands gives the same result as encoding it
+        all at once, and that it can be decoded."""
+
+        data = self.encode(pixels, len(pixels))
+
+        assert self.encode(pixels, rows) == data
+        assert (image._qoi_decode(data) == pixels).all()
+
+    @py.test.mark.parametrize("channels", [3, 4])
+    def test_pillow(self, channels):
+        """Ensure that the files we write are decoded the same way by pillow, and that
+        we decode files the same way as pillow."""
+
+        py.test.importorskip("PIL.QoiImagePlugin")
+
+        rng = np.random.default_rng(4)
+        palette = rng.integers(0, 256, size=(6, channels), dtype=np.uint8)
+
+        pixels = palette[rng.integers(0, 6, size=(40, 50))]
+        pixels[10:20] = rng.integers(0, 256, size=(10, 50, channels), dtype=np.uint8)
+        pixels[20:30] += rng.integers(0, 3, size=(10, 50, channels), dtype=np.uint8)
+        pixels[30:] = pixels[30, 0]
+
+        data = self.encode(pixels, 7)
+
+        assert (np.asarray(PImage.open(io.BytesIO(data))) == pixels).all()
+        assert (image._qoi_decode(data) == pixels).all()
+
+    @given(
+        pixels=arrays(
+            np.uint8,
+            tuples(integers(1, 12), integers(1, 12), sampled_from([3, 4])),
+            elements=sampled_from([0, 1, 2, 40, 255]),
+        )
+    )
+    @settings(deadline=None, max_examples=50)
+    def test_pillow_files(self, tmp_path_factory, pixels):
+        """Ensure that pillow decodes the files we write, and that we decode the files
+        pillow writes, checking one decoder against the other."""
+
+        py.test.importorskip("PIL.QoiImagePlugin")
+
+        if "QOI" not in PImage.SAVE:
+            py.test.skip("Pillow can't write QOI files")
+
+        path = tmp_path_factory.mktemp("qoi")
+        mode = "RGB" if pixels.shape[2] == 3 else "RGBA"
+
+        image.save(image.fromarray(pixels, mode=mode), path / "arlunio.qoi")
+        assert (np.asarray(PImage.open(path / "arlunio.qoi")) == pixels).all()
+
+        PImage.fromarray(pixels, mode=mode).save(path / "pillow.qoi")
+        assert (np.asarray(image.load(path / "pillow.qoi")) == pixels).all()
+
+    def test_table(self):
+        """Ensure that looking up a pixel that isn't in the table gives transparent
+        black, and that the alpha value is kept when only the color is given."""
+
+        header = b"qoif" + struct.pack(">IIBB", 4, 1, 4, 0)
+        data = header + bytes([5, 0xFE, 1, 2, 3, 0xC1]) + image._QOI_END
+
+        expected = [[0, 0, 0, 0], [1, 2, 3, 0], [1, 2, 3, 0], [1, 2, 3, 0]]
+        assert image._qoi_decode(data).tolist() == [expected]
+
+    def test_truncated(self):
+        """Ensure that files without enough pixels are rejected."""
+
+        header = b"qoif" + struct.pack(">IIBB", 4, 4, 4, 0)
+
+        with py.test.raises(ValueError) as err:
+            image._qoi_decode(header + bytes([0xC2]) + image._QOI_END)
+
+        assert "truncated" in str(err.value)
+
+
+class TestFormats:
+    """Tests for saving and loading images in each format."""
+
+    @py.test.mark.parametrize("mode,channels", [("RGB", 3), ("RGBA", 4)])
+    @py.test.mark.parametrize(
+        "extension", ["png", "qoi", "webp", "npy", "tif", "ppm", "rgba", "raw"]
+    )
+    def test_save_load(self, tmp_path, extension, mode, channels):
+        """Ensure that images can be saved in each format and loaded back again."""
+
+        pixels = np.random.default_rng(5).integers(0, 256, size=(13, 21, channels))
+        img = image.fromarray(pixels.astype(np.uint8))
+
+        if extension == "ppm":
+            img = image.fromarray(np.asarray(img.img.convert("RGB")))
+
+        path = tmp_path / f"image.{extension}"
+        image.save(img, path)
+
+        if extension == "rgba":
+            img = image.fromarray(np.asarray(img.img.convert("RGBA")))
+
+        result = image.load(path, size=(21, 13), raw_mode=mode)
+        assert result == img
+
+    def test_rgba(self, tmp_path):
+        """Ensure that images are converted to RGBA when saved in the rgba format."""
+
+        img = image.fromarray(np.full((2, 3, 3), 255, dtype=np.uint8))
+        path = tmp_path / "image.rgba"
+
+        image.save(img, path)
+
+        assert path.read_bytes() == b"\xff" * 24
+        assert image.load(path, size=(3, 2)).mode == "RGBA"
+
+    @py.test.mark.parametrize("format", ["qoi", "npy"])
+    def test_format(self, tmp_path, format):
+        """Ensure that the format can be given explicitly, and is recognised when
+        loading from a file object."""
+
+        pixels = np.random.default_rng(6).integers(0, 256, size=(5, 7, 4))
+        img = image.fromarray(pixels.astype(np.uint8))
+
+        path = tmp_path / "image.bin"
+        image.save(img, path, format=format)
+
+        with open(path, "rb") as f:
+            assert image.load(f) == img
+
+    def test_npy(self, tmp_path):
+        """Ensure that npy files are mapped into memory, without changes being written
+        back to the file."""
+
+        img = image.fromarray(np.zeros((4, 4, 4), dtype=np.uint8))
+        path = tmp_path / "image.npy"
+
+        image.save(img, path)
+        result = image.load(path)
+
+        assert isinstance(result.array, np.memmap)
+
+        result.paste("red", (0, 0, 4, 4))
+        assert (np.load(path) == 0).all()
+
+    @py.test.mark.parametrize(
+        "args,kwargs,message",
+        [
+            (["image.png"], {"format": "jpeg"}, "Unknown image format 'jpeg'"),
+            (["image.png"], {"lossless": True}, "unexpected keyword"),
+            (["image.qoi"], {"compression": 9}, "unexpected keyword"),
+        ],
+    )
+    def test_validation(self, tmp_path, args, kwargs, message):
+        """Ensure that unknown formats and options are rejected."""
+
+        img = image.fromarray(np.zeros((2, 2, 4), dtype=np.uint8))
+
+        with py.test.raises((TypeError, ValueError)) as err:
+            image.save(img, tmp_path / args[0], **kwargs)
+
+        assert message in str(err.value)
+
+    def test_size_required(self, tmp_path):
+        """Ensure that the size must be given to load a file without a header."""
+
+        path = tmp_path / "image.raw"
+        path.write_bytes(bytes(16))
+
+        with py.test.raises(ValueError) as err:
+            image.load(path)
+
+        assert "The size of the image in 'image.raw' is required" in str(err.value)
+
+    def test_pillow_arguments(self, tmp_path):
+        """Ensure that any other arguments are passed onto pillow."""
+
+        path = tmp_path / "image.png"
+        image.save(image.fromarray(np.zeros((2, 4, 4), dtype=np.uint8)), path)
+
+        with mock.patch("PIL.Image.open", wraps=PImage.open) as m_open:
+            assert image.load(path, mode="r").size == (4, 2)
+
+        m_open.assert_called_once_with(path, mode="r")
+
+
+class TestWriter:
+    """Tests for the image.Writer class."""
+
+    @py.test.mark.parametrize(
+        "extension,mode,channels",
+        [
+            *[(ext, "L", ()) for ext in ["png", "ppm", "tiff", "raw", "npy"]],
+            *[(ext, "LA", (2,)) for ext in ["png", "tiff", "raw", "npy"]],
+            *[(ext, "RGB", (3,)) for ext in ["png", "ppm", "tiff", "raw", "npy"]],
+            *[(ext, "RGB", (3,)) for ext in ["qoi", "webp"]],
+            *[(ext, "RGBA", (4,)) for ext in ["png", "tiff", "raw", "npy", "rgba"]],
+            *[(ext, "RGBA", (4,)) for ext in ["qoi", "webp"]],
+        ],
+    )
+    def test_write_bands(self, tmp_path, extension, mode, channels):
+        """Ensure that an image written in bands can be read back exactly."""
+
+        pixels = np.random.default_rng(0).integers(0, 256, size=(301, 77, *channels))
+        pixels = pixels.astype(np.uint8)
+
+        path = tmp_path / f"image.{extension}"
+
+        with image.Writer(path, 77, 301, mode=mode) as writer:
+            for y in range(0, 301, 40):
+                writer.write(pixels[y : y + 40])
+
+        if extension in {"raw", "rgba"}:
+            result = np.fromfile(path, dtype=np.uint8).reshape(pixels.shape)
+        else:
+            result = np.asarray(image.load(path))
+
+        assert (result == pixels).all()
+
+    def test_bigtiff(self, tmp_path, monkeypatch):
+        """Ensure that large images are written as BigTIFF files."""
+
+        monkeypatch.setattr(image, "_TIFF_MAX_SIZE", 1024)
+
+        pixels = np.random.default_rng(1).integers(0, 256, size=(64, 64, 4))
+        pixels = pixels.astype(np.uint8)
+
+        path = tmp_path / "image.tiff"
+
+        with image.Writer(path, 64, 64) as writer:
+            writer.write(pixels)
+
+        assert path.read_bytes()[:4] == b"II+\0"
+        assert (np.asarray(image.load(path)) == pixels).all()
+
+    def test_write_images(self, tmp_path):
+        """Ensure that bands can be given as images, converting them if necessary."""
+
+        path = tmp_path / "image.png"
+
+        with image.Writer(path, 4, 4, mode="RGB") as writer:
+            writer.write(image.fromarray(np.full((2, 4, 4), 255, dtype=np.uint8)))
+            writer.write(image.fromarray(np.zeros((2, 4), dtype=np.uint8)))
+
+        result = np.asarray(image.load(path))
+
+        assert (result[:2] == 255).all()
+        assert (result[2:] == 0).all()
+
+    def test_too_many_rows(self, tmp_path):
+        """Ensure that rows past the bottom of the image are rejected."""
+
+        with image.Writer(tmp_path / "image.png", 4, 4, mode="L") as writer:
+            writer.write(np.zeros((3, 4), dtype=np.uint8))
+
+            with py.test.raises(ValueError) as err:
+                writer.write(np.zeros((2, 4), dtype=np.uint8))
+
+            assert "Too many rows" in str(err.value)
+            writer.write(np.zeros((1, 4), dtype=np.uint8))
+
+    def test_missing_rows(self, tmp_path):
+        """Ensure that the writer complains if the image was not completed."""
+
+        writer = image.Writer(tmp_path / "image.png", 4, 4, mode="L")
+        writer.write(np.zeros((3, 4), dtype=np.uint8))
+
+        with py.test.raises(ValueError) as err:
+            writer.close()
+
+        assert "Only 3 of the 4 rows were written" in str(err.value)
+
+    def test_wrong_shape(self, tmp_path):
+        """Ensure that bands with the wrong shape are rejected."""
+
+        with py.test.raises(ValueError) as err:
+            with image.Writer(tmp_path / "image.png", 4, 4) as writer:
+                writer.write(np.zeros((1, 4, 3), dtype=np.uint8))
+
+        assert "shape (rows, 4, 4)" in str(err.value)
+
+    @py.test.mark.parametrize(
+        "filename,kwargs,message",
+        [
+            ("image.jpg", {}, "Unable to write images to 'image.jpg'"),
+            ("image.ppm", {"mode": "RGBA"}, "do not support the 'RGBA' mode"),
+            ("image.png", {"mode": "CMYK"}, "Unsupported mode 'CMYK'"),
+        ],
+    )
+    def test_validation(self, tmp_path, filename, kwargs, message):
+        """Ensure that unsupported formats and modes are rejected."""
+
+        with py.test.raises(ValueError) as err:
+            image.Writer(tmp_path / filename, 4, 4, **kwargs)
+
+        assert message in str(err.value)
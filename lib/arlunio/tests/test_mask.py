@@ -1,12 +1,17 @@
+import unittest.mock as mock
+
 import numpy as np
 import numpy.random as npr
+import numpy.testing as npt
 import py.test
 from hypothesis import assume
 from hypothesis import given
 from hypothesis.strategies import integers
 
 import arlunio as ar
+import arlunio.ast as ast
 import arlunio.mask as mask
+import arlunio.math as math
 import arlunio.testing as T
 
 
@@ -389,3 +394,282 @@ class TestPixelize:
 
         assert isinstance(result, mask.Mask), "Expected mask instance."
         assert result.shape == (width, width)
+
+
+class TestReduce:
+    """Tests for the :code:`any_` and :code:`all_` functions."""
+
+    @given(width=T.dimension, height=T.dimension, seed=integers(min_value=1))
+    def test_any_matches_logical_or(self, width, height, seed):
+        """Ensure that accumulating in place gives the same result as combining the
+        conditions pairwise."""
+
+        conds = [
+            MaskGenerator(seed=seed + i)(width=width, height=height) for i in range(4)
+        ]
+        expected = np.logical_or.reduce(conds)
+
+        assert (mask.any_(*conds) == expected).all()
+
+    @given(width=T.dimension, height=T.dimension, seed=integers(min_value=1))
+    def test_all_matches_logical_and(self, width, height, seed):
+        """Ensure that accumulating in place gives the same result as combining the
+        conditions pairwise."""
+
+        conds = [
+            MaskGenerator(seed=seed + i)(width=width, height=height) for i in range(4)
+        ]
+        expected = np.logical_and.reduce(conds)
+
+        assert (mask.all_(*conds) == expected).all()
+
+    @py.test.mark.parametrize("func", [mask.any_, mask.all_])
+    def test_out(self, func):
+        """Ensure that the result is written into the given buffer."""
+
+        a = np.array([[True, False], [True, True]])
+        b = np.array([False, True])
+        out = np.empty((2, 2), dtype=bool)
+
+        result = func(a, b, True, out=out)
+
+        assert isinstance(result, mask.Mask)
+        assert np.shares_memory(result, out)
+        assert (result == func(a, b, True)).all()
+
+    @py.test.mark.parametrize("func", [mask.any_, mask.all_])
+    def test_out_first_condition(self, func):
+        """Ensure that the first condition can be reused as the output buffer."""
+
+        a = np.array([True, False, True, False])
+        b = np.array([True, True, False, False])
+        expected = func(a.copy(), b)
+
+        result = func(a, b, out=a)
+
+        assert (result == expected).all()
+        assert (a == expected).all()
+
+    @py.test.mark.parametrize("func", [mask.any_, mask.all_])
+    def test_no_conditions(self, func):
+        """Ensure that we require at least one condition"""
+
+        with py.test.raises(TypeError):
+            func()
+
+
+class TestInplace:
+    """Tests for the in-place mask operators."""
+
+    def test_imul(self):
+        """Ensure that multiplying in place updates the existing mask"""
+
+        m = mask.Mask(np.array([True, False, True]))
+        original = m
+
+        m *= np.array([True, True, False])
+
+        assert m is original
+        assert (m == np.array([True, False, False])).all()
+
+    def test_isub(self):
+        """Ensure that subtracting in place updates the existing mask"""
+
+        m = mask.Mask(np.array([True, False, True]))
+        original = m
+
+        m -= np.array([True, True, False])
+
+        assert m is original
+        assert (m == np.array([False, False, True])).all()
+
+
+class TestAccumulator:
+    """Tests for the :code:`Accumulator` class."""
+
+    @given(width=T.dimension, height=T.dimension, seed=integers(min_value=1))
+    def test_union_intersect_subtract(self, width, height, seed):
+        """Ensure that an accumulated mask matches the result of the equivalent mask
+        operations."""
+
+        a, b, c, d = [
+            MaskGenerator(seed=seed + i)(width=width, height=height) for i in range(4)
+        ]
+
+        acc = mask.Accumulator(height, width)
+        result = acc.union(a, b).intersect(c).subtract(d).mask
+
+        assert isinstance(result, mask.Mask)
+        assert result.shape == (height, width)
+        assert (result == (((a + b) * c) - d)).all()
+
+    def test_reuses_buffer(self):
+        """Ensure that the same buffer is used throughout."""
+
+        acc = mask.Accumulator((2, 2), fill=True)
+        buffer = acc.mask
+
+        acc.intersect(np.array([True, False])).union(False).subtract(True)
+
+        assert acc.mask is buffer
+        assert not acc.mask.any()
+
+
+class TestLazy:
+    """Tests for the :code:`lazy_any` and :code:`lazy_all` functions."""
+
+    @py.test.mark.parametrize(
+        "lazy, eager", [(mask.lazy_any, mask.any_), (mask.lazy_all, mask.all_)]
+    )
+    @given(width=T.dimension, height=T.dimension, seed=integers(min_value=1))
+    def test_matches_eager(self, lazy, eager, width, height, seed):
+        """Ensure that evaluating lazily gives the same result as evaluating all the
+        conditions up front."""
+
+        gen = npr.default_rng(seed=seed)
+        x = gen.random(size=(height, width))
+        y = gen.random(size=(height, 1))
+
+        conds = [
+            lambda x, y: x < 0.5,
+            lambda x, y: y > 0.25,
+            lambda x, y: x + y < 0.75,
+        ]
+
+        expected = eager(*[c(x, y) for c in conds])
+        result = lazy(*conds, x=x, y=y)
+
+        assert isinstance(result, mask.Mask)
+        assert result.shape == (height, width)
+        assert (result == expected).all()
+
+    def test_all_skips_decided(self):
+        """Ensure that later conditions are only evaluated where the result is
+        undecided."""
+
+        x = np.arange(10)
+        second = mock.MagicMock(side_effect=lambda x: x % 2 == 0)
+        third = mock.MagicMock(side_effect=lambda x: x > 100)
+
+        result = mask.lazy_all(x < 4, second, third, x=x)
+
+        assert not result.any()
+        assert (second.call_args.kwargs["x"] == np.arange(4)).all()
+        third.assert_called_once()
+        assert (third.call_args.kwargs["x"] == np.array([0, 2])).all()
+
+    def test_any_stops_early(self):
+        """Ensure that no more conditions are evaluated once the result is
+        decided."""
+
+        x = np.arange(10)
+        second = mock.MagicMock()
+
+        result = mask.lazy_any(True, second, x=x)
+
+        assert result.all()
+        second.assert_not_called()
+
+    @py.test.mark.parametrize(
+        "func, ntype",
+        [(mask.any_, ast.NodeType.UNION), (mask.all_, ast.NodeType.INTERSECT)],
+    )
+    def test_expressions(self, func, ntype):
+        """Ensure that expressions are combined into a single expression."""
+
+        x = ast.Node.builtin(name="x", x0=0, scale=1, stretch=False)
+        node = func(x < 0.5, x > -0.5, True)
+
+        assert isinstance(node, ast.Node)
+        assert node.ntype == ntype
+        assert len(node.children) == 3
+
+    def test_expressions_reject_arrays(self):
+        """Ensure that we don't try to mix arrays in with expressions."""
+
+        x = ast.Node.builtin(name="x", x0=0, scale=1, stretch=False)
+
+        with py.test.raises(TypeError):
+            mask.all_(x < 0.5, np.array([True, False]))
+
+
+@ar.definition
+def Disk(x: math.X, y: math.Y, *, r=0.6) -> mask.Mask:
+    """A simple disk, evaluated directly with numpy."""
+    return mask.Mask(x * x + y * y < r * r)
+
+
+class TestCoverage:
+    """Tests for the :code:`Coverage` definition."""
+
+    def test_validation(self):
+        """Ensure that a definition is required"""
+
+        with py.test.raises(ValueError) as err:
+            mask.Coverage()(width=4, height=4)
+
+        assert "mask producing definition" in str(err.value)
+
+    @given(width=T.dimension, height=T.dimension)
+    def test_matches_full_supersampling(self, width, height):
+        """Ensure that only supersampling the boundary gives the same result as
+        supersampling every pixel."""
+
+        n = 3
+        coverage = mask.Coverage(defn=Disk(), samples=n)(width=width, height=height)
+
+        x = np.linspace(-1, 1, width) * max(1, width / height)
+        y = np.linspace(1, -1, height) * max(1, height / width)
+        dx = x[1] - x[0]
+        dy = y[1] - y[0]
+
+        offsets = (np.arange(n) + 0.5) / n - 0.5
+        expected = np.zeros((height, width))
+
+        for i in offsets:
+            for j in offsets:
+                xs, ys = np.meshgrid(x + i * dx, y + j * dy)
+                expected += Disk()(x=xs, y=ys)
+
+        expected /= n * n
+
+        assert coverage.shape == (height, width)
+        npt.assert_allclose(coverage, expected)
+
+    def test_only_boundary_is_supersampled(self):
+        """Ensure that the additional samples are only taken at the boundary"""
+
+        calls = []
+
+        @ar.definition
+        def Recorder(x: math.X, y: math.Y) -> mask.Mask:
+            calls.append(x.size)
+            return mask.Mask(x < 0.3)
+
+        coverage = mask.Coverage(defn=Recorder(), samples=4)(width=5, height=2)
+
+        # The initial pass, then the 4 boundary pixels with 16 samples each.
+        assert calls == [10, 4 * 16]
+        assert ((coverage > 0) & (coverage < 1)).sum() == 2
+
+    @py.test.mark.parametrize(
+        "budget, samples", [(None, 16), (1000, 16), (4 * 9, 9), (4 * 3, None)]
+    )
+    def test_budget(self, budget, samples):
+        """Ensure that the number of samples taken stays within the budget"""
+
+        calls = []
+
+        @ar.definition
+        def Recorder(x: math.X, y: math.Y) -> mask.Mask:
+            calls.append(x.size)
+            return mask.Mask(x < 0.3)
+
+        defn = mask.Coverage(defn=Recorder(), samples=4, budget=budget)
+        coverage = defn(width=5, height=2)
+
+        if samples is None:
+            assert calls == [10]
+            assert set(np.unique(coverage)) <= {0.0, 1.0}
+        else:
+            assert calls == [10, 4 * samples]
@@ -3,8 +3,14 @@ import numpy.testing as npt
 import py.test
 from hypothesis import assume
 from hypothesis import given
+from hypothesis.strategies import floats
 
 import arlunio.testing as T
+from arlunio.math import clamp
+from arlunio.math import dot
+from arlunio.math import length
+from arlunio.math import lerp
+from arlunio.math import normalise
 from arlunio.math import X
 from arlunio.math import Y
 
@@ -119,3 +125,96 @@ def test_Y_shifts_origin_accordingly(width, height, offset):
     y2s = y2(width=width, height=height)
 
     npt.assert_almost_equal(y1s - y2s, offset)
+
+
+def vectors(n, seed=1):
+    return np.random.default_rng(seed).uniform(-1, 1, (n, 3))
+
+
+def test_dot():
+    """Ensure that the dot product matches the direct calculation, including when
+    writing into an existing array."""
+
+    us, vs = vectors(10), vectors(10, seed=2)
+    expected = np.sum(us * vs, axis=-1)
+
+    npt.assert_allclose(dot(us, vs), expected)
+
+    out = np.empty(10)
+    assert dot(us, vs, out=out) is out
+    npt.assert_allclose(out, expected)
+
+
+def test_length():
+    """Ensure that the length of each vector is computed correctly."""
+
+    vs = vectors(10)
+    expected = np.linalg.norm(vs, axis=-1)
+
+    npt.assert_allclose(length(vs), expected)
+
+    out = np.empty(10)
+    assert length(vs, out=out) is out
+    npt.assert_allclose(out, expected)
+
+
+@py.test.mark.parametrize("shape", [(3,), (10, 3), (4, 5, 3)])
+def test_normalise(shape):
+    """Ensure that vectors are scaled to unit length, for any number of vectors."""
+
+    vs = np.random.default_rng(1).uniform(-1, 1, shape)
+    expected = vs / np.linalg.norm(vs, axis=-1, keepdims=True)
+
+    npt.assert_allclose(normalise(vs), expected)
+
+
+def test_normalise_inplace():
+    """Ensure that vectors can be normalised in place, using the given scratch
+    space."""
+
+    vs = vectors(10)
+    lengths = np.linalg.norm(vs, axis=-1)
+    expected = vs / lengths[:, np.newaxis]
+
+    scratch = np.empty(10)
+
+    assert normalise(vs, out=vs, scratch=scratch) is vs
+    npt.assert_allclose(vs, expected)
+    npt.assert_allclose(scratch, lengths)
+
+
+def test_clamp_inplace():
+    """Ensure that values can be clamped in place."""
+
+    vs = np.linspace(-1, 2, 7)
+
+    assert clamp(vs, out=vs) is vs
+    assert vs.min() == 0 and vs.max() == 1
+
+
+def test_lerp_out():
+    """Ensure that interpolating into an existing array gives the same result."""
+
+    ts = np.linspace(0, 1, 5)
+    f = lerp(start=2, stop=-2)
+
+    expected = f(ts)
+    assert f(ts, out=ts) is ts
+
+    npt.assert_array_equal(ts, expected)
+
+
+@given(
+    start=floats(min_value=-1e6, max_value=1e6),
+    stop=floats(min_value=-1e6, max_value=1e6),
+)
+def test_lerp_endpoints(start, stop):
+    """Ensure that interpolation starts and stops exactly on the given values."""
+
+    f = lerp(start=start, stop=stop)
+    ts = np.array([0.0, 1.0])
+
+    assert f(0) == start
+    assert f(1) == stop
+    assert f(ts).tolist() == [start, stop]
+    assert f(ts, out=ts).tolist() == [start, stop]
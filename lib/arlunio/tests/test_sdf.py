@@ -0,0 +1,120 @@
+import numpy as np
+import py.test
+from hypothesis import given
+
+import arlunio.sdf as sdf
+import arlunio.shape as shape
+import arlunio.testing as T
+
+
+def grid(width, height):
+    """Return a coordinate grid to evaluate shapes on.
+
+    The grid is shifted slightly so that we avoid the exact center of circles, which
+    :class:`arlunio.shape.Circle` does not include.
+    """
+
+    xs = np.linspace(-1.5, 1.5, width) + 1e-3
+    ys = np.linspace(1.5, -1.5, height) + 1e-3
+
+    return np.meshgrid(xs, ys)
+
+
+SHAPES = [
+    shape.Circle(),
+    shape.Circle(xc=0.2, yc=-0.3, r1=0.3, r2=0.6),
+    shape.Ellipse(),
+    shape.Ellipse(xc=0.1, a=1, b=2, r=0.7, pt=0.2),
+    shape.SuperEllipse(),
+    shape.SuperEllipse(n=0.5, m=2, pt=0.1),
+    shape.SuperEllipse(n=1, a=2, b=0.5, r=0.6),
+    shape.Square(),
+    shape.Square(xc=0.3, size=0.5, pt=0.2),
+    shape.Rectangle(),
+    shape.Rectangle(yc=-0.2, size=0.3, ratio=0.5, pt=0.1),
+]
+
+
+@py.test.mark.parametrize("defn", SHAPES)
+@given(width=T.dimension, height=T.dimension)
+def test_sign_matches_shape(defn, width, height):
+    """Ensure that the points the field considers to be inside the shape match the
+    points selected by the shape itself."""
+
+    x, y = grid(width, height)
+
+    expected = defn(x=x, y=y)
+    field = sdf.of(defn)(x=x, y=y)
+
+    # Ignore points that are (numerically) on the boundary.
+    boundary = np.abs(field) < 1e-9
+    assert (sdf.to_mask(field) == expected)[~boundary].all()
+
+
+@py.test.mark.parametrize(
+    "defn",
+    [
+        shape.Circle(xc=0.2, r2=0.5),
+        shape.Square(xc=0.1, size=0.4),
+        shape.Rectangle(size=0.4, ratio=2),
+    ],
+)
+def test_exact_distance(defn):
+    """Ensure that the fields for the simpler shapes give the true distance to the
+    shape's border, by checking that the field changes at the same rate as we move
+    away from the shape."""
+
+    x = np.linspace(1, 2, 11)
+    field = sdf.of(defn)(x=x, y=0)
+
+    np.testing.assert_allclose(np.diff(field), 0.1)
+
+
+def test_of_unknown_shape():
+    """Ensure that we complain when asked for the field of an unsupported shape."""
+
+    with py.test.raises(TypeError) as err:
+        sdf.of(shape.Triangle())
+
+    assert "no signed distance field for 'Triangle'" in str(err.value)
+
+
+def test_outline_matches_ring():
+    """Ensure that the outline of a circle matches the equivalent ring."""
+
+    x, y = grid(64, 64)
+
+    circle = sdf.Circle(r2=0.5)(x=x, y=y)
+    ring = sdf.Circle(r1=0.4, r2=0.6)(x=x, y=y)
+
+    np.testing.assert_allclose(sdf.outline(circle, 0.1), ring)
+
+
+def test_boolean_operations():
+    """Ensure that combining fields gives the same result as combining masks."""
+
+    x, y = grid(64, 64)
+
+    a = sdf.Circle(xc=-0.25, r2=0.5)(x=x, y=y)
+    b = sdf.Square(xc=0.25, size=0.4)(x=x, y=y)
+
+    ma, mb = sdf.to_mask(a), sdf.to_mask(b)
+
+    assert (sdf.to_mask(sdf.union(a, b)) == (ma | mb)).all()
+    assert (sdf.to_mask(sdf.intersect(a, b)) == (ma & mb)).all()
+
+    boundary = np.abs(b) < 1e-9
+    assert (sdf.to_mask(sdf.subtract(a, b)) == (ma & ~mb))[~boundary].all()
+
+
+def test_to_coverage():
+    """Ensure that coverage is between 0 and 1 and only fractional near the
+    border."""
+
+    x, y = grid(64, 64)
+    field = sdf.Circle(r2=0.5)(x=x, y=y)
+
+    coverage = sdf.to_coverage(field, 0.1)
+
+    assert coverage.min() == 0 and coverage.max() == 1
+    assert (np.abs(field[(coverage > 0) & (coverage < 1)]) < 0.05).all()
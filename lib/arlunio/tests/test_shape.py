@@ -0,0 +1,508 @@
+import numpy as np
+import numpy.random as npr
+import py.test
+from hypothesis import given
+from hypothesis import settings
+from hypothesis.strategies import floats
+from hypothesis.strategies import integers
+from hypothesis.strategies import sampled_from
+
+import arlunio as ar
+import arlunio.math as math
+import arlunio.shape as shape
+import arlunio.testing as T
+from arlunio.backends.numpy import NumpyBackend
+from arlunio.backends.numpy import x_axis
+from arlunio.backends.numpy import y_axis
+
+
+def grid(width, height, **kwargs):
+    """Return the coordinate grid used when drawing shapes."""
+
+    x0 = kwargs.pop("x0", 0)
+    y0 = kwargs.pop("y0", 0)
+
+    xs = x_axis(width, height, x0=x0, **kwargs)
+    ys = y_axis(width, height, y0=y0, **kwargs)
+
+    return np.meshgrid(xs, ys)
+
+
+@ar.definition
+def Left(x: math.X, *, at=0):
+    return x < at
+
+
+@ar.definition
+def Stripes(width: int, height: int, *, period=2):
+    rows = np.arange(height).reshape(-1, 1) % period == 0
+    return np.broadcast_to(rows, (height, width))
+
+
+BOUNDED = [
+    shape.Circle(xc=0.3, yc=-0.2, r1=0.1, r2=0.5),
+    shape.Ellipse(xc=-0.2, a=1, b=0.5, r=0.9, pt=0.1),
+    shape.SuperEllipse(n=0.5, m=3, a=0.5),
+    shape.SuperEllipse(xc=0.1, n=2, pt=0.2),
+    shape.Square(yc=0.4, size=0.3, pt=0.1),
+    shape.Rectangle(xc=0.5, ratio=0.5),
+    shape.Triangle(a=(0.2, 0.9), b=(-0.7, -0.3), c=(0.6, -0.1)),
+    shape.Polygon(points=[(0, 0.9), (0.8, -0.8), (-0.2, 0.1), (-0.9, -0.5)]),
+    shape.Path(curves=[[(-0.9, -0.9), (0, 2.5), (0.9, -0.9)], [(0.9, -0.9), (0, 0)]]),
+]
+
+
+@py.test.mark.parametrize("defn", BOUNDED)
+def test_bounds(defn):
+    """Ensure that every point selected by a shape is within its bounds."""
+
+    x, y = grid(256, 256, scale=2)
+    inside = defn(x=x, y=y)
+
+    assert inside.any()
+
+    xmin, ymin, xmax, ymax = shape.bounds(defn)
+
+    assert (xmin <= x[inside]).all() and (x[inside] <= xmax).all()
+    assert (ymin <= y[inside]).all() and (y[inside] <= ymax).all()
+
+
+def test_bounds_unknown_shape():
+    """Ensure that we complain when the bounds of a shape can't be determined."""
+
+    with py.test.raises(TypeError) as err:
+        shape.bounds(Left())
+
+    assert "bounds of 'Left'" in str(err.value)
+
+
+@settings(max_examples=25)
+@given(
+    width=T.dimension,
+    height=T.dimension,
+    seed=integers(min_value=1),
+)
+def test_triangle_matches_barycentric(width, height, seed):
+    """Ensure that the triangle selects the points with barycentric coordinates
+    strictly between 0 and 1."""
+
+    gen = npr.default_rng(seed=seed)
+    a, b, c = (tuple(p) for p in gen.uniform(-1, 1, (3, 2)))
+
+    x, y = grid(width, height)
+    p = math.Barycentric(a=a, b=b, c=c)(x=x, y=y)
+    expected = ((0 < p) & (p < 1)).all(axis=2)
+
+    triangle = shape.Triangle(a=a, b=b, c=c)
+    assert (triangle(x=x, y=y) == expected).all()
+
+    # We should get the same result when given the axes instead of the full grid
+    xs, ys = x[:1, :], y[:, :1]
+    assert (triangle(x=xs, y=ys) == expected).all()
+
+
+@settings(max_examples=25)
+@given(
+    width=T.dimension,
+    height=T.dimension,
+    seed=integers(min_value=1),
+    flip=sampled_from([False, True]),
+)
+def test_triangle_matches_pointwise(width, height, seed, flip):
+    """Ensure that testing only the points within the triangle's bounding box gives
+    the same result as testing each point, including triangles partly outside the
+    image."""
+
+    gen = npr.default_rng(seed=seed)
+    a, b, c = (tuple(p) for p in gen.uniform(-1.5, 1.5, (3, 2)))
+    triangle = shape.Triangle(a=a, b=b, c=c)
+
+    x, y = grid(width, height)
+
+    if flip:
+        x, y = x[::-1, ::-1], y[::-1, ::-1]
+
+    expected = triangle(x=x.flatten(), y=y.flatten()).reshape(height, width)
+
+    assert (triangle(x=x, y=y) == expected).all()
+    assert (triangle(x=x[:1, :], y=y[:, :1]) == expected).all()
+
+
+@py.test.mark.parametrize("cls", [shape.Square, shape.Rectangle])
+@settings(max_examples=25)
+@given(
+    width=T.dimension,
+    height=T.dimension,
+    xc=floats(min_value=-1.5, max_value=1.5),
+    yc=floats(min_value=-1.5, max_value=1.5),
+    size=floats(min_value=0, max_value=1),
+    pt=sampled_from([None, 0.1, 0.5]),
+)
+def test_box_matches_pointwise(cls, width, height, xc, yc, size, pt):
+    """Ensure that filling squares and rectangles on a grid gives the same result as
+    testing each point."""
+
+    defn = cls(xc=xc, yc=yc, size=size, pt=pt)
+
+    x, y = grid(width, height)
+    expected = defn(x=x.flatten(), y=y.flatten()).reshape(height, width)
+
+    assert (defn(x=x, y=y) == expected).all()
+    assert (defn(x=x[:1, :], y=y[:, :1]) == expected).all()
+
+
+@settings(max_examples=25)
+@given(
+    width=T.dimension,
+    height=T.dimension,
+    n=sampled_from([0.1, 0.5, 1, 2, 3, 2.5, 7]),
+    m=sampled_from([None, 0.5, 4]),
+    pt=sampled_from([None, 0.1]),
+)
+def test_super_ellipse_matches_pointwise(width, height, n, m, pt):
+    """Ensure that evaluating a super ellipse on a grid gives the same result as the
+    direct computation at each point."""
+
+    defn = shape.SuperEllipse(xc=0.1, yc=-0.2, a=1.5, b=0.5, n=n, m=m, pt=pt)
+    m = n if m is None else m
+
+    x, y = grid(width, height)
+    value = np.abs((x - 0.1) / 1.5) ** n + np.abs((y + 0.2) / 0.5) ** m
+
+    # Avoid points that are too close to the boundary to call.
+    bounds = [0.8] if pt is None else [0.72, 0.88]
+    clear = np.all([np.abs(value - b) > 1e-9 for b in bounds], axis=0)
+
+    expected = (value < 0.8) if pt is None else (0.72 < value) & (value < 0.88)
+
+    for result in [defn(x=x, y=y), defn(x=x[:1, :], y=y[:, :1])]:
+        assert (result == expected)[clear].all()
+
+
+class TestPolygon:
+    """Tests for the :code:`Polygon` and :code:`Path` definitions."""
+
+    @py.test.mark.parametrize("defn", [shape.Polygon(), shape.Path()])
+    def test_validation(self, defn):
+        """Ensure that the outline of the shape must be given."""
+
+        x, y = grid(4, 4)
+
+        with py.test.raises(ValueError) as err:
+            defn(x=x, y=y)
+
+        assert "must provide" in str(err.value)
+
+    def test_unknown_rule(self):
+        """Ensure that we complain about unknown fill rules."""
+
+        x, y = grid(4, 4)
+        polygon = shape.Polygon(points=[(0, 0), (1, 0), (0, 1)], rule="all")
+
+        with py.test.raises(ValueError) as err:
+            polygon(x=x, y=y)
+
+        assert "Unknown fill rule 'all'" in str(err.value)
+
+    @settings(max_examples=25)
+    @given(
+        width=T.dimension,
+        height=T.dimension,
+        n=integers(min_value=3, max_value=20),
+        rule=sampled_from(["evenodd", "nonzero"]),
+        seed=integers(min_value=1),
+    )
+    def test_scanline_matches_pointwise(self, width, height, n, rule, seed):
+        """Ensure that filling a grid gives the same result as testing each point."""
+
+        gen = npr.default_rng(seed=seed)
+        polygon = shape.Polygon(points=gen.uniform(-1.5, 1.5, (n, 2)), rule=rule)
+
+        x, y = grid(width, height)
+        expected = polygon(x=x.flatten(), y=y.flatten()).reshape(height, width)
+
+        assert (polygon(x=x, y=y) == expected).all()
+        assert (polygon(x=x[:1, :], y=y[:, :1]) == expected).all()
+
+        # The orientation of the grid shouldn't matter either.
+        assert (polygon(x=x[:, ::-1], y=y[::-1, :]) == expected[::-1, ::-1]).all()
+
+    @py.test.mark.parametrize("rule", ["evenodd", "nonzero"])
+    @py.test.mark.parametrize(
+        "cls, kwargs",
+        [
+            (
+                shape.Polygon,
+                {"points": [(0, 0.9), (0.8, -0.8), (-0.2, 0.1), (-0.9, 0)]},
+            ),
+            (
+                shape.Polygon,
+                {"points": [(0, 0.9), (0.5, -0.8), (-0.9, 0.3), (0.9, 0.3)]},
+            ),
+            (shape.Path, {"curves": [[(-0.9, -0.9), (0, 2.5), (0.9, -0.9)]]}),
+        ],
+    )
+    def test_width_height(self, cls, kwargs, rule):
+        """Ensure that the shapes can be drawn by giving the size of the image, as
+        with every other shape."""
+
+        defn = cls(rule=rule, **kwargs)
+        x, y = grid(48, 32)
+
+        backend = NumpyBackend(width=48, height=32)
+        result = backend.eval(defn(width=48, height=32))
+
+        assert (result == defn(x=x, y=y)).all()
+
+    def test_matches_triangle(self):
+        """Ensure that a polygon with 3 points matches the equivalent triangle."""
+
+        x, y = grid(64, 32)
+        a, b, c = (0.1, 0.9), (-0.8, -0.4), (0.7, -0.2)
+
+        polygon = shape.Polygon(points=[a, b, c])
+        triangle = shape.Triangle(a=a, b=b, c=c)
+
+        assert (polygon(x=x, y=y) == triangle(x=x, y=y)).all()
+
+    def test_straight_path(self):
+        """Ensure that a path made of straight lines matches the polygon."""
+
+        x, y = grid(64, 32)
+        points = [(0, 0.9), (0.8, -0.8), (-0.2, 0.1), (-0.9, -0.5)]
+
+        lines = [[p, q] for p, q in zip(points, points[1:])]
+        path = shape.Path(curves=lines)
+
+        assert (path(x=x, y=y) == shape.Polygon(points=points)(x=x, y=y)).all()
+
+    def test_bezier_path(self):
+        """Ensure that the curves in a path are followed closely."""
+
+        # The standard approximation of a circle using 4 cubic Bezier curves
+        k = 0.5523
+        curves = [
+            [(1, 0), (1, k), (k, 1), (0, 1)],
+            [(0, 1), (-k, 1), (-1, k), (-1, 0)],
+            [(-1, 0), (-1, -k), (-k, -1), (0, -1)],
+            [(0, -1), (k, -1), (1, -k), (1, 0)],
+        ]
+
+        x, y = grid(256, 256, scale=1.2)
+        path = shape.Path(curves=curves, tolerance=1e-4)(x=x, y=y)
+
+        r = np.sqrt(x ** 2 + y ** 2)
+        away = np.abs(r - 1) > 1e-3
+
+        assert (path[away] == (r < 1)[away]).all()
+
+
+class TestBatch:
+    """Tests for the :code:`Batch` definition."""
+
+    def test_validation(self):
+        """Ensure that a shape must be given."""
+
+        with py.test.raises(ValueError) as err:
+            shape.Batch()(width=4, height=4)
+
+        assert "provide the shape" in str(err.value)
+
+    @py.test.mark.parametrize(
+        "defn, attributes",
+        [
+            (shape.Circle(), {"r2": (0.01, 0.3)}),
+            (shape.Circle(r1=0.05), {"r2": (0.1, 0.2)}),
+            (shape.Square(pt=0.1), {"size": (0.01, 0.2)}),
+            (shape.Ellipse(a=1, b=0.5), {"r": (0.1, 0.4)}),
+        ],
+    )
+    @settings(max_examples=10, deadline=None)
+    @given(
+        width=T.dimension,
+        height=T.dimension,
+        n=integers(min_value=1, max_value=50),
+        tile=sampled_from([8, 16, 64]),
+        seed=integers(min_value=1),
+    )
+    def test_matches_individual(self, defn, attributes, width, height, n, tile, seed):
+        """Ensure that drawing a batch of shapes matches drawing each shape
+        individually."""
+
+        gen = npr.default_rng(seed=seed)
+        instances = {"xc": gen.uniform(-2, 2, n), "yc": gen.uniform(-2, 2, n)}
+
+        for name, (low, high) in attributes.items():
+            instances[name] = gen.uniform(low, high, n)
+
+        values = defn.values(inherited=True)
+        x, y = grid(width, height)
+
+        union = np.full((height, width), False)
+        ids = np.full((height, width), -1)
+
+        for i in range(n):
+            attrs = {k: v[i] for k, v in instances.items()}
+            inside = type(defn)(**{**values, **attrs})(x=x, y=y)
+
+            union |= inside
+            ids[inside] = i
+
+        batch = shape.Batch(defn=defn, instances=instances, tile=tile)
+        result = batch(width=width, height=height)
+
+        assert result.shape == (height, width)
+        assert (result == union).all()
+
+        batch.ids = True
+        assert (batch(width=width, height=height) == ids).all()
+
+    def test_single_instance(self):
+        """Ensure that the shape's own attributes are used when no instances are
+        given."""
+
+        x, y = grid(32, 16)
+        defn = shape.Circle(xc=0.5)
+
+        result = shape.Batch(defn=defn)(width=32, height=16)
+        assert (result == defn(x=x, y=y)).all()
+
+    def test_off_screen(self):
+        """Ensure that instances entirely outside the image are skipped."""
+
+        defn = shape.Circle(r2=0.1)
+        instances = {"xc": np.array([10, -10]), "yc": np.array([0, 5])}
+
+        result = shape.Batch(defn=defn, instances=instances, ids=True)
+        assert (result(width=16, height=16) == -1).all()
+
+
+class TestMesh:
+    """Tests for the :code:`mesh` function."""
+
+    @settings(max_examples=10, deadline=None)
+    @given(
+        width=T.dimension,
+        height=T.dimension,
+        n=integers(min_value=3, max_value=30),
+        tile=sampled_from([8, 16, 64]),
+        seed=integers(min_value=1),
+    )
+    def test_matches_individual(self, width, height, n, tile, seed):
+        """Ensure that drawing a mesh matches drawing each face individually."""
+
+        gen = npr.default_rng(seed=seed)
+
+        vertices = gen.uniform(-1.5, 1.5, (n, 2))
+        faces = np.array([gen.choice(n, 3, replace=False) for _ in range(n)])
+
+        x, y = grid(width, height)
+        union = np.full((height, width), False)
+        ids = np.full((height, width), -1)
+
+        for i, (a, b, c) in enumerate(vertices[faces]):
+            inside = shape.Triangle(a=a, b=b, c=c)(x=x, y=y)
+
+            union |= inside
+            ids[inside] = i
+
+        defn = shape.mesh(vertices, faces, tile=tile)
+        assert (defn(width=width, height=height) == union).all()
+
+        defn = shape.mesh(vertices, faces, tile=tile, ids=True)
+        assert (defn(width=width, height=height) == ids).all()
+
+    def test_attributes(self):
+        """Ensure that any other attributes are passed onto the triangles."""
+
+        vertices = [(-1, -1), (1, -1), (0, 1)]
+        defn = shape.mesh(vertices, [(0, 1, 2)], scale=4)
+
+        x, y = grid(32, 16, scale=4)
+        expected = shape.Triangle(a=vertices[0], b=vertices[1], c=vertices[2])
+
+        assert (defn(width=32, height=16) == expected(x=x, y=y)).all()
+
+
+class TestScene:
+    """Tests for the :code:`Scene` definition."""
+
+    def test_empty(self):
+        """Ensure that an empty scene produces an empty image."""
+
+        result = shape.Scene()(width=8, height=4)
+
+        assert result.shape == (4, 8)
+        assert not result.any()
+
+    @settings(max_examples=10, deadline=None)
+    @given(
+        width=T.dimension,
+        height=T.dimension,
+        n=integers(min_value=1, max_value=50),
+        tile=sampled_from([8, 16, 64]),
+        seed=integers(min_value=1),
+    )
+    def test_matches_individual(self, width, height, n, tile, seed):
+        """Ensure that drawing a scene matches drawing each shape individually."""
+
+        gen = npr.default_rng(seed=seed)
+        shapes = []
+
+        for kind, xc, yc, r in zip(
+            gen.integers(0, 4, n),
+            gen.uniform(-2, 2, n),
+            gen.uniform(-2, 2, n),
+            gen.uniform(0.01, 0.3, n),
+        ):
+            if kind == 0:
+                shapes.append(shape.Circle(xc=xc, yc=yc, r2=r))
+            elif kind == 1:
+                shapes.append(shape.Square(xc=xc, yc=yc, size=r, pt=0.2))
+            elif kind == 2:
+                shapes.append(shape.Ellipse(xc=xc, yc=yc, a=1, b=0.5, r=r))
+            else:
+                shapes.append(shape.Circle(xc=xc, yc=yc, r2=r, scale=2))
+
+        union = np.full((height, width), False)
+        ids = np.full((height, width), -1)
+
+        for i, defn in enumerate(shapes):
+            x, y = grid(width, height, scale=defn.scale)
+            inside = defn(x=x, y=y)
+
+            union |= inside
+            ids[inside] = i
+
+        scene = shape.Scene(shapes=shapes, tile=tile)
+        assert (scene(width=width, height=height) == union).all()
+
+        scene.ids = True
+        assert (scene(width=width, height=height) == ids).all()
+
+    def test_unbounded_shapes(self):
+        """Ensure that shapes without known bounds are drawn everywhere."""
+
+        x, y = grid(32, 16)
+        shapes = [Left(at=-0.5), shape.Circle(xc=0.5, r2=0.25)]
+
+        scene = shape.Scene(shapes=shapes, tile=8, ids=True)
+        result = scene(width=32, height=16)
+
+        assert (result[x < -0.5] == 0).all()
+        assert (result[shape.Circle(xc=0.5, r2=0.25)(x=x, y=y)] == 1).all()
+        assert (result[(x >= -0.5) & ~(result == 1)] == -1).all()
+
+    @py.test.mark.parametrize("tile", [3, 8, 64])
+    def test_image_sized_shapes(self, tile):
+        """Ensure that shapes that depend on the size of the image, rather than the
+        coordinates, are drawn correctly."""
+
+        x, y = grid(32, 16)
+        stripes = Stripes(period=3)(width=32, height=16)
+        circle = shape.Circle(xc=0.5, r2=0.25)
+
+        scene = shape.Scene(shapes=[Stripes(period=3), circle], tile=tile)
+        result = scene(width=32, height=16)
+
+        assert (result == stripes | circle(x=x, y=y)).all()